@@ -0,0 +1,205 @@
+"""
+Ledger analytics over NumPy columns.
+
+An account's history is loaded once into column arrays (LedgerColumns) and
+every metric is computed with whole-array operations, so long histories cost
+one query plus a few passes in C rather than a Python loop per row.
+"""
+import numpy as np
+from sqlalchemy import String, select, type_coerce
+import db
+import models
+
+TX_TYPES = models.TX_TYPES
+DEPOSIT = models.TX_TYPE_CODES[models.TransactionType.DEPOSIT]
+WITHDRAWAL = models.TX_TYPE_CODES[models.TransactionType.WITHDRAWAL]
+PAY = models.TX_TYPE_CODES[models.TransactionType.PAY]
+SUCCESS = models.STATUS_CODES[models.StatusType.SUCCESS]
+DECLINED = models.STATUS_CODES[models.StatusType.DECLINED]
+STATUSES = models.STATUSES
+
+def flow_sign(type_code, rose, status_code):
+    if status_code != SUCCESS:
+        return 0
+    if type_code == PAY:
+        return 1 if rose else -1
+    return {DEPOSIT: 1, WITHDRAWAL: -1}.get(type_code, 0)
+
+# every row gets a small code for (tx type, balance rose, status), so per-row
+# lookups and group totals are single take / bincount passes over one uint8 array
+CODE_SHAPE = (len(TX_TYPES), 2, len(STATUSES))
+FLOW_SIGNS = np.array(
+    [flow_sign(*np.unravel_index(code, CODE_SHAPE)) for code in range(np.prod(CODE_SHAPE))], dtype=np.float64
+)
+
+def encode(values, members):
+    # enum value strings -> models.TX_TYPES / models.STATUSES codes
+    codes = np.zeros(len(values), dtype=np.uint8)
+    for code, member in enumerate(members):
+        codes[values == member.value] = code
+    return codes
+
+class LedgerColumns:
+    """One account's ledger in (timestamp, tx_ID) order, one array per field"""
+    def __init__(self, amounts, balances, type_codes, status_codes, timestamps):
+        self.amounts = np.asarray(amounts, dtype=np.float64)
+        self.balances = np.asarray(balances, dtype=np.float64)
+        self.type_codes = np.asarray(type_codes, dtype=np.uint8)
+        self.status_codes = np.asarray(status_codes, dtype=np.uint8)
+        self.timestamps = np.asarray(timestamps, dtype='datetime64[us]')
+
+    def __len__(self):
+        return len(self.amounts)
+
+    @classmethod
+    def from_db(cls, account_ID):
+        # timestamps are fetched as stored text (SQLite) so NumPy parses them in bulk
+        select_statement = select(
+            db.ledger.c.amount, db.ledger.c.current_balance, db.ledger.c.tx_type,
+            db.ledger.c.status, type_coerce(db.ledger.c.timestamp, String)
+        ).where(db.ledger.c.account_ID == account_ID).order_by(db.ledger.c.timestamp, db.ledger.c.tx_ID)
+        with db.engine.connect() as conn:
+            rows = conn.execute(select_statement).all()
+        if not rows:
+            return cls([], [], [], [], [])
+        amounts, balances, tx_types, statuses, timestamps = zip(*rows)
+        return cls(
+            amounts, balances,
+            encode(np.array(tx_types), models.TX_TYPES),
+            encode(np.array(statuses), models.STATUSES),
+            np.array(timestamps, dtype='datetime64[us]')
+        )
+
+    @classmethod
+    def from_ledger(cls, ledger):
+        # zero-copy views over a models.ColumnarLedger (rows in insertion order)
+        return cls(
+            np.frombuffer(ledger.amounts, dtype=np.float64),
+            np.frombuffer(ledger.balances, dtype=np.float64),
+            np.frombuffer(ledger.type_codes, dtype=np.uint8),
+            np.frombuffer(ledger.status_codes, dtype=np.uint8),
+            np.frombuffer(ledger.timestamps, dtype=np.int64).view('datetime64[us]')
+        )
+
+def row_codes(columns):
+    # index into CODE_SHAPE for each row
+    rose = np.zeros(len(columns), dtype=np.uint8)
+    np.greater(columns.balances[1:], columns.balances[:-1], out=rose[1:])
+    codes = columns.type_codes * np.uint8(2) + rose
+    codes *= np.uint8(len(STATUSES))
+    codes += columns.status_codes
+    return codes
+
+def signed_flows(columns, codes=None):
+    """Balance change from each row: +deposit, -withdrawal, declined rows 0.
+
+    The ledger does not say which side of a payment a PAY row is on, so its
+    sign comes from the step in recorded balance. A PAY row that opens the
+    history has no previous balance and is counted as outgoing.
+    """
+    codes = row_codes(columns) if codes is None else codes
+    flows = FLOW_SIGNS.take(codes)
+    flows *= columns.amounts
+    return flows
+
+def running_balance(columns, flows):
+    """Balance after each row rebuilt from the opening balance and the flows alone"""
+    rebuilt = np.cumsum(flows)
+    if len(columns):
+        rebuilt += columns.balances[0] - flows[0]
+    return rebuilt
+
+def type_status_table(columns, codes):
+    # (tx type, status) -> row count and amount
+    size = np.prod(CODE_SHAPE)
+    counts = np.bincount(codes, minlength=size).reshape(CODE_SHAPE).sum(axis=1)
+    amounts = np.bincount(codes, weights=columns.amounts, minlength=size).reshape(CODE_SHAPE).sum(axis=1)
+    return counts, amounts
+
+def per_type_totals(counts, amounts):
+    return {
+        tx_type.value: {
+            "count": int(counts[code].sum()),
+            "volume": float(amounts[code, SUCCESS]),
+            "declined": int(counts[code, DECLINED])
+        }
+        for code, tx_type in enumerate(TX_TYPES) if counts[code].any()
+    }
+
+def daily_net_flow(columns, flows):
+    # rows are in time order, so each day is a contiguous run
+    if not len(columns):
+        return []
+    # so day boundaries are found by binary search instead of bucketing every row
+    days = np.arange(
+        columns.timestamps[0].astype('datetime64[D]'), columns.timestamps[-1].astype('datetime64[D]') + 1
+    )
+    bounds = np.searchsorted(columns.timestamps, np.append(days, days[-1] + 1))
+    counts = np.diff(bounds)
+    active = counts > 0
+    first_rows = bounds[:-1][active]
+    net = np.add.reduceat(flows, first_rows)
+    closing = columns.balances[bounds[1:][active] - 1]
+    return [
+        {"day": day, "net_flow": flow, "closing_balance": balance, "count": count}
+        for day, flow, balance, count in zip(
+            np.datetime_as_string(days[active]).tolist(), net.tolist(), closing.tolist(), counts[active].tolist()
+        )
+    ]
+
+def overdraft_intervals(columns):
+    """Runs of rows that left the balance below zero, with when they started and ended"""
+    negative = (columns.balances < 0).view(np.int8)
+    edges = np.diff(negative, prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    if not len(starts):
+        return []
+    lowest = np.minimum.reduceat(columns.balances, starts)
+    start_times = np.datetime_as_string(columns.timestamps[starts]).tolist()
+    # end is the row that brought the balance back to zero or above
+    end_times = np.datetime_as_string(columns.timestamps[np.minimum(ends, len(columns) - 1)]).tolist()
+    if ends[-1] == len(columns):
+        end_times[-1] = None
+    return [
+        {"start": start, "end": end, "rows": rows, "lowest_balance": low}
+        for start, end, rows, low in zip(start_times, end_times, (ends - starts).tolist(), lowest.tolist())
+    ]
+
+def decline_stats(columns, counts, amounts):
+    declined = (columns.status_codes == DECLINED).view(np.int8)
+    # longest run of consecutive declines
+    edges = np.diff(declined, prepend=0, append=0)
+    runs = np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+    count = int(counts[:, DECLINED].sum())
+    return {
+        "count": count,
+        "rate": count / len(columns) if len(columns) else 0.0,
+        "declined_amount": float(amounts[:, DECLINED].sum()),
+        "longest_streak": int(runs.max()) if len(runs) else 0
+    }
+
+def summarize(columns):
+    """Every metric for one ledger, as plain JSON-ready values"""
+    codes = row_codes(columns)
+    flows = signed_flows(columns, codes)
+    counts, amounts = type_status_table(columns, codes)
+    opening = float(columns.balances[0] - flows[0]) if len(columns) else None
+    # largest gap between recorded and rebuilt balance: changes the ledger does
+    # not explain, e.g. direct balance updates (computed in place on the rebuilt array)
+    drift = running_balance(columns, flows)
+    np.subtract(columns.balances, drift, out=drift)
+    np.abs(drift, out=drift)
+    return {
+        "rows": len(columns),
+        "opening_balance": opening,
+        "closing_balance": float(columns.balances[-1]) if len(columns) else None,
+        "unexplained_change": float(drift.max()) if len(columns) else 0.0,
+        "by_type": per_type_totals(counts, amounts),
+        "daily": daily_net_flow(columns, flows),
+        "overdrafts": overdraft_intervals(columns),
+        "declines": decline_stats(columns, counts, amounts)
+    }
+
+def account_analytics(account_ID):
+    return summarize(LedgerColumns.from_db(account_ID))
@@ -0,0 +1,57 @@
+"""
+Awaitable versions of the db helpers for the async FastAPI endpoints.
+
+Each helper runs the matching db function in the worker thread pool, so a slow
+SQLite statement or commit no longer blocks the event loop while other requests
+are in flight. The pysqlite driver is blocking either way (aiosqlite is itself a
+thread per connection), so sharing db's engine keeps a single source of truth for
+the schema, connection pool and transaction logic.
+"""
+import functools
+from starlette.concurrency import run_in_threadpool
+import db
+import metrics
+
+def offload(fn):
+    # wrap a blocking db helper in a coroutine that runs it off the event loop
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        # the worker thread runs in a copy of this context, so its queries are labelled with fn
+        token = metrics.current_helper.set(fn.__name__)
+        try:
+            return await run_in_threadpool(fn, *args, **kwargs)
+        finally:
+            metrics.current_helper.reset(token)
+    return wrapper
+
+# accounts
+insert_account = offload(db.insert_account)
+delete_account = offload(db.delete_account)
+get_account = offload(db.get_account)
+get_all_accounts = offload(db.get_all_accounts)
+get_accounts_page = offload(db.get_accounts_page)
+update_account = offload(db.update_account)
+
+# transactions and ledger
+insert_transaction = offload(db.insert_transaction)
+apply_transaction = offload(db.apply_transaction)
+transfer = offload(db.transfer)
+apply_batch = offload(db.apply_batch)
+get_ledger = offload(db.get_ledger)
+get_ledger_page = offload(db.get_ledger_page)
+get_bank_stats = offload(db.get_bank_stats)
+
+# policies
+insert_policy = offload(db.insert_policy)
+get_account_policy = offload(db.get_account_policy)
+insert_policy_request = offload(db.insert_policy_request)
+get_policy_requests = offload(db.get_policy_requests)
+get_policy_requests_page = offload(db.get_policy_requests_page)
+update_policy_request_status = offload(db.update_policy_request_status)
+
+# usernames
+get_account_id_by_username = offload(db.get_account_id_by_username)
+get_username_by_account_id = offload(db.get_username_by_account_id)
+resolve_usernames = offload(db.resolve_usernames)
+insert_user_account = offload(db.insert_user_account)
+search_usernames = offload(db.search_usernames)
@@ -0,0 +1,93 @@
+"""
+Vectorized policy decisions for many deposits and withdrawals at once.
+
+validate_batch gives the same answers as calling Policy.validate_deposit /
+validate_withdrawal row by row and carrying each account's balance and daily
+withdrawn total forward. Rows for different accounts are independent, so the
+batch is processed in rounds: round k decides the k-th row of every account
+in one NumPy pass. A batch therefore costs (longest account history) passes
+rather than one Python call per row.
+"""
+import numpy as np
+import models
+
+POLICY_FIELDS = ("maxDeposit", "maxWithdrawal", "dailyWithdrawalLimit", "allowNegativeBalance", "overdraftLimit")
+
+def policy_columns(policy, rows):
+    """Policy limits as scalars (one models.Policy for every row) or per-row arrays (a sequence of them)"""
+    if isinstance(policy, models.Policy):
+        return {field: getattr(policy, field) for field in POLICY_FIELDS}
+    if len(policy) != rows:
+        raise ValueError("need one policy per row")
+    return {field: np.array([getattr(row_policy, field) for row_policy in policy]) for field in POLICY_FIELDS}
+
+def round_order(accounts):
+    """Permutation of the rows into rounds, and each round's bounds in it.
+
+    A round holds at most one row per account, and each account's rows fall
+    into successive rounds in their original order.
+    """
+    order = np.argsort(accounts, kind='stable')
+    sorted_accounts = accounts[order]
+    group_starts = np.flatnonzero(np.diff(sorted_accounts, prepend=-1))
+    # position of each row within its account's history
+    rank = np.empty(len(accounts), dtype=np.intp)
+    rank[order] = np.arange(len(accounts)) - np.repeat(group_starts, np.diff(np.append(group_starts, len(accounts))))
+    # ranks are small, and a stable sort of a 16-bit-or-narrower array is a radix sort
+    permutation = np.argsort(rank.astype(np.min_scalar_type(rank.max() if len(rank) else 0)), kind='stable')
+    bounds = np.searchsorted(rank[permutation], np.arange(rank.max() + 2 if len(accounts) else 1))
+    return permutation, bounds
+
+def validate_batch(accounts, withdrawals, amounts, opening_balances, policy, withdrawn_today=None):
+    """Decide a batch of deposits and withdrawals.
+
+    accounts[i] is the account index (into opening_balances) of row i,
+    withdrawals[i] is True for a withdrawal and False for a deposit, and rows
+    of the same account apply in order. policy is a models.Policy for every
+    row or one Policy per row. withdrawn_today holds each account's daily
+    total before the batch (default 0); all rows count towards the same day.
+    Returns (accepted mask, balance after each row).
+    """
+    accounts = np.asarray(accounts, dtype=np.intp)
+    balances = np.array(opening_balances, dtype=np.float64)
+    withdrawn = np.zeros(len(balances)) if withdrawn_today is None else np.array(withdrawn_today, dtype=np.float64)
+    limits = policy_columns(policy, len(accounts))
+
+    # lay every input out in round order once, so each round works on contiguous slices
+    permutation, bounds = round_order(accounts)
+    accounts = accounts[permutation]
+    withdrawals = np.asarray(withdrawals, dtype=bool)[permutation]
+    amounts = np.asarray(amounts, dtype=np.float64)[permutation]
+    limits = {field: value[permutation] if isinstance(value, np.ndarray) else value for field, value in limits.items()}
+
+    accepted = np.empty(len(accounts), dtype=bool)
+    balances_after = np.empty(len(accounts))
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        rows = slice(start, stop)
+        row_limits = {field: value[rows] if isinstance(value, np.ndarray) else value for field, value in limits.items()}
+        account_rows = accounts[rows]
+        amount = amounts[rows]
+        is_withdrawal = withdrawals[rows]
+        balance = balances[account_rows]
+        withdrawn_before = withdrawn[account_rows]
+        # same checks as Policy.validate_withdrawal / validate_deposit
+        can_withdraw = (
+            (amount > 0) & (amount <= row_limits["maxWithdrawal"])
+            & (withdrawn_before + amount <= row_limits["dailyWithdrawalLimit"])
+            & np.where(row_limits["allowNegativeBalance"], balance - amount >= -row_limits["overdraftLimit"], amount <= balance)
+        )
+        can_deposit = (amount <= row_limits["maxDeposit"]) & (amount >= 0)
+        ok = np.where(is_withdrawal, can_withdraw, can_deposit)
+
+        balance = np.where(ok, balance + np.where(is_withdrawal, -amount, amount), balance)
+        balances[account_rows] = balance
+        withdrawn[account_rows] = np.where(ok & is_withdrawal, withdrawn_before + amount, withdrawn_before)
+        accepted[rows] = ok
+        balances_after[rows] = balance
+
+    # back to input order
+    result_accepted = np.empty_like(accepted)
+    result_balances = np.empty_like(balances_after)
+    result_accepted[permutation] = accepted
+    result_balances[permutation] = balances_after
+    return result_accepted, result_balances
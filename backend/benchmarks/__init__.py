@@ -0,0 +1,12 @@
+"""
+Performance benchmarks for the backend.
+
+Each module can be run on its own from the backend directory, e.g.
+`python -m benchmarks.bench_async_db`. Benchmarks point DATABASE_URL at a
+throwaway SQLite file so they never touch mydatabase.sqlite.
+
+`python -m benchmarks run` runs the regression suite (benchmarks/suite.py)
+and writes JSON results; `python -m benchmarks compare baseline.json
+results.json` flags cases that got slower. `python -m benchmarks.loadgen`
+drives concurrent virtual users against the API and checks for lost updates.
+"""
@@ -0,0 +1,132 @@
+"""
+analytics.summarize against the same metrics computed row by row.
+
+One account gets `--rows` ledger rows (a random walk of deposits, withdrawals
+and payments with some declines). The row-by-row version loops over the
+dicts returned by db.get_ledger, which is what callers did before
+analytics.py. Load and compute are timed separately and both results are
+checked to agree.
+
+    python -m benchmarks.bench_analytics [--rows 1000000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix="qa-bank-bench-"), "bench.sqlite")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DB_FILE}")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import analytics
+import db
+
+ACCOUNT_ID = "bench-account"
+CHUNK = 50_000
+START = datetime(2024, 1, 1)
+
+def fill(rows, rng):
+    balance = 1000
+    batch = []
+    with db.engine.begin() as conn:
+        for i in range(rows):
+            tx_type = rng.choice(["DEPOSIT", "WITHDRAWAL", "PAY"])
+            amount = rng.randint(1, 500)
+            outgoing = tx_type == "WITHDRAWAL" or (tx_type == "PAY" and rng.random() < 0.5)
+            status = "DECLINED" if outgoing and balance - amount < -200 else "SUCCESS"
+            if status == "SUCCESS":
+                balance += -amount if outgoing else amount
+            batch.append({
+                "amount": amount, "current_balance": balance, "tx_type": tx_type, "account_ID": ACCOUNT_ID,
+                "timestamp": START + timedelta(seconds=30 * i), "tx_ID": f"tx-{i:08d}", "status": status,
+                "counterparty": None
+            })
+            if len(batch) == CHUNK:
+                conn.execute(db.ledger.insert(), batch)
+                batch = []
+        if batch:
+            conn.execute(db.ledger.insert(), batch)
+
+def summarize_rows(rows):
+    # the metrics from analytics.summarize, one Python iteration per row
+    rows = sorted(rows, key=lambda row: (row["timestamp"], row["tx_ID"]))
+    by_type, daily, overdrafts = {}, {}, []
+    declines = {"count": 0, "declined_amount": 0.0, "longest_streak": 0}
+    previous, streak, overdraft, opening = None, 0, None, None
+    for index, row in enumerate(rows):
+        amount, balance = row["amount"], row["current_balance"]
+        flow = 0
+        if row["status"] == "SUCCESS":
+            if row["tx_type"] == "DEPOSIT":
+                flow = amount
+            elif row["tx_type"] == "WITHDRAWAL":
+                flow = -amount
+            else:
+                flow = amount if previous is not None and balance > previous else -amount
+        if opening is None:
+            opening = balance - flow
+        summary = by_type.setdefault(row["tx_type"], {"count": 0, "volume": 0.0, "declined": 0})
+        summary["count"] += 1
+        if row["status"] == "SUCCESS":
+            summary["volume"] += amount
+        if row["status"] == "DECLINED":
+            summary["declined"] += 1
+            declines["count"] += 1
+            declines["declined_amount"] += amount
+            streak += 1
+            declines["longest_streak"] = max(declines["longest_streak"], streak)
+        else:
+            streak = 0
+        day = daily.setdefault(row["timestamp"].date(), {"net_flow": 0.0, "count": 0})
+        day["net_flow"] += flow
+        day["count"] += 1
+        day["closing_balance"] = balance
+        if balance < 0 and overdraft is None:
+            overdraft = {"start": index, "lowest_balance": balance}
+        elif balance < 0:
+            overdraft["lowest_balance"] = min(overdraft["lowest_balance"], balance)
+        elif overdraft is not None:
+            overdraft["rows"] = index - overdraft["start"]
+            overdrafts.append(overdraft)
+            overdraft = None
+        previous = balance
+    if overdraft is not None:
+        overdraft["rows"] = len(rows) - overdraft["start"]
+        overdrafts.append(overdraft)
+    declines["rate"] = declines["count"] / len(rows)
+    return {"opening_balance": opening, "by_type": by_type, "daily": daily, "overdrafts": overdrafts, "declines": declines}
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    fill(args.rows, random.Random(0))
+    rows, row_load = timed(db.get_ledger, ACCOUNT_ID)
+    columns, column_load = timed(analytics.LedgerColumns.from_db, ACCOUNT_ID)
+    expected, row_compute = timed(summarize_rows, rows)
+    summary, column_compute = timed(analytics.summarize, columns)
+
+    assert summary["opening_balance"] == expected["opening_balance"]
+    assert summary["by_type"] == expected["by_type"]
+    assert summary["declines"] == expected["declines"]
+    assert [day["net_flow"] for day in summary["daily"]] == [day["net_flow"] for day in expected["daily"].values()]
+    assert [interval["lowest_balance"] for interval in summary["overdrafts"]] == [
+        interval["lowest_balance"] for interval in expected["overdrafts"]
+    ]
+
+    print(f"{args.rows} rows, {len(summary['overdrafts'])} overdraft intervals, {len(summary['daily'])} days")
+    print(f"{'':<10} {'row-by-row s':>13} {'numpy s':>9} {'speedup':>8}")
+    print(f"{'load':<10} {row_load:>13.3f} {column_load:>9.3f} {row_load / column_load:>7.1f}x")
+    print(f"{'compute':<10} {row_compute:>13.3f} {column_compute:>9.3f} {row_compute / column_compute:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Throughput of the transaction endpoints with blocking vs. offloaded db calls.
+
+"blocking" replaces every async_db helper with a coroutine that calls db
+directly on the event loop (the behavior before async_db existed); "offloaded"
+uses async_db as shipped. Requests are driven in-process through httpx's ASGI
+transport by 1, 10 and 100 concurrent clients.
+
+    python -m benchmarks.bench_async_db [--seconds 3]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix="qa-bank-bench-"), "bench.sqlite")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DB_FILE}")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx
+import async_db
+import db
+import main
+import models
+
+CONCURRENCY = [1, 10, 100]
+ACCOUNTS = 100
+
+def blocking(fn):
+    async def wrapper(*args, **kwargs):
+        return fn(*args, **kwargs)
+    return wrapper
+
+OFFLOADED = {name: getattr(async_db, name) for name in dir(async_db)
+             if hasattr(getattr(async_db, name), "__wrapped__")}
+
+def set_mode(mode):
+    for name, helper in OFFLOADED.items():
+        if mode == "blocking":
+            helper = blocking(helper.__wrapped__)
+        setattr(async_db, name, helper)
+
+async def client_loop(client, account_ids, deadline, worker):
+    done = 0
+    i = worker
+    while time.perf_counter() < deadline:
+        account_id = account_ids[i % len(account_ids)]
+        await client.post("/account/deposit", json={"account_id": account_id, "amount": 1})
+        await client.get(f"/accounts/{account_id}")
+        done += 2
+        i += 1
+    return done
+
+async def measure(clients, account_ids, seconds):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        deadline = start + seconds
+        counts = await asyncio.gather(*[client_loop(client, account_ids, deadline, w) for w in range(clients)])
+        elapsed = time.perf_counter() - start
+    return sum(counts) / elapsed
+
+def seed():
+    account_ids = []
+    for i in range(ACCOUNTS):
+        account = models.Account(f"bench_user_{i}", 1000)
+        db.insert_account(account)
+        account_ids.append(str(account.account_ID))
+    return account_ids
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--mode", choices=["blocking", "offloaded"], default=None)
+    args = parser.parse_args()
+
+    account_ids = seed()
+    modes = [args.mode] if args.mode else ["offloaded", "blocking"]
+    print(f"{'mode':<10} {'clients':>8} {'req/s':>10}")
+    for mode in modes:
+        set_mode(mode)
+        for clients in CONCURRENCY:
+            throughput = asyncio.run(measure(clients, account_ids, args.seconds))
+            print(f"{mode:<10} {clients:>8} {throughput:>10.0f}")
+
+if __name__ == "__main__":
+    main_cli()
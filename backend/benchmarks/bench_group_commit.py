@@ -0,0 +1,79 @@
+"""
+Write throughput with a commit per operation vs. group commit.
+
+Concurrent clients run deposits and transfers through async_db (one
+transaction each) and through group_commit's writer (shared transactions),
+on a SQLite file with synchronous=FULL so every commit is an fsync. Set
+SQLITE_SYNCHRONOUS=NORMAL to compare without per-commit fsyncs.
+
+    python -m benchmarks.bench_group_commit [--seconds 3] [--clients 1 10 100]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix="qa-bank-bench-"), "bench.sqlite")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DB_FILE}")
+os.environ.setdefault("SQLITE_SYNCHRONOUS", "FULL")
+# per-operation commits queue on the write lock; that shows up as throughput, not log lines
+os.environ.setdefault("SLOW_QUERY_MS", "10000")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import async_db
+import db
+import group_commit
+import models
+
+ACCOUNTS = 100
+
+def seed():
+    usernames = []
+    for i in range(ACCOUNTS):
+        account = models.Account(f"bench_user_{i}", 10 ** 9)
+        account.policy = models.Policy(dailyWithdrawalLimit=float("inf"))
+        db.insert_account(account)
+        db.insert_user_account(f"bench_user_{i}", str(account.account_ID))
+        usernames.append((str(account.account_ID), f"bench_user_{i}"))
+    return usernames
+
+async def client_loop(writes, accounts, deadline, worker):
+    done = 0
+    i = worker
+    while time.perf_counter() < deadline:
+        account_id, username = accounts[i % len(accounts)]
+        if i % 4:
+            await writes.apply_transaction(account_id, models.TransactionType.DEPOSIT, 1)
+        else:
+            target = accounts[(i + 1) % len(accounts)][1]
+            await writes.transfer(username, target, 1)
+        done += 1
+        i += 7
+    return done
+
+async def measure(writes, clients, accounts, seconds):
+    start = time.perf_counter()
+    deadline = start + seconds
+    counts = await asyncio.gather(*[client_loop(writes, accounts, deadline, w) for w in range(clients)])
+    return sum(counts) / (time.perf_counter() - start)
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 100])
+    args = parser.parse_args()
+
+    accounts = seed()
+    print(f"synchronous={os.environ['SQLITE_SYNCHRONOUS']}")
+    print(f"{'clients':>8} {'per-op ops/s':>14} {'group ops/s':>12} {'speedup':>8} {'mean group':>11}")
+    for clients in args.clients:
+        per_op = asyncio.run(measure(async_db, clients, accounts, args.seconds))
+        group_commit.writer.groups = group_commit.writer.operations = 0
+        grouped = asyncio.run(measure(group_commit, clients, accounts, args.seconds))
+        mean_group = group_commit.writer.stats()["mean_group_size"]
+        print(f"{clients:>8} {per_op:>14.0f} {grouped:>12.0f} {grouped / per_op:>7.1f}x {mean_group:>11.1f}")
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,76 @@
+"""
+get_ledger latency as the global ledger grows.
+
+The ledger is filled cumulatively up to each size, with rows spread over
+`size / rows_per_account` accounts so every account has a similar history
+length. The timing covers get_ledger for randomly chosen accounts, so it
+should stay flat as the table grows if ix_ledger_account_timestamp is used.
+
+    python -m benchmarks.bench_ledger_lookup [--sizes 10000 100000 1000000 10000000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix="qa-bank-bench-"), "bench.sqlite")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DB_FILE}")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import db
+
+ROWS_PER_ACCOUNT = 100
+CHUNK = 50_000
+START = datetime(2024, 1, 1)
+
+def fill(start, stop):
+    # ledger rows start..stop, round-robin over accounts so histories interleave like real traffic
+    accounts = max(stop // ROWS_PER_ACCOUNT, 1)
+    with db.engine.begin() as conn:
+        for chunk_start in range(start, stop, CHUNK):
+            conn.execute(db.ledger.insert(), [
+                {
+                    "amount": 10,
+                    "current_balance": 1000,
+                    "tx_type": "DEPOSIT",
+                    "account_ID": f"acct-{i % accounts}",
+                    "timestamp": START + timedelta(seconds=i),
+                    "tx_ID": f"tx-{i}",
+                    "status": "SUCCESS",
+                    "counterparty": None,
+                }
+                for i in range(chunk_start, min(chunk_start + CHUNK, stop))
+            ])
+    return accounts
+
+def time_lookups(accounts, lookups, rng):
+    timings = []
+    for _ in range(lookups):
+        account_ID = f"acct-{rng.randrange(accounts)}"
+        start = time.perf_counter()
+        db.get_ledger(account_ID)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    filled = 0
+    print(f"{'rows':>12} {'mean ms':>9} {'p99 ms':>9}")
+    for size in sorted(args.sizes):
+        accounts = fill(filled, size)
+        filled = size
+        timings = time_lookups(accounts, args.lookups, rng)
+        p99 = statistics.quantiles(timings, n=100)[98]
+        print(f"{size:>12} {statistics.mean(timings):>9.3f} {p99:>9.3f}")
+
+if __name__ == "__main__":
+    main()
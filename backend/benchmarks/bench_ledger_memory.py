@@ -0,0 +1,68 @@
+"""
+Memory per transaction for the in-process ledger representations.
+
+Compares the pre-__slots__ Transaction (a plain __dict__ object, reproduced
+here), the slotted models.Transaction in a list-backed Ledger, and
+ColumnarLedger. Each run keeps `--count` transactions alive and reports the
+traced allocation per transaction.
+
+    python -m benchmarks.bench_ledger_memory [--count 1000000]
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import models
+
+START = datetime(2024, 1, 1)
+ACCOUNT_ID = uuid.uuid4()
+
+class DictTransaction:
+    # models.Transaction before it gained __slots__
+    def __init__(self, user_id, amount, tx_type, current_balance, timestamp, tx_ID=None, counterparty=None):
+        self.tx_ID = tx_ID or uuid.uuid4()
+        self.user_id = user_id
+        self.amount = amount
+        self.tx_type = tx_type
+        self.timestamp = timestamp
+        self.current_balance = current_balance
+        self.status = models.StatusType.PROCESSING
+        self.counterparty = counterparty
+
+def transactions(tx_class, count):
+    for i in range(count):
+        tx = tx_class(ACCOUNT_ID, i % 100 + 0.5, models.TransactionType.DEPOSIT, 1000.0 + i, START + timedelta(microseconds=i))
+        tx.status = models.StatusType.SUCCESS
+        yield tx
+
+def measure(build, count):
+    gc.collect()
+    tracemalloc.start()
+    ledger = build(count)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del ledger
+    return size / count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--count", type=int, default=200_000)
+    args = parser.parse_args()
+
+    variants = {
+        "dict Transaction + list": lambda count: models.Ledger(list(transactions(DictTransaction, count))),
+        "slotted Transaction + list": lambda count: models.Ledger(list(transactions(models.Transaction, count))),
+        "ColumnarLedger": lambda count: models.ColumnarLedger(list(transactions(models.Transaction, count))),
+    }
+    print(f"{'ledger':<28} {'bytes/tx':>9}")
+    for name, build in variants.items():
+        print(f"{name:<28} {measure(build, args.count):>9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Username autocomplete latency with the in-memory search index.
+
+Builds a UsernameIndex over synthetic usernames and times searches for
+substrings of 1-6 characters taken from existing names, plus terms of 1-6
+characters that match nothing (letters no syllable uses). `--sql` also times the old ILIKE '%term%' query against the same
+names in SQLite, for comparison.
+
+    python -m benchmarks.bench_username_search [--users 1000000] [--sql]
+"""
+import argparse
+import os
+import random
+import statistics
+import string
+import sys
+import tempfile
+import time
+
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix="qa-bank-bench-"), "bench.sqlite")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DB_FILE}")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from search_index import UsernameIndex
+
+SYLLABLES = ["al", "be", "ca", "do", "el", "fi", "ga", "ho", "is", "ja", "ka", "lu", "ma", "ne", "or", "pa", "ri", "sa", "to", "vi"]
+UNUSED_LETTERS = "".join(sorted(set(string.ascii_lowercase) - set("".join(SYLLABLES))))
+
+def make_usernames(count, rng):
+    names = set()
+    while len(names) < count:
+        stem = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        names.add(f"{stem}{rng.choice(['', '_', '.'])}{rng.randint(0, 9999)}")
+    return list(names)
+
+def make_terms(usernames, count, rng):
+    terms = []
+    for _ in range(count):
+        if rng.random() < 0.1:
+            terms.append("".join(rng.choice(UNUSED_LETTERS) for _ in range(rng.randint(1, 6))))
+            continue
+        name = rng.choice(usernames)
+        length = rng.randint(1, 6)
+        start = rng.randint(0, max(len(name) - length, 0))
+        terms.append(name[start:start + length])
+    return terms
+
+def percentiles(timings):
+    cuts = statistics.quantiles(timings, n=100)
+    return statistics.median(timings), cuts[94], cuts[98]
+
+def time_calls(search, terms):
+    timings = []
+    for term in terms:
+        start = time.perf_counter()
+        search(term)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--sql", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    usernames = make_usernames(args.users, rng)
+    terms = make_terms(usernames, args.queries, rng)
+
+    start = time.perf_counter()
+    index = UsernameIndex()
+    index.build(usernames)
+    print(f"built index over {args.users} usernames in {time.perf_counter() - start:.1f}s")
+
+    print(f"{'backend':<8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    p50, p95, p99 = percentiles(time_calls(index.search, terms))
+    print(f"{'index':<8} {p50:>8.3f} {p95:>8.3f} {p99:>8.3f}")
+
+    if args.sql:
+        import db
+        from sqlalchemy import select
+        with db.engine.begin() as conn:
+            conn.execute(db.user_accounts.insert(), [{"username": name, "account_ID": name} for name in usernames])
+
+        def ilike(term):
+            statement = select(db.user_accounts.c.username).where(
+                db.user_accounts.c.username.ilike(f"%{term}%")
+            ).limit(10)
+            with db.engine.connect() as conn:
+                return conn.execute(statement).all()
+
+        p50, p95, p99 = percentiles(time_calls(ilike, terms[:200]))
+        print(f"{'ilike':<8} {p50:>8.3f} {p95:>8.3f} {p99:>8.3f}")
+
+if __name__ == "__main__":
+    main()
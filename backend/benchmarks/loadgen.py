@@ -0,0 +1,318 @@
+"""
+Concurrent load generator for the API, with per-endpoint latency histograms
+and a lost-update check.
+
+N virtual users share a seeded population of accounts (each with a
+username, so transfers and search have something to hit) and issue a
+weighted mix of deposits, withdrawals, transfers, username searches and
+ledger reads as fast as the server answers. The report gives throughput,
+p50/p95/p99/p99.9 latency and error counts per endpoint. Afterwards the sum
+of the population's balances must equal their opening total plus the net of
+the SUCCESS deposits and withdrawals in their ledgers (transfers between them
+net to zero), so a lost or doubled balance update fails the run.
+
+    python -m benchmarks.loadgen [--users 50] [--requests 20000 | --seconds 30] [--seed 1]
+    python -m benchmarks.loadgen --url http://127.0.0.1:8000 ...
+
+By default requests go to the FastAPI app in-process through httpx's ASGI
+transport, on a throwaway SQLite file. With --url they go to a running
+server instead. Either way the population is created through POST /accounts,
+usernames included, so the server's search index sees them.
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix="qa-bank-bench-"), "bench.sqlite")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DB_FILE}")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx
+
+ENDPOINTS = {
+    "deposit": "POST /account/deposit",
+    "withdraw": "POST /accounts/withdraw",
+    "transfer": "POST /accounts/transfer",
+    "search": "POST /user/search",
+    "ledger": "GET /accounts/ledger/{id}",
+}
+
+PERCENTILES = (50, 95, 99, 99.9)
+
+class LatencyHistogram:
+    """Log-bucketed latencies: 8 buckets per doubling (~9% resolution) in constant memory"""
+    SUB_BUCKETS = 8
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, seconds):
+        micros = max(seconds * 1e6, 1.0)
+        bucket = int(math.log2(micros) * self.SUB_BUCKETS)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def bucket_upper(self, bucket):
+        # upper bound of a bucket in seconds
+        return 2 ** ((bucket + 1) / self.SUB_BUCKETS) / 1e6
+
+    def percentile(self, p):
+        """Upper bound of the bucket holding the p-th percentile (never above the slowest sample)"""
+        if not self.count:
+            return None
+        target = math.ceil(p / 100 * self.count)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= target:
+                return min(self.bucket_upper(bucket), self.max)
+        return self.max
+
+    def summary(self):
+        """Latencies in milliseconds"""
+        if not self.count:
+            return {}
+        summary = {"mean": self.total / self.count * 1e3, "min": self.min * 1e3}
+        summary.update({f"p{p:g}": self.percentile(p) * 1e3 for p in PERCENTILES})
+        summary["max"] = self.max * 1e3
+        return {key: round(value, 3) for key, value in summary.items()}
+
+    def buckets(self):
+        """[upper bound in ms, count] per non-empty bucket"""
+        return [[round(self.bucket_upper(bucket) * 1e3, 4), self.counts[bucket]] for bucket in sorted(self.counts)]
+
+class LoadConfig:
+    def __init__(
+        self,
+        users=50,
+        requests=20_000,
+        seconds=None,
+        accounts=200,
+        seed=0,
+        mix=None,
+        amounts=(1, 500),
+        opening_balances=(1, 5000)
+    ):
+        self.users = users
+        # stop after this many requests in total, or after seconds if given
+        self.requests = requests
+        self.seconds = seconds
+        self.accounts = accounts
+        self.seed = seed
+        # relative weights of the ENDPOINTS keys
+        self.mix = mix or {"deposit": 30, "withdraw": 25, "transfer": 25, "search": 10, "ledger": 10}
+        self.amounts = amounts
+        self.opening_balances = opening_balances
+        if self.accounts < 2:
+            raise ValueError("transfers need at least two accounts")
+        if self.opening_balances[0] < 1:
+            raise ValueError("opening balances must be positive, as POST /accounts requires")
+        if unknown := set(self.mix) - set(ENDPOINTS):
+            raise ValueError(f"unknown operations in mix: {sorted(unknown)}")
+
+class EndpointStats:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.requests = 0
+        self.declined = 0
+        self.errors = {}
+
+    def error(self, reason):
+        self.errors[reason] = self.errors.get(reason, 0) + 1
+
+async def seed_population(client, config):
+    """Create config.accounts accounts, each with a username, through the API"""
+    rng = random.Random(f"{config.seed}/population")
+    # usernames are unique per run so repeated runs can share a database
+    run = uuid.uuid4().hex[:8]
+    population = []
+    for n in range(config.accounts):
+        username = f"load_{run}_{n}"
+        response = await client.post("/accounts", json={
+            "name": username, "initial_deposit": rng.randint(*config.opening_balances), "username": username
+        })
+        response.raise_for_status()
+        account = response.json()
+        population.append({"account_ID": account["account_ID"], "username": username, "opening": account["balance"]})
+    return population
+
+def make_request(operation, rng, config, population):
+    """(method, url, json body) for one operation on random accounts"""
+    account = population[int(rng.random() * len(population))]
+    amount = rng.randint(*config.amounts)
+    if operation == "deposit":
+        return "POST", "/account/deposit", {"account_id": account["account_ID"], "amount": amount}
+    if operation == "withdraw":
+        return "POST", "/accounts/withdraw", {"account_id": account["account_ID"], "amount": amount}
+    if operation == "transfer":
+        target = account
+        while target is account:
+            target = population[int(rng.random() * len(population))]
+        return "POST", "/accounts/transfer", {
+            "from_username": account["username"], "target_username": target["username"], "amount": amount
+        }
+    if operation == "search":
+        username = account["username"]
+        return "POST", "/user/search", {"search_term": username[:rng.randint(6, len(username))]}
+    return "GET", f"/accounts/ledger/{account['account_ID']}", None
+
+def classify(response):
+    """Error reason for a response, "declined" for a declined transaction, or None"""
+    if response.status_code >= 400:
+        return f"HTTP {response.status_code}"
+    body = response.json()
+    if isinstance(body, dict):
+        if body.get("success") is False:
+            return body.get("error", "success=false")
+        if body.get("transaction", {}).get("status") == "DECLINED":
+            return "declined"
+    return None
+
+async def virtual_user(client, config, user, population, stats, budget, deadline):
+    rng = random.Random(f"{config.seed}/{user}")
+    operations = list(config.mix)
+    weights = [config.mix[operation] for operation in operations]
+    cumulative = [sum(weights[:i + 1]) / sum(weights) for i in range(len(weights))]
+    cumulative[-1] = 1.0
+    # budget is shared by every user; the event loop is single threaded so no lock is needed
+    while budget["left"] > 0 and (deadline is None or time.perf_counter() < deadline):
+        budget["left"] -= 1
+        operation = operations[bisect.bisect(cumulative, rng.random())]
+        method, url, body = make_request(operation, rng, config, population)
+        endpoint = stats[operation]
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, json=body)
+            outcome = classify(response)
+        except (httpx.HTTPError, ValueError) as e:
+            outcome = type(e).__name__
+        endpoint.latency.record(time.perf_counter() - start)
+        endpoint.requests += 1
+        if outcome == "declined":
+            endpoint.declined += 1
+        elif outcome:
+            endpoint.error(outcome)
+
+async def check_conservation(client, population):
+    """Sum of balances against opening balances plus the SUCCESS deposits and withdrawals in the ledger"""
+    balances = {account["account_ID"]: account["balance"] for account in (await client.get("/accounts", params={"all": "true"})).json()}
+    opening_total = sum(account["opening"] for account in population)
+    ledger_net = 0
+    for account in population:
+        rows = (await client.get(f"/accounts/ledger/{account['account_ID']}", params={"all": "true"})).json()
+        for row in rows:
+            if row["status"] == "SUCCESS" and row["tx_type"] in ("DEPOSIT", "WITHDRAWAL"):
+                ledger_net += row["amount"] if row["tx_type"] == "DEPOSIT" else -row["amount"]
+    expected = opening_total + ledger_net
+    actual = sum(balances.get(account["account_ID"], 0) for account in population)
+    return {"ok": expected == actual, "expected_total": expected, "actual_total": actual, "difference": actual - expected}
+
+async def run_load(client, config):
+    """Seed the population, run every virtual user to completion and return the report"""
+    population = await seed_population(client, config)
+    stats = {operation: EndpointStats() for operation in config.mix}
+    budget = {"left": config.requests if config.seconds is None else math.inf}
+
+    start = time.perf_counter()
+    deadline = start + config.seconds if config.seconds is not None else None
+    await asyncio.gather(*[
+        virtual_user(client, config, user, population, stats, budget, deadline) for user in range(config.users)
+    ])
+    elapsed = time.perf_counter() - start
+
+    endpoints = {}
+    for operation, endpoint in stats.items():
+        endpoints[ENDPOINTS[operation]] = {
+            "requests": endpoint.requests,
+            "throughput_rps": round(endpoint.requests / elapsed, 1),
+            "declined": endpoint.declined,
+            "errors": sum(endpoint.errors.values()),
+            "error_reasons": endpoint.errors,
+            "latency_ms": endpoint.latency.summary(),
+            "histogram_ms": endpoint.latency.buckets(),
+        }
+    requests = sum(endpoint.requests for endpoint in stats.values())
+    conservation = await check_conservation(client, population)
+    return {
+        "seed": config.seed,
+        "users": config.users,
+        "accounts": config.accounts,
+        "requests": requests,
+        "errors": sum(endpoint["errors"] for endpoint in endpoints.values()),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        "endpoints": endpoints,
+        "invariants": {"conservation": conservation},
+        "ok": conservation["ok"],
+    }
+
+def print_report(report):
+    print(f"{report['requests']} requests from {report['users']} users in {report['elapsed_seconds']} s "
+          f"({report['throughput_rps']} req/s)")
+    columns = ("p50", "p95", "p99", "p99.9", "max")
+    print(f"{'endpoint':<28} {'req/s':>8} {'declined':>9} {'errors':>7} " + " ".join(f"{column + ' ms':>9}" for column in columns))
+    for name, endpoint in report["endpoints"].items():
+        latency = endpoint["latency_ms"]
+        print(f"{name:<28} {endpoint['throughput_rps']:>8} {endpoint['declined']:>9} {endpoint['errors']:>7} "
+              + " ".join(f"{latency.get(column, 0):>9.2f}" for column in columns))
+        for reason, count in endpoint["error_reasons"].items():
+            print(f"    {count} x {reason}")
+    conservation = report["invariants"]["conservation"]
+    print(f"conservation: {'ok' if conservation['ok'] else 'FAILED'} "
+          f"(expected {conservation['expected_total']}, actual {conservation['actual_total']})")
+
+def parse_mix(text):
+    # "deposit=3,withdraw=2" -> {"deposit": 3.0, "withdraw": 2.0}
+    return {name: float(weight) for name, weight in (part.split("=") for part in text.split(","))}
+
+async def run_cli(args, config):
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        import main
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://loadgen", timeout=args.timeout)
+    async with client:
+        return await run_load(client, config)
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default=None, help="target a running server instead of the in-process app")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--seconds", type=float, default=None, help="run for this long instead of a request count")
+    parser.add_argument("--accounts", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mix", type=parse_mix, default=None, help="e.g. deposit=30,withdraw=25,transfer=25,search=10,ledger=10")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout in seconds")
+    parser.add_argument("--output", default=None, help="also write the full report (with histograms) as JSON")
+    args = parser.parse_args()
+
+    config = LoadConfig(
+        users=args.users, requests=args.requests, seconds=args.seconds,
+        accounts=args.accounts, seed=args.seed, mix=args.mix
+    )
+    report = asyncio.run(run_cli(args, config))
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+        print(f"wrote {args.output}")
+    raise SystemExit(0 if report["ok"] and not report["errors"] else 1)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,221 @@
+"""
+Benchmark suite for the model, DB and API hot paths, with JSON results and
+regression checks against a saved baseline.
+
+    python -m benchmarks run [--sizes 1000 10000 100000] [--filter db.] [--output results.json]
+    python -m benchmarks compare baseline.json results.json [--threshold 0.15]
+
+`run` times every case and writes {"meta": ..., "results": {case: stats}}.
+DB cases run once per ledger size (the tables are filled cumulatively);
+endpoint cases go through the FastAPI app in-process via httpx's ASGI
+transport, at the largest size. `compare` exits 1 if any case's median got
+slower than the baseline by more than the threshold.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timedelta
+
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix="qa-bank-bench-"), "bench.sqlite")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DB_FILE}")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import httpx
+import db
+import main
+import models
+from benchmarks.bench_username_search import make_terms, make_usernames
+
+ROWS_PER_ACCOUNT = 100
+CHUNK = 50_000
+START = datetime(2024, 1, 1)
+
+def measure(fn, repeat=5, min_time=0.05):
+    """Per-call timings of fn: calls are batched until a batch takes min_time, then batches are repeated"""
+    timer = timeit.Timer(fn)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    samples = [seconds / number * 1e6 for seconds in timer.repeat(repeat, number)]
+    return {
+        "median_us": statistics.median(samples),
+        "min_us": min(samples),
+        "max_us": max(samples),
+        "ops_per_s": 1e6 / statistics.median(samples),
+        "calls": number * repeat,
+    }
+
+def unlimited_account(balance=10 ** 12):
+    account = models.Account("bench", balance)
+    account.policy = models.Policy(maxDeposit=10 ** 12, maxWithdrawal=10 ** 12, dailyWithdrawalLimit=float("inf"))
+    return account
+
+def model_cases():
+    payer, payee = unlimited_account(), unlimited_account()
+    return {
+        "models.Account.deposit": lambda: payer.deposit(1),
+        "models.Account.withdraw": lambda: payer.withdraw(1),
+        "models.Account.payment": lambda: payer.payment(payee, 1),
+    }
+
+def fill_ledger(start, stop):
+    # ledger rows start..stop spread over accounts with ROWS_PER_ACCOUNT rows each
+    accounts = max(stop // ROWS_PER_ACCOUNT, 1)
+    with db.engine.begin() as conn:
+        for chunk_start in range(start, stop, CHUNK):
+            conn.execute(db.ledger.insert(), [
+                {
+                    "amount": 10, "current_balance": 1000, "tx_type": "DEPOSIT",
+                    "account_ID": f"acct-{i % accounts}", "timestamp": START + timedelta(seconds=i),
+                    "tx_ID": f"tx-{i}", "status": "SUCCESS", "counterparty": None,
+                }
+                for i in range(chunk_start, min(chunk_start + CHUNK, stop))
+            ])
+    return accounts
+
+def fill_usernames(usernames):
+    with db.engine.begin() as conn:
+        conn.execute(db.user_accounts.insert(), [{"username": name, "account_ID": name} for name in usernames])
+    db.rebuild_username_index()
+
+def db_cases(accounts, terms, rng):
+    account = unlimited_account()
+    db.insert_account(account)
+
+    def insert_transaction():
+        db.insert_transaction(account.deposit(1))
+
+    return {
+        "db.insert_transaction": insert_transaction,
+        "db.get_ledger": lambda: db.get_ledger(f"acct-{rng.randrange(accounts)}"),
+        "db.search_usernames": lambda: db.search_usernames(rng.choice(terms)),
+    }
+
+def endpoint_cases(accounts, terms, rng):
+    loop = asyncio.new_event_loop()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench")
+    account = models.Account("bench_endpoint", 10 ** 9)
+    db.insert_account(account)
+    account_id = str(account.account_ID)
+
+    def call(method, url, **kwargs):
+        return lambda: loop.run_until_complete(client.request(method, url, **kwargs))
+
+    return {
+        "api.POST /account/deposit": call("POST", "/account/deposit", json={"account_id": account_id, "amount": 1}),
+        "api.GET /accounts/{id}": call("GET", f"/accounts/{account_id}"),
+        "api.GET /accounts/ledger/{id}": lambda: loop.run_until_complete(
+            client.get(f"/accounts/ledger/acct-{rng.randrange(accounts)}")
+        ),
+        "api.POST /user/search": lambda: loop.run_until_complete(
+            client.post("/user/search", json={"search_term": rng.choice(terms)})
+        ),
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(__file__)
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(args):
+    rng = random.Random(0)
+    results = {}
+
+    def record(name, fn):
+        if args.filter and args.filter not in name:
+            return
+        results[name] = measure(fn, repeat=args.repeat, min_time=args.min_time)
+        print(f"{name:<44} {results[name]['median_us']:>12.1f} us")
+
+    for name, fn in model_cases().items():
+        record(name, fn)
+
+    # usernames grow with the ledger so search is measured at the same scale
+    usernames = make_usernames(max(args.sizes), rng)
+    filled = 0
+    terms = []
+    for size in sorted(args.sizes):
+        accounts = fill_ledger(filled, size)
+        fill_usernames(usernames[filled:size])
+        terms = make_terms(usernames[:size], 500, rng)
+        filled = size
+        for name, fn in db_cases(accounts, terms, rng).items():
+            record(f"{name}[rows={size}]", fn)
+
+    for name, fn in endpoint_cases(max(filled // ROWS_PER_ACCOUNT, 1), terms, rng).items():
+        record(f"{name}[rows={filled}]", fn)
+
+    report = {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": sorted(args.sizes),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    print(f"wrote {args.output}")
+
+def compare(args):
+    with open(args.baseline) as baseline_file, open(args.current) as current_file:
+        baseline = json.load(baseline_file)["results"]
+        current = json.load(current_file)["results"]
+
+    regressions = []
+    print(f"{'case':<44} {'baseline us':>12} {'current us':>12} {'change':>8}")
+    for name in sorted(set(baseline) | set(current)):
+        if name not in current or name not in baseline:
+            print(f"{name:<44} {'only in ' + ('baseline' if name in baseline else 'current'):>34}")
+            continue
+        before, after = baseline[name]["median_us"], current[name]["median_us"]
+        change = after / before - 1
+        flag = ""
+        if change > args.threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -args.threshold:
+            flag = "  faster"
+        print(f"{name:<44} {before:>12.1f} {after:>12.1f} {change:>+7.1%}{flag}")
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+        raise SystemExit(1)
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="time every case and write JSON results")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    run_parser.add_argument("--filter", default=None, help="only cases whose name contains this")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--min-time", type=float, default=0.05, help="seconds per timed batch")
+    run_parser.add_argument("--output", default="benchmark-results.json")
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="flag cases slower than a saved baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown, e.g. 0.15 for 15%%")
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,107 @@
+"""
+Bounded in-process caches shared by the db helpers.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+# value of an entry removed with a version, kept so older puts cannot bring the key back
+DELETED = object()
+
+class LRUCache:
+    """Thread-safe mapping that evicts the least recently used key beyond maxsize.
+
+    With a ttl (seconds), entries older than ttl are treated as missing.
+    Writers that finish out of order can pass a version to put() and pop():
+    a put older than the key's current version is ignored.
+    Hits, misses and evictions are counted for stats().
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at, _ = entry
+            if value is DELETED:
+                self.misses += 1
+                return default
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, version=None):
+        # returns False if the key already holds a newer version
+        with self.lock:
+            entry = self.entries.get(key)
+            if version is not None and entry is not None and entry[2] is not None and entry[2] > version:
+                return False
+            self.store(key, value, version)
+            return True
+
+    def add(self, key, value):
+        # put only if key is absent, so a slow reader cannot overwrite a newer write-through
+        with self.lock:
+            if key in self.entries:
+                return False
+            self.store(key, value)
+            return True
+
+    def store(self, key, value, version=None):
+        # caller holds the lock
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        self.entries[key] = (value, expires_at, version)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None, version=None):
+        # with a version, the key stays behind as deleted until a newer put
+        with self.lock:
+            if version is None:
+                entry = self.entries.pop(key, None)
+            else:
+                entry = self.entries.get(key)
+                if entry is not None and entry[2] is not None and entry[2] > version:
+                    return default
+                self.store(key, DELETED, version)
+            return default if entry is None or entry[0] is DELETED else entry[0]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def __contains__(self, key):
+        entry = self.entries.get(key)
+        return entry is not None and entry[0] is not DELETED
+
+    def __len__(self):
+        return len(self.entries)
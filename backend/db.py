@@ -1,10 +1,70 @@
-from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, Boolean, DateTime, JSON
+from sqlalchemy import bindparam, create_engine, event, func, inspect, make_url, text, tuple_, MetaData, Table, Column, Index, Integer, String, Boolean, Date, DateTime, JSON, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.pool import StaticPool
+import base64
 import hashlib
+import itertools
+import json
+import metrics
+import models
+from cache import LRUCache
+from search_index import UsernameIndex
 from enum import Enum
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
+import threading
 
-engine = create_engine(os.getenv('DATABASE_URL', 'sqlite:///mydatabase.sqlite'), echo=True)
+def create_engine_from_env(url=None):
+    """Build the engine from DATABASE_URL and the DB_* / SQLITE_* environment variables.
+
+    DB_ECHO           SQL logging: 0 (default), 1, or debug
+    DB_POOL_SIZE      pooled connections kept open (default 5)
+    DB_MAX_OVERFLOW   extra connections allowed under load (default 10)
+    SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_BUSY_TIMEOUT_MS, SQLITE_CACHE_SIZE
+                      pragmas applied to every new SQLite connection
+                      (defaults WAL, NORMAL, 5000, -20000 i.e. 20 MB; synchronous
+                      defaults to FULL with GROUP_COMMIT=1, where each fsync
+                      is shared by a whole group of requests)
+    """
+    url = make_url(url or os.getenv('DATABASE_URL', 'sqlite:///mydatabase.sqlite'))
+    echo = os.getenv('DB_ECHO', '0').lower()
+    options = {'echo': 'debug' if echo == 'debug' else echo in ('1', 'true', 'yes')}
+
+    if url.get_backend_name() != 'sqlite':
+        options['pool_size'] = int(os.getenv('DB_POOL_SIZE', '5'))
+        options['max_overflow'] = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+        return metrics.instrument_engine(create_engine(url, **options))
+
+    in_memory = url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'
+    if in_memory:
+        # one shared connection, otherwise every thread would see its own empty database
+        options['poolclass'] = StaticPool
+        options['connect_args'] = {'check_same_thread': False, **metrics.sqlite_connect_args()}
+    else:
+        options['connect_args'] = metrics.sqlite_connect_args()
+        options['pool_size'] = int(os.getenv('DB_POOL_SIZE', '5'))
+        options['max_overflow'] = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+    new_engine = create_engine(url, **options)
+
+    pragmas = {
+        'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'FULL' if os.getenv('GROUP_COMMIT') == '1' else 'NORMAL'),
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+        'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', '-20000')),
+    }
+    if not in_memory:
+        # WAL lets readers run alongside the writer; it does not apply to :memory:
+        pragmas['journal_mode'] = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+
+    @event.listens_for(new_engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return metrics.instrument_engine(new_engine)
+
+engine = create_engine_from_env()
 
 meta = MetaData()
 
@@ -22,10 +82,12 @@ accounts = Table(
     Column('policy_ID', String),
 )
 
+# policies are content-addressed: policy_ID is a hash of the limits, so accounts with
+# the same limits share one row (accounts.policy_ID points here)
 policies = Table(
     "policies",
     meta,
-    Column('account_ID', String, primary_key=True, nullable=False),
+    Column('policy_ID', String, primary_key=True, nullable=False),
     Column('max_deposit', Integer),
     Column('max_withdrawal', Integer),
     Column('daily_withdrawal_limit', Integer),
@@ -41,9 +103,12 @@ ledger = Table(
     Column('tx_type', Integer),
     Column('account_ID', String),
     Column('timestamp', DateTime),
-    Column('tx_ID', String),
+    Column('tx_ID', String, primary_key=True),
     Column('status', String),
-    Column('counterparty', String)
+    Column('counterparty', String),
+    # tx_ID is included so per-account history can be walked in (timestamp, tx_ID) order
+    Index('ix_ledger_account_timestamp', 'account_ID', 'timestamp', 'tx_ID'),
+    Index('ix_ledger_counterparty', 'counterparty')
 )
 
 policy_requests = Table(
@@ -54,7 +119,18 @@ policy_requests = Table(
     Column('status', String, nullable=False),
     Column('policy_request', JSON, nullable=False),
     Column('created_at', DateTime, nullable=False),
-    Column('updated_at', DateTime, nullable=False)
+    Column('updated_at', DateTime, nullable=False),
+    Index('ix_policy_requests_status_created_at', 'status', 'created_at'),
+    Index('ix_policy_requests_user_id', 'user_id')
+)
+
+# running total of each account's withdrawals and outgoing payments per (UTC) day
+daily_withdrawals = Table(
+    "daily_withdrawals",
+    meta,
+    Column('account_ID', String, primary_key=True, nullable=False),
+    Column('day', Date, primary_key=True, nullable=False),
+    Column('total', Integer, nullable=False)
 )
 
 user_accounts = Table(
@@ -64,32 +140,240 @@ user_accounts = Table(
     Column('account_ID', String, nullable=False)
 )
 
-meta.create_all(engine)
+# summary tables for the admin dashboard, kept current in the same transaction as
+# every balance change and ledger insert (upgrade_schema backfills them on older
+# databases; manage.py rebuild-stats recomputes them)
+ledger_daily_stats = Table(
+    "ledger_daily_stats",
+    meta,
+    Column('day', Date, primary_key=True, nullable=False),
+    Column('tx_type', String, primary_key=True, nullable=False),
+    Column('status', String, primary_key=True, nullable=False),
+    Column('count', Integer, nullable=False),
+    Column('amount', Integer, nullable=False)
+)
+
+# bank-wide running totals, one row per name (see BANK_TOTALS)
+bank_totals = Table(
+    "bank_totals",
+    meta,
+    Column('name', String, primary_key=True, nullable=False),
+    Column('value', Integer, nullable=False)
+)
+
+def upgrade_schema(bind=None):
+    """Bring an existing database up to the current schema in place. Safe to run repeatedly."""
+    bind = bind or engine
+    with bind.begin() as conn:
+        inspector = inspect(conn)
+        if inspector.has_table('policies') and 'policy_ID' not in {
+            column['name'] for column in inspector.get_columns('policies')
+        }:
+            # policies used to be keyed by account: re-store each one under its content hash
+            old_rows = conn.execute(text("SELECT * FROM policies")).mappings().all()
+            conn.execute(text("DROP TABLE policies"))
+            policies.create(conn)
+            for row in old_rows:
+                defaults = models.Policy()
+                policy = models.Policy(
+                    *[getattr(defaults, attribute) if row[column] is None else row[column]
+                      for column, attribute in POLICY_COLUMNS.items()]
+                )
+                # raw SQLite rows hold booleans as 0/1, which would hash differently
+                policy.allowNegativeBalance = bool(policy.allowNegativeBalance)
+                conn.execute(accounts.update().where(accounts.c.account_ID == row['account_ID']).values(
+                    policy_ID=store_policy(conn, policy)
+                ))
+        if inspector.has_table('ledger') and not inspector.get_pk_constraint('ledger')['constrained_columns']:
+            if conn.dialect.name == 'sqlite':
+                # SQLite cannot add a primary key to an existing table, so rebuild it
+                conn.execute(text("ALTER TABLE ledger RENAME TO ledger_old"))
+                ledger.create(conn)
+                columns = [column.name for column in ledger.columns]
+                conn.execute(ledger.insert().from_select(
+                    columns, select(*[text(f'"{name}"') for name in columns]).select_from(text("ledger_old"))
+                ))
+                conn.execute(text("DROP TABLE ledger_old"))
+            else:
+                conn.execute(text('ALTER TABLE ledger ADD PRIMARY KEY ("tx_ID")'))
+        for table in (ledger, policy_requests):
+            if inspector.has_table(table.name):
+                for index in table.indexes:
+                    index.create(conn, checkfirst=True)
+        # the summary tables start empty on a database that predates them (create_all may
+        # have just made them); bank_totals always has rows once there is any account or
+        # ledger row, so an empty one next to existing data needs a backfill
+        for table in (ledger_daily_stats, bank_totals):
+            table.create(conn, checkfirst=True)
+        if inspector.has_table('accounts') and inspector.has_table('ledger') and (
+            conn.execute(select(bank_totals.c.name).limit(1)).first() is None
+        ) and (
+            conn.execute(select(accounts.c.account_ID).limit(1)).first() is not None
+            or conn.execute(select(ledger.c.tx_ID).limit(1)).first() is not None
+        ):
+            rebuild_stats(conn)
+
+# policies columns and the models.Policy attributes they hold, in constructor order
+POLICY_COLUMNS = {
+    'max_deposit': 'maxDeposit',
+    'max_withdrawal': 'maxWithdrawal',
+    'daily_withdrawal_limit': 'dailyWithdrawalLimit',
+    'allow_negative_balance': 'allowNegativeBalance',
+    'overdraft_limit': 'overdraftLimit',
+}
+DEFAULT_POLICY_ID = "default_policy"
+
+# policy_ID -> Policy. Rows are immutable (the ID is their hash), so entries never go stale.
+policy_cache = LRUCache(int(os.getenv('POLICY_CACHE_SIZE', '256')))
+# account_ID -> Policy, dropped whenever the account's policy_ID changes. Readers take a
+# version before they query and writers drop the entry with one taken after commit, so a
+# read that overlapped the change cannot put the old policy back.
+account_policy_cache = LRUCache(int(os.getenv('ACCOUNT_POLICY_CACHE_SIZE', '10000')))
+# account_ID -> accounts row. Every path that writes an account row stores the committed
+# row here (write-through), so reads of hot accounts skip SQLite. ACCOUNT_CACHE_TTL
+# (seconds) bounds staleness if another process writes the same database.
+account_cache = LRUCache(
+    int(os.getenv('ACCOUNT_CACHE_SIZE', '10000')),
+    ttl=float(os.getenv('ACCOUNT_CACHE_TTL', '0')) or None
+)
+# write-throughs run after commit, in no particular order. Each writer takes a version
+# from here inside its transaction, after its write (while it holds the write lock), so
+# versions follow commit order and account_cache ignores a put that arrives late.
+account_versions = itertools.count(1)
+
+def policy_id(policy_obj):
+    # calculate unique, deterministic ID from policy set
+    policy_str = "-".join(str(getattr(policy_obj, attribute)) for attribute in POLICY_COLUMNS.values())
+    return hashlib.sha256(policy_str.encode()).hexdigest()
+
+def store_policy(conn, policy_obj):
+    # insert the policy unless an identical one is already stored; returns its policy_ID
+    new_policy_id = policy_id(policy_obj)
+    existing = conn.execute(
+        select(policies.c.policy_ID).where(policies.c.policy_ID == new_policy_id)
+    ).first()
+    if not existing:
+        conn.execute(policies.insert().values(
+            policy_ID=new_policy_id,
+            **{column: getattr(policy_obj, attribute) for column, attribute in POLICY_COLUMNS.items()}
+        ))
+    return new_policy_id
+
+def cached_policy(policy_ID, row=None):
+    # shared Policy for policy_ID, built from row (a policies row) on a cache miss
+    if policy_ID is None or row is None or row.max_deposit is None:
+        policy_ID = DEFAULT_POLICY_ID
+    policy = policy_cache.get(policy_ID)
+    if policy is None:
+        if policy_ID == DEFAULT_POLICY_ID:
+            policy = models.Policy()
+        else:
+            policy = models.Policy(*[getattr(row, column) for column in POLICY_COLUMNS])
+        policy_cache.put(policy_ID, policy)
+    return policy
+
+def account_policy_statement(account_ids):
+    return select(accounts, *[policies.c[column] for column in POLICY_COLUMNS]).select_from(
+        accounts.outerjoin(policies, accounts.c.policy_ID == policies.c.policy_ID)
+    ).where(accounts.c.account_ID.in_(account_ids))
+
+def get_account_policy(account_ID, conn=None):
+    """Get the Policy governing an account (the default policy if it has none).
+
+    Accounts share Policy objects through the cache, so the hot path normally
+    makes no query at all.
+    """
+    policy = account_policy_cache.get(account_ID)
+    if policy is not None:
+        return policy
+    if conn is None:
+        with engine.connect() as conn:
+            return get_account_policy(account_ID, conn)
+    version = next(account_versions)
+    row = conn.execute(account_policy_statement([account_ID])).first()
+    if row is None:
+        return cached_policy(DEFAULT_POLICY_ID)
+    policy = cached_policy(row.policy_ID, row)
+    account_policy_cache.put(account_ID, policy, version)
+    return policy
+
+def drop_account_policy(account_ID):
+    # call after commit, so readers that may have seen the old policy hold older versions
+    account_policy_cache.pop(account_ID, version=next(account_versions))
+
+# username <-> account_ID. insert_user_account writes the mapping once and nothing
+# changes it afterwards, so entries only leave the cache by eviction.
+username_cache = LRUCache(int(os.getenv('USERNAME_CACHE_SIZE', '100000')))
+account_username_cache = LRUCache(int(os.getenv('USERNAME_CACHE_SIZE', '100000')))
+
+# substring search over every username; built at startup, then kept current by insert_user_account
+username_index = UsernameIndex()
+
+def clear_caches():
+    # drop every in-process cache, e.g. after the tables are recreated
+    withdrawal_cache.clear()
+    policy_cache.clear()
+    account_policy_cache.clear()
+    account_cache.clear()
+    username_cache.clear()
+    account_username_cache.clear()
+    username_index.clear()
+
+def cache_stats():
+    return {
+        "accounts": account_cache.stats(),
+        "policies": policy_cache.stats(),
+        "account_policies": account_policy_cache.stats(),
+        "usernames": username_cache.stats(),
+        "account_usernames": account_username_cache.stats(),
+        "daily_withdrawals": withdrawal_cache.stats(),
+    }
 
 # helpers
-def insert_account(account_obj):
-    # insert account
-    insert_statement = accounts.insert().values(
+def insert_account(account_obj, username=None):
+    # insert account, and its username mapping in the same transaction if one is given
+    values = dict(
         account_ID=str(account_obj.account_ID),
         name=account_obj.name,
         balance=account_obj.balance,
         policy_ID="default_policy"
     )
     with engine.begin() as conn:
-        result = conn.execute(insert_statement)
-        return result
+        result = conn.execute(accounts.insert().values(**values))
+        add_bank_totals(conn, accounts=1, balance=values["balance"])
+        if username is not None:
+            conn.execute(user_accounts.insert().values(username=username, account_ID=values["account_ID"]))
+        version = next(account_versions)
+    account_cache.put(values["account_ID"], values, version)
+    if username is not None:
+        cache_username(username, values["account_ID"])
+        if username_index.ready:
+            username_index.add(username)
+    return result
 
 def delete_account(account_ID):
-    delete_statement = accounts.delete().where(accounts.c.account_ID == account_ID)
+    delete_statement = accounts.delete().where(accounts.c.account_ID == account_ID).returning(accounts.c.balance)
     with engine.begin() as conn:
         result = conn.execute(delete_statement)
-        return result
+        for row in result.all():
+            add_bank_totals(conn, accounts=-1, balance=-row.balance)
+        version = next(account_versions)
+    account_cache.pop(account_ID, version=version)
+    drop_account_policy(account_ID)
+    return result
 
 def get_account(account_ID):
+    cached = account_cache.get(account_ID)
+    if cached is not None:
+        return dict(cached)
     select_statement = accounts.select().where(accounts.c.account_ID == account_ID)
-    with engine.begin() as conn:
+    with engine.connect() as conn:
         result = conn.execute(select_statement).first()
-        return dict(result._mapping) if result else None
+    if not result:
+        return None
+    # add, not put: a write-through that landed while we were reading is newer
+    account_cache.add(account_ID, dict(result._mapping))
+    return dict(result._mapping)
 
 def get_all_accounts():
     select_statement = accounts.select()
@@ -122,46 +406,497 @@ def update_account(account_ID, update_type, value):
     }
     
     with engine.begin() as conn:
-        conn.execute(update_statment)
+        old_balance = None
+        if (update_type == UpdateType.BALANCE.value):
+            old_balance = conn.execute(
+                select(accounts.c.balance).where(accounts.c.account_ID == account_ID)
+            ).scalar()
+        row = conn.execute(update_statment.returning(accounts)).first()
+        if row is not None and old_balance is not None:
+            add_bank_totals(conn, balance=row.balance - old_balance)
+        version = next(account_versions)
+    if row is not None:
+        account_cache.put(account_ID, dict(row._mapping), version)
+    if (update_type == UpdateType.POLICY.value):
+        drop_account_policy(account_ID)
     return {}
 
-def insert_transaction(tx_obj):
-    # insert transaction into global ledger
-    insert_statement = ledger.insert().values(
+def ledger_values(tx_obj):
+    # column values for a transaction's ledger row
+    return dict(
         amount=tx_obj.amount,
         current_balance=tx_obj.current_balance,
         tx_type=tx_obj.tx_type.value,
         account_ID=str(tx_obj.user_id),
         timestamp=tx_obj.timestamp,
         tx_ID=str(tx_obj.tx_ID),
-        status=tx_obj.status.value
+        status=tx_obj.status.value,
+        counterparty=str(tx_obj.counterparty) if tx_obj.counterparty is not None else None
+    )
+
+def add_to_counter(conn, table, keys, increments):
+    # add increments to the row at keys, creating it if this is its first use
+    result = conn.execute(
+        table.update().where(*[table.c[name] == value for name, value in keys.items()]).values(
+            **{name: table.c[name] + amount for name, amount in increments.items()}
+        )
+    )
+    if result.rowcount == 0:
+        conn.execute(table.insert().values(**keys, **increments))
+
+BANK_TOTALS = ("accounts", "balance", "transactions", "declined")
+
+def add_bank_totals(conn, **increments):
+    for name, amount in increments.items():
+        if amount:
+            add_to_counter(conn, bank_totals, {"name": name}, {"value": amount})
+
+def add_ledger_stats(conn, txs):
+    """Fold ledger rows being inserted on conn into the daily and running totals"""
+    groups = {}
+    for tx in txs:
+        key = (tx.timestamp.date(), tx.tx_type.value, tx.status.value)
+        count, amount = groups.get(key, (0, 0))
+        groups[key] = (count + 1, amount + tx.amount)
+    for (day, tx_type, status), (count, amount) in groups.items():
+        add_to_counter(
+            conn, ledger_daily_stats, {"day": day, "tx_type": tx_type, "status": status},
+            {"count": count, "amount": amount}
+        )
+    add_bank_totals(
+        conn, transactions=len(txs),
+        declined=sum(1 for tx in txs if tx.status == models.StatusType.DECLINED)
     )
+
+def insert_transaction(tx_obj):
+    # insert transaction into global ledger
+    insert_statement = ledger.insert().values(**ledger_values(tx_obj))
     with engine.begin() as conn:
         result = conn.execute(insert_statement)
+        add_ledger_stats(conn, [tx_obj])
         return result
 
-def insert_policy(policy_obj):
-    # calculate unique, deterministic ID from policy set
-    policy_str = f"{policy_obj.max_deposit}-{policy_obj.max_withdrawal}-{policy_obj.daily_withdrawal_limit}-{policy_obj.allow_negative_balance}-{policy_obj.overdraft_limit}"
-    policy_id = hashlib.sha256(policy_str.encode()).hexdigest()
+# (account_ID, day) -> withdrawn total as of our last commit, for the current day only.
+# Counters only grow during a day, so a cached total never overstates the stored one
+# (an evicted entry reads as 0) and can be used to decline over-limit withdrawals
+# without touching the accounts table.
+withdrawal_cache = LRUCache(int(os.getenv('WITHDRAWAL_CACHE_SIZE', '10000')))
+withdrawal_cache_enabled = os.getenv('DAILY_LIMIT_CACHE', '1') == '1'
+# the day withdrawal_cache holds; the lock makes the day check and the increment one step
+withdrawal_cache_day = None
+withdrawal_cache_lock = threading.Lock()
+
+def within_daily_limit(account_ID, day, amount, policy):
+    # SQL condition: the day's withdrawals plus amount stay within the daily limit
+    withdrawn = select(daily_withdrawals.c.total).where(
+        daily_withdrawals.c.account_ID == account_ID, daily_withdrawals.c.day == day
+    ).scalar_subquery()
+    return func.coalesce(withdrawn, 0) + amount <= policy.dailyWithdrawalLimit
+
+def add_daily_withdrawal(conn, account_ID, day, amount):
+    # bump the day's counter, creating it on the day's first withdrawal
+    add_daily_withdrawals(conn, [{"account_ID": account_ID, "day": day, "total": amount}])
+
+def add_daily_withdrawals(conn, rows):
+    """Add each row's total to its (account_ID, day) counter with one upsert"""
+    dialect_insert = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}.get(conn.dialect.name)
+    if dialect_insert is None:
+        for row in rows:
+            add_to_counter(conn, daily_withdrawals, {"account_ID": row["account_ID"], "day": row["day"]}, {"total": row["total"]})
+        return
+    insert_statement = dialect_insert(daily_withdrawals)
+    conn.execute(
+        insert_statement.on_conflict_do_update(
+            index_elements=["account_ID", "day"],
+            set_={"total": daily_withdrawals.c.total + insert_statement.excluded.total}
+        ),
+        rows
+    )
+
+def begin_write(conn):
+    """Take the database's write lock for the rest of conn's transaction.
+
+    pysqlite only sends BEGIN before the first INSERT or UPDATE, so reads
+    made before that run outside the transaction and can be stale by the
+    time it writes. BEGIN IMMEDIATE makes SQLite take the write lock first.
+    Other databases lock the rows read FOR UPDATE instead.
+    """
+    if conn.dialect.name == 'sqlite':
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+def cache_daily_withdrawal(account_ID, day, amount):
+    # call only after the counter update has committed
+    global withdrawal_cache_day
+    if not withdrawal_cache_enabled:
+        return
+    with withdrawal_cache_lock:
+        if day != withdrawal_cache_day:
+            if withdrawal_cache_day is not None and day < withdrawal_cache_day:
+                # committed just before midnight; yesterday's totals are no longer cached
+                return
+            withdrawal_cache.clear()
+            withdrawal_cache_day = day
+        withdrawal_cache.put((account_ID, day), withdrawal_cache.get((account_ID, day), 0) + amount)
+
+def get_daily_withdrawal_total(account_ID, day):
+    select_statement = select(daily_withdrawals.c.total).where(
+        daily_withdrawals.c.account_ID == account_ID, daily_withdrawals.c.day == day
+    )
+    with engine.connect() as conn:
+        return conn.execute(select_statement).scalar() or 0
+
+def apply_transaction(account_ID, tx_type, amount, policy=None):
+    """Apply a deposit or withdrawal and record it in the ledger in one transaction.
+
+    The policy check, including the daily withdrawal limit, is folded into a
+    conditional UPDATE so concurrent requests cannot overwrite each other's
+    balance. Declined transactions are recorded with the unchanged balance.
+    policy defaults to the account's stored policy. Returns (account, tx), or
+    None if the account does not exist.
+    """
+    policy = policy or get_account_policy(account_ID)
 
     with engine.begin() as conn:
-        # check if policy already exists in table
-        existing = conn.execute(
-            policies.select().where(policies.c.policy_ID == policy_id)
-        ).first()
-        if not existing:
-            return conn.execute(
-                policies.insert().values(
-                    policy_ID=policy_id,
-                    max_deposit=policy_obj.max_deposit,
-                    max_withdrawal=policy_obj.max_withdrawal,
-                    daily_withdrawal_limit=policy_obj.daily_withdrawal_limit,
-                    allow_negative_balance=policy_obj.allow_negative_balance,
-                    overdraft_limit=policy_obj.overdraft_limit
+        # hold the write lock before a declined read, so the balance it
+        # records and caches is not older than a concurrent commit, and
+        # before the timestamp, so ledger order matches commit order
+        begin_write(conn)
+        timestamp = datetime.utcnow()
+        day = timestamp.date()
+        if (tx_type == models.TransactionType.DEPOSIT):
+            allowed = policy.validate_deposit(amount)
+            delta = amount
+            floor = None
+        else:
+            floor = policy.withdrawal_floor(amount)
+            allowed = floor is not None and (
+                withdrawal_cache.get((account_ID, day), 0) + amount <= policy.dailyWithdrawalLimit
+            )
+            delta = -amount
+        row = None
+        if allowed:
+            update_statement = accounts.update().where(accounts.c.account_ID == account_ID)
+            if floor is not None:
+                update_statement = update_statement.where(
+                    accounts.c.balance >= floor, within_daily_limit(account_ID, day, amount, policy)
                 )
+            row = conn.execute(
+                update_statement.values(balance=accounts.c.balance + delta).returning(accounts)
+            ).first()
+        status = models.StatusType.SUCCESS
+        if row is None:
+            # declined (or missing account): read the balance we left untouched
+            row = conn.execute(
+                accounts.select().where(accounts.c.account_ID == account_ID)
+            ).first()
+            if row is None:
+                return None
+            status = models.StatusType.DECLINED
+        elif floor is not None:
+            add_daily_withdrawal(conn, account_ID, day, amount)
+
+        tx = models.Transaction(account_ID, amount, tx_type, row.balance, timestamp)
+        tx.status = status
+        conn.execute(ledger.insert().values(**ledger_values(tx)))
+        add_ledger_stats(conn, [tx])
+        if status == models.StatusType.SUCCESS:
+            add_bank_totals(conn, balance=delta)
+        version = next(account_versions)
+
+    account_cache.put(account_ID, dict(row._mapping), version)
+    if status == models.StatusType.SUCCESS and floor is not None:
+        cache_daily_withdrawal(account_ID, day, amount)
+    return dict(row._mapping), tx
+
+def transfer(from_username, target_username, amount, payer_policy=None, payee_policy=None):
+    """Move amount between two users' accounts in one transaction.
+
+    Both usernames are resolved from the cache or with a single query. Balances are updated in
+    account_ID order so concurrent transfers always lock rows the same way, and
+    the first UPDATE carries the payer's funds check so a declined transfer
+    writes nothing but its ledger rows. Policies default to each account's
+    stored policy. Returns a dict with the payer and payee accounts and their
+    transactions, or an error dict.
+    """
+    with engine.begin() as conn:
+        # the timestamp is taken under the write lock, as in apply_transaction
+        begin_write(conn)
+        account_ids = resolve_usernames([from_username, target_username], conn)
+        payer_id = account_ids.get(from_username)
+        payee_id = account_ids.get(target_username)
+        if not payer_id:
+            return {"error": "Source username not found", "username": from_username}
+        if not payee_id:
+            return {"error": "Target username not found", "username": target_username}
+        if payer_id == payee_id:
+            return {"error": "Cannot transfer to the same account", "username": target_username}
+        payer_policy = payer_policy or get_account_policy(payer_id, conn)
+        payee_policy = payee_policy or get_account_policy(payee_id, conn)
+
+        transaction_time = datetime.utcnow()
+        day = transaction_time.date()
+        floor = payer_policy.withdrawal_floor(amount)
+        allowed = floor is not None and payee_policy.validate_deposit(amount) and (
+            withdrawal_cache.get((payer_id, day), 0) + amount <= payer_policy.dailyWithdrawalLimit
+        )
+        rows = {}
+        if allowed:
+            payer = accounts.alias("payer")
+            payer_can_pay = within_daily_limit(payer_id, day, amount, payer_policy)
+            payer_has_funds = select(payer.c.account_ID).where(
+                payer.c.account_ID == payer_id, payer.c.balance >= floor, payer_can_pay
+            ).exists()
+            for account_ID in sorted([payer_id, payee_id]):
+                update_statement = accounts.update().where(accounts.c.account_ID == account_ID)
+                if account_ID == payer_id:
+                    update_statement = update_statement.where(accounts.c.balance >= floor, payer_can_pay).values(balance=accounts.c.balance - amount)
+                else:
+                    update_statement = update_statement.values(balance=accounts.c.balance + amount)
+                    if not rows:
+                        # payee goes first: it may only be credited if the payer can pay
+                        update_statement = update_statement.where(payer_has_funds)
+                row = conn.execute(update_statement.returning(accounts)).first()
+                if row is None:
+                    if rows:
+                        # the payer's funds changed between the two statements
+                        raise RuntimeError("transfer aborted: concurrent balance change")
+                    break
+                rows[account_ID] = row
+        status = models.StatusType.SUCCESS
+        if len(rows) < 2:
+            rows = {row.account_ID: row for row in conn.execute(
+                accounts.select().where(accounts.c.account_ID.in_([payer_id, payee_id]))
+            )}
+            if len(rows) < 2:
+                return {"error": "Account not found", "username": from_username if payer_id not in rows else target_username}
+            status = models.StatusType.DECLINED
+        else:
+            add_daily_withdrawal(conn, payer_id, day, amount)
+
+        payer_tx = models.Transaction(payer_id, amount, models.TransactionType.PAY, rows[payer_id].balance, transaction_time, counterparty=payee_id)
+        payee_tx = models.Transaction(payee_id, amount, models.TransactionType.PAY, rows[payee_id].balance, transaction_time, counterparty=payer_id)
+        payer_tx.status = status
+        payee_tx.status = status
+        conn.execute(ledger.insert(), [ledger_values(payer_tx), ledger_values(payee_tx)])
+        add_ledger_stats(conn, [payer_tx, payee_tx])
+        version = next(account_versions)
+
+    for account_ID, row in rows.items():
+        account_cache.put(account_ID, dict(row._mapping), version)
+    if status == models.StatusType.SUCCESS:
+        cache_daily_withdrawal(payer_id, day, amount)
+    return {
+        "from_account": dict(rows[payer_id]._mapping),
+        "to_account": dict(rows[payee_id]._mapping),
+        "payer_tx": payer_tx,
+        "payee_tx": payee_tx
+    }
+
+class BatchOperationType(Enum):
+    DEPOSIT="deposit"
+    WITHDRAW="withdraw"
+    TRANSFER="transfer"
+
+def apply_batch(operations, policy=None, atomic=True, with_transactions=False):
+    """Apply a list of deposits, withdrawals and transfers in order, in one transaction.
+
+    operations are dicts with op, amount, account_id (or from_username) and, for
+    transfers, target_account_id (or target_username). Usernames are resolved
+    in bulk, every affected account is loaded with its policy (unless one
+    policy is given for all) in one query, and each operation runs through
+    models.Account, so the policy rules match the single-operation endpoints.
+    Balance deltas and ledger rows are then written with executemany. In
+    atomic mode anything other than a successful operation writes nothing;
+    otherwise declined operations are recorded and errors skipped. Returns
+    (committed, per-operation results); with_transactions adds each
+    operation's models.Transaction objects and its accounts' names.
+    """
+    with engine.begin() as conn:
+        # balances and counters are read here and written back as deltas below: no other
+        # writer may commit in between, or the policy checks would run on stale values
+        begin_write(conn)
+        usernames = {
+            operation.get(key) for operation in operations for key in ("from_username", "target_username")
+        } - {None}
+        account_ids_by_username = resolve_usernames(usernames, conn) if usernames else {}
+        operations = [
+            {
+                **operation,
+                "account_id": operation.get("account_id") or account_ids_by_username.get(operation.get("from_username")),
+                "target_account_id": operation.get("target_account_id") or account_ids_by_username.get(operation.get("target_username")),
+            }
+            for operation in operations
+        ]
+        account_ids = set()
+        for operation in operations:
+            account_ids.add(operation["account_id"])
+            if operation["target_account_id"]:
+                account_ids.add(operation["target_account_id"])
+
+        loaded = {}
+        policy_ids = {}
+        for row in conn.execute(account_policy_statement(account_ids).with_for_update(of=accounts)):
+            account_obj = models.Account(row.name, row.balance, row.account_ID, override=True)
+            account_obj.policy = policy or cached_policy(row.policy_ID, row)
+            loaded[row.account_ID] = account_obj
+            policy_ids[row.account_ID] = row.policy_ID
+        starting_balances = {account_ID: account_obj.balance for account_ID, account_obj in loaded.items()}
+        today = datetime.utcnow().date()
+        starting_withdrawals = {}
+        for row in conn.execute(daily_withdrawals.select().where(
+            daily_withdrawals.c.account_ID.in_(account_ids), daily_withdrawals.c.day == today
+        ).with_for_update()):
+            loaded[row.account_ID].daily_withdrawals[today] = row.total
+            starting_withdrawals[(row.account_ID, today)] = row.total
+
+        results = []
+        txs = []
+        for index, operation in enumerate(operations):
+            account_obj = loaded.get(operation["account_id"])
+            if account_obj is None:
+                results.append({"index": index, "status": "ERROR", "error": "Account not found"})
+                continue
+            try:
+                op_type = BatchOperationType(operation["op"])
+                if op_type == BatchOperationType.TRANSFER:
+                    target_obj = loaded.get(operation.get("target_account_id"))
+                    if target_obj is None or target_obj is account_obj:
+                        raise ValueError("invalid target account")
+                    op_txs = account_obj.payment(target_obj, operation["amount"])
+                elif op_type == BatchOperationType.DEPOSIT:
+                    op_txs = [account_obj.deposit(operation["amount"])]
+                else:
+                    op_txs = [account_obj.withdraw(operation["amount"])]
+            except ValueError as e:
+                results.append({"index": index, "status": "ERROR", "error": str(e)})
+                continue
+            txs.extend(op_txs)
+            results.append({
+                "index": index,
+                "status": op_txs[0].status.value,
+                "tx_ID": str(op_txs[0].tx_ID),
+                "balance": op_txs[0].current_balance
+            })
+            if with_transactions:
+                results[-1]["transactions"] = op_txs
+                results[-1]["names"] = {tx.user_id: loaded[tx.user_id].name for tx in op_txs}
+
+        if atomic and any(result["status"] != models.StatusType.SUCCESS.value for result in results):
+            return False, results
+
+        deltas_by_account = {
+            account_ID: account_obj.balance - starting_balances[account_ID]
+            for account_ID, account_obj in loaded.items()
+            if account_obj.balance != starting_balances[account_ID]
+        }
+        deltas = [{"b_account_ID": account_ID, "b_delta": delta} for account_ID, delta in deltas_by_account.items()]
+        if deltas:
+            conn.execute(
+                accounts.update().where(accounts.c.account_ID == bindparam("b_account_ID")).values(
+                    balance=accounts.c.balance + bindparam("b_delta")
+                ),
+                deltas
             )
-    return
+        if txs:
+            conn.execute(ledger.insert(), [ledger_values(tx) for tx in txs])
+            add_ledger_stats(conn, txs)
+        add_bank_totals(conn, balance=sum(deltas_by_account.values()))
+        version = next(account_versions)
+
+        withdrawn = {
+            (account_ID, day): total - starting_withdrawals.get((account_ID, day), 0)
+            for account_ID, account_obj in loaded.items()
+            for day, total in account_obj.daily_withdrawals.items()
+            if total != starting_withdrawals.get((account_ID, day), 0)
+        }
+        if withdrawn:
+            add_daily_withdrawals(conn, [
+                {"account_ID": account_ID, "day": day, "total": amount} for (account_ID, day), amount in withdrawn.items()
+            ])
+
+    # the balances were read under the write lock, so the final ones are exactly what was stored
+    for account_ID in deltas_by_account:
+        account_obj = loaded[account_ID]
+        account_cache.put(account_ID, {
+            "account_ID": account_ID, "name": account_obj.name,
+            "balance": account_obj.balance, "policy_ID": policy_ids[account_ID]
+        }, version)
+    for (account_ID, day), amount in withdrawn.items():
+        cache_daily_withdrawal(account_ID, day, amount)
+    return True, results
+
+def apply_group(operations):
+    """Deposits, withdrawals and transfers from many requests, written with one commit (see group_commit.py).
+
+    operations are ("deposit" | "withdraw", account_ID, amount) or
+    ("transfer", from_username, target_username, amount). They are decided in
+    order by apply_batch, and each result is what apply_transaction or
+    transfer would have returned. Operations apply_batch rejects for any
+    reason but a missing account (e.g. a negative deposit) are re-run on
+    their own afterwards, so they get the single-operation answer too.
+    """
+    usernames = {name for operation in operations if operation[0] == "transfer" for name in operation[1:3]}
+    account_ids = resolve_usernames(usernames) if usernames else {}
+    results = [None] * len(operations)
+    batch = []
+    positions = []
+    for position, operation in enumerate(operations):
+        if operation[0] == "transfer":
+            _, from_username, target_username, amount = operation
+            payer_id, payee_id = account_ids.get(from_username), account_ids.get(target_username)
+            # same checks and messages as transfer()
+            if not payer_id:
+                results[position] = {"error": "Source username not found", "username": from_username}
+            elif not payee_id:
+                results[position] = {"error": "Target username not found", "username": target_username}
+            elif payer_id == payee_id:
+                results[position] = {"error": "Cannot transfer to the same account", "username": target_username}
+            else:
+                batch.append({"op": "transfer", "account_id": payer_id, "target_account_id": payee_id, "amount": amount})
+                positions.append(position)
+        else:
+            op, account_ID, amount = operation
+            batch.append({"op": op, "account_id": account_ID, "amount": amount})
+            positions.append(position)
+
+    _, batch_results = apply_batch(batch, atomic=False, with_transactions=True) if batch else (True, [])
+    rerun = []
+    for position, operation, result in zip(positions, batch, batch_results):
+        if result["status"] == "ERROR":
+            if result["error"] == "Account not found" and operation["op"] != "transfer":
+                results[position] = None
+            elif result["error"] == "Account not found":
+                results[position] = {"error": "Account not found", "username": operations[position][1]}
+            else:
+                rerun.append(position)
+            continue
+        txs, names = result["transactions"], result["names"]
+        account_rows = [
+            {"account_ID": tx.user_id, "name": names[tx.user_id], "balance": tx.current_balance} for tx in txs
+        ]
+        if operation["op"] == "transfer":
+            results[position] = {
+                "from_account": account_rows[0],
+                "to_account": account_rows[1],
+                "payer_tx": txs[0],
+                "payee_tx": txs[1]
+            }
+        else:
+            results[position] = (account_rows[0], txs[0])
+
+    for position in rerun:
+        operation = operations[position]
+        if operation[0] == "transfer":
+            results[position] = transfer(*operation[1:])
+        else:
+            tx_type = models.TransactionType.DEPOSIT if operation[0] == "deposit" else models.TransactionType.WITHDRAWAL
+            results[position] = apply_transaction(operation[1], tx_type, operation[2])
+    return results
+
+def insert_policy(policy_obj):
+    """Store a policy under its content hash (once) and return the policy_ID"""
+    with engine.begin() as conn:
+        return store_policy(conn, policy_obj)
 
 def get_ledger(account_ID):
     select_statement = ledger.select().where(ledger.c.account_ID == account_ID)
@@ -169,6 +904,136 @@ def get_ledger(account_ID):
         result = conn.execute(select_statement)
         return result.mappings().all()
 
+def encode_ledger_cursor(row):
+    # opaque page cursor for a ledger row's (timestamp, tx_ID) position
+    key = f"{row['timestamp'].isoformat()}|{row['tx_ID']}"
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+def decode_ledger_cursor(cursor):
+    try:
+        timestamp, tx_ID = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(timestamp), tx_ID
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"invalid ledger cursor: {cursor}")
+
+def get_ledger_page(account_ID, limit=50, before=None, after=None, from_date=None, to_date=None, tx_type=None, status=None):
+    """Get one page of an account's ledger, newest first.
+
+    Pages are keyed on (timestamp, tx_ID): pass next_cursor back as `before`
+    for older rows, or prev_cursor as `after` for newer ones. from_date is
+    inclusive and to_date exclusive. Raises ValueError for a malformed cursor.
+    """
+    position = tuple_(ledger.c.timestamp, ledger.c.tx_ID)
+    select_statement = ledger.select().where(ledger.c.account_ID == account_ID)
+    if from_date:
+        select_statement = select_statement.where(ledger.c.timestamp >= from_date)
+    if to_date:
+        select_statement = select_statement.where(ledger.c.timestamp < to_date)
+    if tx_type:
+        select_statement = select_statement.where(ledger.c.tx_type == tx_type)
+    if status:
+        select_statement = select_statement.where(ledger.c.status == status)
+
+    if after:
+        # walk towards newer rows, then flip back to newest-first
+        select_statement = select_statement.where(position > tuple_(*decode_ledger_cursor(after))).order_by(
+            ledger.c.timestamp.asc(), ledger.c.tx_ID.asc()
+        )
+    else:
+        if before:
+            select_statement = select_statement.where(position < tuple_(*decode_ledger_cursor(before)))
+        select_statement = select_statement.order_by(ledger.c.timestamp.desc(), ledger.c.tx_ID.desc())
+
+    with engine.connect() as conn:
+        rows = conn.execute(select_statement.limit(limit + 1)).mappings().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if after:
+        rows = rows[::-1]
+        newer, older = has_more, True
+    else:
+        newer, older = before is not None, has_more
+
+    return {
+        "items": rows,
+        "next_cursor": encode_ledger_cursor(rows[-1]) if rows and older else None,
+        "prev_cursor": encode_ledger_cursor(rows[0]) if rows and newer else None
+    }
+
+def iter_ledger(account_ID=None, batch_size=1000):
+    """Yield ledger rows (one account's, or the whole bank's) through a streaming cursor.
+
+    Only batch_size rows are buffered at a time. An account's rows come in
+    (timestamp, tx_ID) order from its index; the bank-wide export uses table
+    order so the first rows are sent without sorting the whole ledger.
+    """
+    select_statement = ledger.select()
+    if account_ID is not None:
+        select_statement = select_statement.where(ledger.c.account_ID == account_ID).order_by(
+            ledger.c.timestamp, ledger.c.tx_ID
+        )
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=batch_size).execute(select_statement)
+        for row in result.mappings():
+            yield row
+
+def rebuild_stats(conn=None):
+    """Recompute the summary tables from accounts and ledger (backfill or repair)"""
+    if conn is None:
+        with engine.begin() as conn:
+            return rebuild_stats(conn)
+    day = func.date(ledger.c.timestamp)
+    conn.execute(ledger_daily_stats.delete())
+    conn.execute(bank_totals.delete())
+    conn.execute(ledger_daily_stats.insert().from_select(
+        ["day", "tx_type", "status", "count", "amount"],
+        select(day, ledger.c.tx_type, ledger.c.status, func.count(), func.coalesce(func.sum(ledger.c.amount), 0))
+        .group_by(day, ledger.c.tx_type, ledger.c.status)
+    ))
+    account_count, balance = conn.execute(
+        select(func.count(), func.coalesce(func.sum(accounts.c.balance), 0))
+    ).one()
+    transactions, declined = conn.execute(select(
+        func.count(), func.count().filter(ledger.c.status == models.StatusType.DECLINED.value)
+    )).one()
+    add_bank_totals(conn, accounts=account_count, balance=balance, transactions=transactions, declined=declined)
+
+def get_bank_stats(days=30):
+    """Bank-wide totals plus per-day, per-type counts for the last days days, read from the summary tables.
+
+    by_type volume counts successful transactions only. A transfer writes a PAY
+    row for each side, so it counts twice.
+    """
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    with engine.connect() as conn:
+        totals = dict.fromkeys(BANK_TOTALS, 0)
+        totals.update({row.name: row.value for row in conn.execute(bank_totals.select())})
+        daily = conn.execute(
+            ledger_daily_stats.select().where(ledger_daily_stats.c.day >= since).order_by(
+                ledger_daily_stats.c.day, ledger_daily_stats.c.tx_type, ledger_daily_stats.c.status
+            )
+        ).mappings().all()
+
+    by_type = {}
+    for row in daily:
+        summary = by_type.setdefault(row["tx_type"], {"count": 0, "volume": 0, "declined": 0})
+        summary["count"] += row["count"]
+        if row["status"] == models.StatusType.DECLINED.value:
+            summary["declined"] += row["count"]
+        else:
+            summary["volume"] += row["amount"]
+    for summary in by_type.values():
+        summary["decline_rate"] = summary["declined"] / summary["count"]
+    return {
+        "accounts": totals["accounts"],
+        "total_balance": totals["balance"],
+        "transactions": totals["transactions"],
+        "decline_rate": totals["declined"] / totals["transactions"] if totals["transactions"] else 0,
+        "since": since,
+        "by_type": by_type,
+        "daily": [dict(row) for row in daily]
+    }
+
 def insert_policy_request(policy_request_obj):
     with engine.begin() as conn:
         return conn.execute(
@@ -182,6 +1047,92 @@ def insert_policy_request(policy_request_obj):
             )
         )
 
+def encode_page_cursor(row, sort_column, tie_column):
+    # opaque cursor for a row's position in a (sort_column, tie_column) ordering
+    value = row[sort_column.name]
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, row[tie_column.name]]).encode()).decode()
+
+def decode_page_cursor(cursor, sort_column):
+    try:
+        value, tie = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if isinstance(sort_column.type, DateTime):
+            value = datetime.fromisoformat(value)
+        return value, tie
+    except (ValueError, TypeError):
+        raise ValueError(f"invalid cursor: {cursor}")
+
+def estimate_row_count(conn, table):
+    # SQLite's max(rowid) is a single index probe; it overcounts only by deleted rows
+    if conn.dialect.name == 'sqlite':
+        return conn.execute(text(f'SELECT max(rowid) FROM "{table.name}"')).scalar() or 0
+    return conn.execute(select(func.count()).select_from(table)).scalar()
+
+def keyset_page(select_statement, table, sort_column, tie_column, descending=False, limit=50, cursor=None, with_total=False):
+    """Get one page of select_statement in (sort_column, tie_column) order.
+
+    Pass next_cursor back as cursor for the following page. The response
+    always carries a cheap estimated_total for the whole table; with_total adds
+    an exact count of the filtered rows.
+    """
+    position = tuple_(sort_column, tie_column)
+    paged_statement = select_statement
+    if cursor:
+        key = tuple_(*decode_page_cursor(cursor, sort_column))
+        paged_statement = paged_statement.where(position < key if descending else position > key)
+    if descending:
+        paged_statement = paged_statement.order_by(sort_column.desc(), tie_column.desc())
+    else:
+        paged_statement = paged_statement.order_by(sort_column.asc(), tie_column.asc())
+
+    with engine.connect() as conn:
+        rows = conn.execute(paged_statement.limit(limit + 1)).mappings().all()
+        page = {
+            "items": [dict(row) for row in rows[:limit]],
+            "next_cursor": encode_page_cursor(rows[limit - 1], sort_column, tie_column) if len(rows) > limit else None,
+            "estimated_total": estimate_row_count(conn, table)
+        }
+        if with_total:
+            page["total"] = conn.execute(
+                select(func.count()).select_from(select_statement.subquery())
+            ).scalar()
+    return page
+
+ACCOUNT_SORTS = {"account_ID": accounts.c.account_ID, "name": accounts.c.name, "balance": accounts.c.balance}
+
+def get_accounts_page(limit=50, cursor=None, min_balance=None, max_balance=None, sort="account_ID", descending=False, with_total=False):
+    """Get a page of accounts, optionally within a balance range, sorted by account_ID, name or balance"""
+    select_statement = accounts.select()
+    if min_balance is not None:
+        select_statement = select_statement.where(accounts.c.balance >= min_balance)
+    if max_balance is not None:
+        select_statement = select_statement.where(accounts.c.balance <= max_balance)
+    return keyset_page(
+        select_statement, accounts, ACCOUNT_SORTS[sort], accounts.c.account_ID,
+        descending=descending, limit=limit, cursor=cursor, with_total=with_total
+    )
+
+POLICY_REQUEST_SORTS = {"created_at": policy_requests.c.created_at, "updated_at": policy_requests.c.updated_at}
+
+def get_policy_requests_page(limit=50, cursor=None, user_id=None, status=None, created_from=None, created_to=None,
+                             sort="created_at", descending=True, with_total=False):
+    """Get a page of policy requests filtered by user, status and created_at range (newest first by default)"""
+    select_statement = policy_requests.select()
+    if user_id:
+        select_statement = select_statement.where(policy_requests.c.user_id == user_id)
+    if status:
+        # statuses are written as sent by clients, so match the common casings
+        select_statement = select_statement.where(policy_requests.c.status.in_({status, status.upper(), status.lower()}))
+    if created_from:
+        select_statement = select_statement.where(policy_requests.c.created_at >= created_from)
+    if created_to:
+        select_statement = select_statement.where(policy_requests.c.created_at < created_to)
+    return keyset_page(
+        select_statement, policy_requests, POLICY_REQUEST_SORTS[sort], policy_requests.c.request_id,
+        descending=descending, limit=limit, cursor=cursor, with_total=with_total
+    )
+
 def get_policy_requests(user_id=None):
     with engine.connect() as conn:
         if user_id:
@@ -192,30 +1143,112 @@ def get_policy_requests(user_id=None):
         return result.mappings().all()
 
 def update_policy_request_status(request_id, new_status):
+    """Set a policy request's status; approving it moves the account onto the requested policy.
+
+    Returns {} on success, None if there is no such request, or an error dict
+    (and changes nothing) if an approved request's account does not exist.
+    """
+    status = new_status.value if isinstance(new_status, Enum) else new_status
+    account_ID = None
+    account_row = None
     with engine.begin() as conn:
-        update_statement = policy_requests.update().where(
+        request = conn.execute(
+            select(policy_requests.c.user_id, policy_requests.c.policy_request).where(
+                policy_requests.c.request_id == request_id
+            )
+        ).first()
+        if request is None:
+            return None
+
+        if status.upper() == models.PolicyRequestStatus.APPROVED.value:
+            account_ID = request.user_id
+            if conn.execute(select(accounts.c.account_ID).where(accounts.c.account_ID == account_ID)).first() is None:
+                return {"error": "Account not found", "account_ID": account_ID}
+            current = get_account_policy(account_ID, conn)
+            policy = models.Policy(*[getattr(current, attribute) for attribute in POLICY_COLUMNS.values()])
+            policy.update_policy({
+                POLICY_COLUMNS[column]: value for column, value in request.policy_request.items()
+                if column in POLICY_COLUMNS and value is not None
+            })
+            account_row = conn.execute(accounts.update().where(accounts.c.account_ID == account_ID).values(
+                policy_ID=store_policy(conn, policy)
+            ).returning(accounts)).first()
+            version = next(account_versions)
+
+        conn.execute(policy_requests.update().where(
             policy_requests.c.request_id == request_id
         ).values(
-            status=new_status,
+            status=status,
             updated_at=datetime.now()
-        )
-        return conn.execute(update_statement)
+        ))
+    if account_row is not None:
+        account_cache.put(account_ID, dict(account_row._mapping), version)
+    if account_ID is not None:
+        drop_account_policy(account_ID)
+    return {}
+
+def cache_username(username, account_ID):
+    username_cache.put(username, account_ID)
+    account_username_cache.put(account_ID, username)
 
 def get_account_id_by_username(username):
     """Get account ID by username from user_accounts table"""
-    from sqlalchemy import select
+    account_ID = username_cache.get(username)
+    if account_ID is not None:
+        return account_ID
     select_statement = select(user_accounts.c.account_ID).where(user_accounts.c.username == username)
     with engine.connect() as conn:
         result = conn.execute(select_statement).first()
-        return result[0] if result else None
+    if not result:
+        return None
+    cache_username(username, result[0])
+    return result[0]
 
 def get_username_by_account_id(account_id):
     """Get username by account ID from user_accounts table"""
-    from sqlalchemy import select
+    username = account_username_cache.get(account_id)
+    if username is not None:
+        return username
     select_statement = select(user_accounts.c.username).where(user_accounts.c.account_ID == account_id)
     with engine.connect() as conn:
         result = conn.execute(select_statement).first()
-        return result[0] if result else None
+    if not result:
+        return None
+    cache_username(result[0], account_id)
+    return result[0]
+
+def resolve_usernames(usernames, conn=None):
+    """Map usernames to account IDs; cache misses are fetched with a single IN query.
+
+    Unknown usernames are left out of the result.
+    """
+    resolved = {}
+    missing = []
+    for username in set(usernames):
+        account_ID = username_cache.get(username)
+        if account_ID is None:
+            missing.append(username)
+        else:
+            resolved[username] = account_ID
+    if missing:
+        if conn is None:
+            with engine.connect() as conn:
+                return {**resolved, **resolve_usernames(missing, conn)}
+        for username, account_ID in conn.execute(
+            select(user_accounts.c.username, user_accounts.c.account_ID).where(user_accounts.c.username.in_(missing))
+        ):
+            cache_username(username, account_ID)
+            resolved[username] = account_ID
+    return resolved
+
+def preload_usernames():
+    """Warm the username caches at startup, up to their capacity"""
+    select_statement = select(user_accounts.c.username, user_accounts.c.account_ID).limit(username_cache.maxsize)
+    with engine.connect() as conn:
+        rows = conn.execute(select_statement).all()
+    for username, account_ID in rows:
+        cache_username(username, account_ID)
+    return len(rows)
 
 def insert_user_account(username, account_id):
     """Insert a new username to account ID mapping"""
@@ -225,16 +1258,24 @@ def insert_user_account(username, account_id):
     )
     with engine.begin() as conn:
         result = conn.execute(insert_statement)
+    cache_username(username, account_id)
+    if username_index.ready:
+        username_index.add(username)
 
-def search_usernames(search_term):
-    """Search for usernames that match the search term (partial matching)"""
-    from sqlalchemy import select
-    # Use LIKE for partial matching, search for usernames containing the search term
-    select_statement = select(user_accounts.c.username).where(
-        user_accounts.c.username.ilike(f'%{search_term}%')
-    ).limit(10)  # Limit results to prevent too many matches
-    
+def rebuild_username_index():
+    """(Re)load the username search index from user_accounts"""
+    username_index.clear()
     with engine.connect() as conn:
-        result = conn.execute(select_statement).fetchall()
-        # Return list of usernames
-        return [row[0] for row in result] if result else []
\ No newline at end of file
+        result = conn.execution_options(yield_per=10000).execute(select(user_accounts.c.username))
+        username_index.build(row[0] for row in result)
+    return len(username_index.usernames)
+
+def search_usernames(search_term, limit=10):
+    """Search for usernames that match the search term (partial matching), prefix matches first"""
+    if not username_index.ready:
+        rebuild_username_index()
+    return username_index.search(search_term, limit)
+
+# create any missing tables and upgrade older ones, once every helper upgrade_schema uses is defined
+meta.create_all(engine)
+upgrade_schema()
@@ -0,0 +1,55 @@
+"""
+Streaming serializers for ledger exports.
+
+Rows are consumed lazily from db.iter_ledger and emitted in small chunks, so an
+export's memory use does not depend on how many rows it contains.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+CONTENT_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# rows per emitted chunk: large enough to amortize the write, small enough for a quick first byte
+CHUNK_ROWS = 500
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def ndjson_chunks(rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(row), default=json_default))
+        if len(lines) >= CHUNK_ROWS:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+def csv_chunks(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    count = 0
+    for row in rows:
+        writer.writerow([
+            row[column].isoformat() if isinstance(row[column], datetime) else row[column]
+            for column in columns
+        ])
+        count += 1
+        if count % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def ledger_chunks(rows, fmt, columns):
+    if fmt == "csv":
+        return csv_chunks(rows, columns)
+    return ndjson_chunks(rows)
@@ -0,0 +1,110 @@
+"""
+Optional group commit for deposits, withdrawals and transfers (GROUP_COMMIT=1).
+
+Each request normally runs in its own transaction: its own statements,
+commit and fsync. In group-commit mode, requests are queued to a single
+writer task, which hands them to db.apply_group. apply_group decides the
+group in order, as apply_batch does, and writes it with a few executemany
+statements and one commit. A group is whatever queued up while the previous
+group was being written, up to GROUP_COMMIT_MAX_BATCH operations. An idle
+writer also waits up to GROUP_COMMIT_WINDOW_MS (default 0) for company.
+Callers are answered only once their group has committed, so an acknowledged
+operation is as durable as one with its own commit. If a group raises, its
+operations are retried one group each, so a bad operation fails alone.
+"""
+import asyncio
+import os
+import time
+import async_db
+import db
+import models
+
+enabled = os.getenv('GROUP_COMMIT', '0') == '1'
+
+class GroupCommitWriter:
+    def __init__(self, max_batch=256, window=0.0):
+        self.max_batch = max_batch
+        self.window = window
+        self.queue = None
+        self.task = None
+        self.loop = None
+        self.groups = 0
+        self.operations = 0
+
+    def ensure_started(self):
+        # the queue and task belong to one event loop; start over if called from another
+        # (e.g. a TestClient that runs each request on a fresh loop)
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop or self.task.done():
+            self.loop = loop
+            self.queue = asyncio.Queue()
+            self.task = loop.create_task(self.run())
+
+    async def submit(self, operation):
+        """Queue a db.apply_group operation and return its result once its group has committed"""
+        self.ensure_started()
+        future = self.loop.create_future()
+        self.queue.put_nowait((operation, future))
+        return await future
+
+    async def next_group(self):
+        group = [await self.queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(group) < self.max_batch:
+            if self.queue.empty():
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    group.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            else:
+                group.append(self.queue.get_nowait())
+        return group
+
+    async def run(self):
+        while True:
+            group = await self.next_group()
+            operations = [operation for operation, _ in group]
+            try:
+                results = await apply_group(operations)
+            except Exception:
+                # find the culprit: every operation on its own, so the others still go through
+                results = []
+                for operation in operations:
+                    try:
+                        results.append((await apply_group([operation]))[0])
+                    except Exception as e:
+                        results.append(e)
+            self.groups += 1
+            self.operations += len(group)
+            for (_, future), result in zip(group, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def stats(self):
+        return {
+            "groups": self.groups,
+            "operations": self.operations,
+            "mean_group_size": self.operations / self.groups if self.groups else 0,
+        }
+
+apply_group = async_db.offload(db.apply_group)
+
+writer = GroupCommitWriter(
+    max_batch=int(os.getenv('GROUP_COMMIT_MAX_BATCH', '256')),
+    window=float(os.getenv('GROUP_COMMIT_WINDOW_MS', '0')) / 1000
+)
+
+# drop-in replacements for async_db.apply_transaction / transfer, see main.py
+async def apply_transaction(account_ID, tx_type, amount):
+    op = "deposit" if tx_type == models.TransactionType.DEPOSIT else "withdraw"
+    return await writer.submit((op, account_ID, amount))
+
+async def transfer(from_username, target_username, amount):
+    return await writer.submit(("transfer", from_username, target_username, amount))
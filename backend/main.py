@@ -1,13 +1,23 @@
 import models
 import db
+import async_db
+import account_locks
+import exports
+import group_commit
+import metrics
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from fastapi import Body
+from fastapi import Body, Depends, Query
+from typing import List, Literal, Optional
+from datetime import datetime
 from fastapi.middleware.cors import CORSMiddleware
 
 class AccountInfo(BaseModel):
     name: str
     initial_deposit: int
+    # registered for transfers and search along with the account
+    username: Optional[str] = None
 
 class DepositRequest(BaseModel):
     account_id: str
@@ -22,6 +32,19 @@ class TransferRequest(BaseModel):
     target_username: str
     amount: int
 
+class BatchOperation(BaseModel):
+    op: Literal["deposit", "withdraw", "transfer"]
+    amount: int
+    # accounts may be given by ID or by username
+    account_id: Optional[str] = None
+    from_username: Optional[str] = None
+    target_account_id: Optional[str] = None
+    target_username: Optional[str] = None
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+    mode: Literal["atomic", "best_effort"] = "atomic"
+
 class UsernameLookupRequest(BaseModel):
     username: str
 
@@ -30,6 +53,12 @@ class UsernameSearchRequest(BaseModel):
 
 app = FastAPI()
 
+# deposits, withdrawals and transfers share commits with GROUP_COMMIT=1 (see group_commit.py);
+# otherwise requests on the same account take turns (see account_locks.py). The group-commit
+# writer already runs everything in order, and locks would keep an account to one op per group.
+writes = group_commit if group_commit.enabled else async_db
+account_lock = account_locks.hold_nothing if group_commit.enabled else account_locks.hold
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -38,28 +67,36 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
 
 # account creation, query, and deletion
 @app.post("/accounts")
 async def create_account(account_info: AccountInfo):
     account = models.Account(account_info.name, account_info.initial_deposit)
-    db.insert_account(account)
+    if account_info.username is not None and await async_db.get_account_id_by_username(account_info.username):
+        return JSONResponse(status_code=409, content={
+            "error": "Username already taken",
+            "username": account_info.username,
+            "success": False
+        })
+    await async_db.insert_account(account, account_info.username)
     return {
         "account_ID": str(account.account_ID),
         "name": account.name,
         "balance": account.balance,
         "policy_ID": "default_policy",
+        "username": account_info.username,
         "status": "created"
     } 
 
 @app.get("/accounts/{id}")
 async def get_account(id: str):
-    result = db.get_account(id)
+    result = await async_db.get_account(id)
     return result
 
 @app.delete("/accounts/{id}")
 async def delete_account(id: str):
-    db.delete_account(id)
+    await async_db.delete_account(id)
     return {
         "account_ID": id,
         "status": "deleted",
@@ -67,15 +104,35 @@ async def delete_account(id: str):
     }
 
 @app.get("/accounts")
-async def get_all_accounts():
-    accounts = db.get_all_accounts()
-    return accounts 
+async def get_all_accounts(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    min_balance: Optional[int] = None,
+    max_balance: Optional[int] = None,
+    sort: str = Query("account_ID", pattern="^(account_ID|name|balance)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    with_total: bool = False,
+    all_rows: bool = Query(False, alias="all")
+):
+    """Get a page of accounts, or every account with ?all=true"""
+    if all_rows:
+        return await async_db.get_all_accounts()
+    try:
+        return await async_db.get_accounts_page(
+            limit, cursor, min_balance=min_balance, max_balance=max_balance,
+            sort=sort, descending=order == "desc", with_total=with_total
+        )
+    except ValueError as e:
+        return {
+            "error": str(e),
+            "success": False
+        }
 
 # username lookup (backend only)
 @app.post("/user/lookup")
 async def lookup_account_by_username(req: UsernameLookupRequest):
     """Get account ID by username (for backend use only)"""
-    account_id = db.get_account_id_by_username(req.username)
+    account_id = await async_db.get_account_id_by_username(req.username)
     if account_id:
         return {
             "username": req.username,
@@ -94,7 +151,7 @@ async def lookup_account_by_username(req: UsernameLookupRequest):
 @app.post("/user/search")
 async def search_usernames(req: UsernameSearchRequest):
     """Search for usernames matching the search term (partial matching)"""
-    usernames = db.search_usernames(req.search_term)
+    usernames = await async_db.search_usernames(req.search_term)
     return {
         "search_term": req.search_term,
         "matches": usernames,
@@ -104,43 +161,24 @@ async def search_usernames(req: UsernameSearchRequest):
 # transactions
 @app.post("/account/deposit")
 async def make_deposit(req: DepositRequest):
-    account = db.get_account(req.account_id)
-    account_obj = models.Account(
-        account["name"],
-        account["balance"],
-        account["account_ID"]
-    )
-    tx = account_obj.deposit(req.amount)
-    db.update_account(account_obj.account_ID, "BALANCE", account_obj.balance)
-    db.insert_transaction(tx)
-    
-    return {
-        "transaction": {
-            "tx_ID": str(tx.tx_ID),
-            "amount": tx.amount,
-            "tx_type": tx.tx_type.value,
-            "status": tx.status.value,
-            "timestamp": tx.timestamp.isoformat()
-        },
-        "account": {
-            "account_ID": str(account_obj.account_ID),
-            "name": account_obj.name,
-            "balance": account_obj.balance
-        }
-    }
+    return await apply_transaction(req.account_id, models.TransactionType.DEPOSIT, req.amount)
 
 @app.post("/accounts/withdraw")
 async def make_withdrawal(req: WithdrawRequest):
-    account = db.get_account(req.account_id)
-    account_obj = models.Account(
-        account["name"],
-        account["balance"],
-        account["account_ID"]
-    )
-    tx = account_obj.withdraw(req.amount)
-    db.update_account(account_obj.account_ID, "BALANCE", account_obj.balance)
-    db.insert_transaction(tx)
-    
+    return await apply_transaction(req.account_id, models.TransactionType.WITHDRAWAL, req.amount)
+
+async def apply_transaction(account_id, tx_type, amount):
+    # balance update and ledger insert happen in a single db transaction, checked against the account's policy
+    async with account_lock(account_id):
+        result = await writes.apply_transaction(account_id, tx_type, amount)
+    if result is None:
+        return {
+            "error": "Account not found",
+            "account_ID": account_id,
+            "success": False
+        }
+    account, tx = result
+
     return {
         "transaction": {
             "tx_ID": str(tx.tx_ID),
@@ -150,54 +188,24 @@ async def make_withdrawal(req: WithdrawRequest):
             "timestamp": tx.timestamp.isoformat()
         },
         "account": {
-            "account_ID": str(account_obj.account_ID),
-            "name": account_obj.name,
-            "balance": account_obj.balance
+            "account_ID": account["account_ID"],
+            "name": account["name"],
+            "balance": account["balance"]
         }
     }
 
 @app.post("/accounts/transfer")
 async def make_transfer(req: TransferRequest):
-    # Look up account IDs by username
-    from_account_id = db.get_account_id_by_username(req.from_username)
-    to_account_id = db.get_account_id_by_username(req.target_username)
-    
-    # Validate that both usernames exist
-    if not from_account_id:
-        return {
-            "error": "Source username not found",
-            "username": req.from_username,
-            "success": False
-        }
-    
-    if not to_account_id:
-        return {
-            "error": "Target username not found", 
-            "username": req.target_username,
-            "success": False
-        }
-    
-    # Get account details by account ID
-    to_account = db.get_account(to_account_id)
-    from_account = db.get_account(from_account_id)
-
-    to_account_obj = models.Account(
-        to_account["name"],
-        to_account["balance"],
-        to_account["account_ID"]
-    )
-    from_account_obj = models.Account(
-        from_account["name"],
-        from_account["balance"],
-        from_account["account_ID"]
-    )
-
-    payer_tx, payee_tx = from_account_obj.payment(to_account_obj, req.amount)
+    # resolve usernames, update both balances and record both ledger rows in one db transaction
+    account_ids = await async_db.resolve_usernames([req.from_username, req.target_username])
+    async with account_lock(*account_ids.values()):
+        result = await writes.transfer(req.from_username, req.target_username, req.amount)
+    if "error" in result:
+        return {**result, "success": False}
 
-    db.update_account(to_account_obj.account_ID, "BALANCE", to_account_obj.balance)
-    db.update_account(from_account_obj.account_ID, "BALANCE", from_account_obj.balance)
-    db.insert_transaction(payer_tx)
-    db.insert_transaction(payee_tx)
+    payer_tx = result["payer_tx"]
+    from_account = result["from_account"]
+    to_account = result["to_account"]
 
     return {
         "transaction": {
@@ -208,24 +216,98 @@ async def make_transfer(req: TransferRequest):
             "timestamp": payer_tx.timestamp.isoformat()
         },
         "from_account": {
-            "account_ID": str(from_account_obj.account_ID),
-            "name": from_account_obj.name,
-            "balance": from_account_obj.balance
+            "account_ID": from_account["account_ID"],
+            "name": from_account["name"],
+            "balance": from_account["balance"]
         },
         "to_account": {
-            "account_ID": str(to_account_obj.account_ID),
-            "name": to_account_obj.name,
-            "balance": to_account_obj.balance
+            "account_ID": to_account["account_ID"],
+            "name": to_account["name"],
+            "balance": to_account["balance"]
         }
     }
 
+@app.post("/transactions/batch")
+async def make_batch(req: BatchRequest):
+    """Apply many operations in order in one db transaction (e.g. a settlement file)"""
+    operations = [operation.model_dump() for operation in req.operations]
+    # queue behind (and ahead of) single-operation requests on every account the batch touches
+    usernames = {
+        operation[key] for operation in operations for key in ("from_username", "target_username") if operation[key]
+    }
+    account_ids = await async_db.resolve_usernames(usernames) if usernames else {}
+    locked = set(account_ids.values()) | {
+        operation[key] for operation in operations for key in ("account_id", "target_account_id") if operation[key]
+    }
+    async with account_lock(*locked):
+        committed, results = await async_db.apply_batch(operations, atomic=req.mode == "atomic")
+    return {
+        "mode": req.mode,
+        "committed": committed,
+        "succeeded": sum(result["status"] == "SUCCESS" for result in results),
+        "results": results
+    }
+
 # ledger operations
 @app.get("/accounts/ledger/{id}")
-async def get_ledger(id: str):
-    ledger = db.get_ledger(id) 
-    return ledger
+async def get_ledger(
+    id: str,
+    limit: int = Query(50, ge=1, le=500),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
+    tx_type: Optional[str] = None,
+    status: Optional[str] = None,
+    all_rows: bool = Query(False, alias="all")
+):
+    """Get a page of the account's ledger (newest first), or every row with ?all=true"""
+    if all_rows:
+        return await async_db.get_ledger(id)
+    try:
+        return await async_db.get_ledger_page(
+            id, limit, before=before, after=after, from_date=from_date,
+            to_date=to_date, tx_type=tx_type, status=status
+        )
+    except ValueError as e:
+        return {
+            "error": str(e),
+            "success": False
+        }
 
-from typing import Optional
+def ledger_export_response(account_ID, fmt, filename):
+    # db.iter_ledger is a plain generator, so Starlette drains it in a worker thread
+    rows = db.iter_ledger(account_ID)
+    columns = [column.name for column in db.ledger.columns]
+    return StreamingResponse(
+        exports.ledger_chunks(rows, fmt, columns),
+        media_type=exports.CONTENT_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'}
+    )
+
+@app.get("/accounts/{id}/analytics")
+async def get_account_analytics(id: str):
+    """Balance history, per-type totals, daily net flow, overdraft intervals and decline stats"""
+    try:
+        # NumPy is only needed here, so the rest of the API runs without it
+        import analytics
+    except ImportError:
+        return {
+            "error": "analytics requires numpy",
+            "success": False
+        }
+    if await async_db.get_account(id) is None:
+        return {
+            "error": "Account not found",
+            "account_ID": id,
+            "success": False
+        }
+    return await async_db.offload(analytics.account_analytics)(id)
+
+@app.get("/accounts/ledger/{id}/export")
+async def export_ledger(id: str, fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$")):
+    """Stream an account's full ledger history as NDJSON or CSV"""
+    return ledger_export_response(id, fmt, f"ledger-{id}")
 
 # Policy Request Model
 class PolicyRequest(BaseModel):
@@ -240,7 +322,15 @@ class PolicyRequest(BaseModel):
 @app.post("/policy-requests")
 async def create_policy_request(policy_request: PolicyRequest):
     from datetime import datetime
-    
+
+    # user_id is the account the limits are for; approval applies them to it
+    if await async_db.get_account(policy_request.user_id) is None:
+        return JSONResponse(status_code=404, content={
+            "error": "Account not found",
+            "account_ID": policy_request.user_id,
+            "success": False
+        })
+
     # Create PolicyRequest object using the constructor from models
     request_obj = models.PolicyRequest(
         user_id=policy_request.user_id,
@@ -256,7 +346,7 @@ async def create_policy_request(policy_request: PolicyRequest):
     )
     
     # Insert into database
-    db.insert_policy_request(request_obj)
+    await async_db.insert_policy_request(request_obj)
     
     return {
         "request_id": str(request_obj.request_id),
@@ -264,19 +354,97 @@ async def create_policy_request(policy_request: PolicyRequest):
         "message": "Policy request created successfully"
     }
 
+class PolicyRequestPageParams:
+    def __init__(
+        self,
+        limit: int = Query(50, ge=1, le=500),
+        cursor: Optional[str] = None,
+        status: Optional[str] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+        sort: str = Query("created_at", pattern="^(created_at|updated_at)$"),
+        order: str = Query("desc", pattern="^(asc|desc)$"),
+        with_total: bool = False,
+        all_rows: bool = Query(False, alias="all")
+    ):
+        self.limit = limit
+        self.cursor = cursor
+        self.status = status
+        self.created_from = created_from
+        self.created_to = created_to
+        self.sort = sort
+        self.descending = order == "desc"
+        self.with_total = with_total
+        self.all_rows = all_rows
+
+async def policy_requests_page(user_id, params):
+    if params.all_rows:
+        return await async_db.get_policy_requests(user_id)
+    try:
+        return await async_db.get_policy_requests_page(
+            params.limit, params.cursor, user_id=user_id, status=params.status,
+            created_from=params.created_from, created_to=params.created_to,
+            sort=params.sort, descending=params.descending, with_total=params.with_total
+        )
+    except ValueError as e:
+        return {
+            "error": str(e),
+            "success": False
+        }
+
 # Get Policy Requests Endpoint
 @app.get("/policy-requests")
-async def get_policy_requests(user_id: str = None):
-    """Get all policy requests or filter by user_id"""
-    requests = db.get_policy_requests(user_id)
-    return requests
+async def get_policy_requests(user_id: str = None, params: PolicyRequestPageParams = Depends()):
+    """Get a page of policy requests, optionally for one user (every match with ?all=true)"""
+    return await policy_requests_page(user_id, params)
 
 # Admin-specific endpoints
 @app.get("/admin/policy-requests")
-async def get_admin_policy_requests():
-    """Get all policy requests for admin view"""
-    requests = db.get_policy_requests()
-    return requests
+async def get_admin_policy_requests(user_id: Optional[str] = None, params: PolicyRequestPageParams = Depends()):
+    """Get a page of policy requests for admin view, filterable by status, user and created_at range"""
+    return await policy_requests_page(user_id, params)
+
+class PolicyRequestStatusUpdate(BaseModel):
+    status: str
+
+@app.put("/admin/policy-requests/{request_id}")
+async def update_policy_request_status(request_id: str, update: PolicyRequestStatusUpdate):
+    """Approve or reject a policy request; approval applies the requested limits to the account"""
+    result = await async_db.update_policy_request_status(request_id, update.status)
+    if result is None:
+        return {
+            "error": "Policy request not found",
+            "request_id": request_id,
+            "success": False
+        }
+    if "error" in result:
+        # the request names an account that does not exist, so approving it would change nothing
+        return JSONResponse(status_code=409, content={**result, "request_id": request_id, "success": False})
+    return {
+        "request_id": request_id,
+        "status": update.status,
+        "message": "Policy request updated successfully"
+    }
+
+@app.get("/admin/cache-stats")
+async def get_cache_stats():
+    """Hit, miss and eviction counters for the in-process caches"""
+    return db.cache_stats()
+
+@app.get("/metrics")
+async def get_metrics():
+    """Request, query, pool and cache metrics in the Prometheus text format"""
+    return PlainTextResponse(metrics.render(db.cache_stats()), media_type="text/plain; version=0.0.4")
+
+@app.get("/admin/stats")
+async def get_bank_stats(days: int = Query(30, ge=1, le=366)):
+    """Dashboard totals: deposits under management, daily volume by type and decline rates"""
+    return await async_db.get_bank_stats(days)
+
+@app.get("/admin/ledger/export")
+async def export_bank_ledger(fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$")):
+    """Stream the bank-wide ledger as NDJSON or CSV"""
+    return ledger_export_response(None, fmt, "ledger")
 
 # Initialize hardcoded admin user and sample policy requests
 @app.on_event("startup")
@@ -288,6 +456,10 @@ async def startup_event():
     
     # Admin access is now handled separately - no admin account needed
     print("Admin access available via dedicated admin panel")
+
+    # Warm the username <-> account_ID caches used by lookups and transfers
+    print(f"Preloaded {db.preload_usernames()} usernames")
+    print(f"Indexed {db.rebuild_username_index()} usernames for search")
     
     # Seed one demo account if none exist
     try:
@@ -0,0 +1,31 @@
+"""
+Maintenance commands for the backend database.
+
+    python manage.py migrate          upgrade an existing database to the current schema
+    python manage.py rebuild-stats    recompute the admin summary tables from accounts and ledger
+"""
+import argparse
+import db
+
+def migrate(args):
+    db.meta.create_all(db.engine)
+    db.upgrade_schema()
+    print(f"Schema up to date: {db.engine.url}")
+
+def rebuild_stats(args):
+    db.rebuild_stats()
+    print(f"Summary tables rebuilt: {db.get_bank_stats(1)['transactions']} ledger rows")
+
+COMMANDS = {
+    "migrate": migrate,
+    "rebuild-stats": rebuild_stats,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="QA Bank Lab database maintenance")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args()
+    COMMANDS[args.command](args)
+
+if __name__ == "__main__":
+    main()
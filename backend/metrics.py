@@ -0,0 +1,277 @@
+"""
+In-process metrics in the Prometheus text format, served at /metrics.
+
+    http_request_duration_seconds      by method, route template and status
+    db_query_duration_seconds          by the db helper that issued the query
+    db_pool_checkout_duration_seconds  time spent getting a pooled connection
+    cache_hits_total, cache_misses_total, cache_hit_ratio, cache_entries  by db cache
+
+Request and query counts are the histograms' _count series.
+
+Statements slower than SLOW_QUERY_MS (default 100) are logged to the
+"slow_queries" logger with their parameters and calling db function, and
+every response says how many statements it ran in X-DB-Queries.
+
+MetricsMiddleware times requests. Statements are timed by TimedCursor on
+SQLite and by SQLAlchemy's before/after_cursor_execute hooks on other
+databases; instrument_engine also times pool checkouts. Cache counters are
+read from db.cache_stats() when /metrics is scraped, so the caches pay
+nothing extra. Set METRICS_ENABLED=0 to turn request and query timing off.
+"""
+import bisect
+import contextvars
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from sqlalchemy import event
+
+enabled = os.getenv('METRICS_ENABLED', '1') == '1'
+
+# seconds; the default Prometheus client buckets, extended down for fast queries
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """Fixed-bucket histogram per label set; observe() is a bisect and three additions"""
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, label_values=()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self.lock:
+            series = [(label_values, list(counts), total, count) for label_values, (counts, total, count) in self.series.items()]
+        samples = []
+        for label_values, counts, total, count in series:
+            labels = tuple(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", labels + (("le", format_value(bound)),), cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+    def clear(self):
+        with self.lock:
+            self.series.clear()
+
+http_latency = Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route", "status"))
+db_latency = Histogram("db_query_duration_seconds", "SQL statement latency", ("helper",))
+pool_checkout = Histogram("db_pool_checkout_duration_seconds", "Time to get a connection from the pool")
+
+REGISTRY = [http_latency, db_latency, pool_checkout]
+
+def reset():
+    # drop every recorded sample, e.g. between tests
+    for metric in REGISTRY:
+        metric.clear()
+
+def format_value(value):
+    if isinstance(value, str):
+        return value
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def format_sample(name, labels, value):
+    if labels:
+        name += "{" + ",".join(f'{key}="{escape(label)}"' for key, label in labels) + "}"
+    return f"{name} {format_value(value)}"
+
+def render_metric(name, type, help, samples):
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {type}"]
+    lines.extend(format_sample(*sample) for sample in samples)
+    return lines
+
+def render(cache_stats=None):
+    """Every metric in the Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(render_metric(metric.name, metric.type, metric.help, metric.samples()))
+    if cache_stats is not None:
+        lines.extend(render_caches(cache_stats))
+    return "\n".join(lines) + "\n"
+
+def render_caches(cache_stats):
+    hits = [("cache_hits_total", (("cache", name),), stats["hits"]) for name, stats in cache_stats.items()]
+    misses = [("cache_misses_total", (("cache", name),), stats["misses"]) for name, stats in cache_stats.items()]
+    ratios = [
+        ("cache_hit_ratio", (("cache", name),), stats["hits"] / (stats["hits"] + stats["misses"]) if stats["hits"] + stats["misses"] else 0)
+        for name, stats in cache_stats.items()
+    ]
+    sizes = [("cache_entries", (("cache", name),), stats["size"]) for name, stats in cache_stats.items()]
+    return (
+        render_metric("cache_hits_total", "counter", "Cache lookups that found an entry", hits)
+        + render_metric("cache_misses_total", "counter", "Cache lookups that missed or expired", misses)
+        + render_metric("cache_hit_ratio", "gauge", "Hits over lookups since startup", ratios)
+        + render_metric("cache_entries", "gauge", "Entries currently cached", sizes)
+    )
+
+# request timing
+
+class MetricsMiddleware:
+    """ASGI middleware timing each HTTP request by method, route template and status.
+
+    Responses also carry X-DB-Queries and X-DB-Time-Ms: the statements run
+    for the request before its response started, and their total time.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not enabled:
+            return await self.app(scope, receive, send)
+        status = [500]
+        queries = [0, 0.0]
+        request_queries.set(queries)
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                message = {**message, "headers": [
+                    *message.get("headers", []),
+                    (b"x-db-queries", str(queries[0]).encode()),
+                    (b"x-db-time-ms", f"{queries[1] * 1e3:.3f}".encode()),
+                ]}
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # the router stores the matched route in scope; templates keep the label set small
+            route = scope.get("route")
+            labels = (scope["method"], getattr(route, "path", "unmatched"), str(status[0]))
+            http_latency.observe(time.perf_counter() - start, labels)
+
+# query timing
+
+# set by async_db.offload to the helper it runs, so the query hooks can skip the stack walk
+current_helper = contextvars.ContextVar("current_helper", default=None)
+# [statements, seconds] of the current request, set by MetricsMiddleware; worker threads
+# run in a copy of the request's context, so they add to the same list
+request_queries = contextvars.ContextVar("request_queries", default=None)
+# callables(statement, parameters, elapsed) run after every statement, e.g. tests/integration/query_budget.py
+query_listeners = []
+
+# statements at least this slow are logged with their parameters and calling db function
+slow_query_seconds = float(os.getenv('SLOW_QUERY_MS', '100')) / 1000
+slow_query_log = logging.getLogger("slow_queries")
+
+def db_helper(module="db"):
+    """Name of the outermost function of module on the current call stack, i.e. the helper the app called"""
+    frame = sys._getframe(1)
+    helper = None
+    while frame is not None:
+        if frame.f_globals.get("__name__") == module and frame.f_code.co_name != "<module>":
+            helper = frame.f_code.co_name
+        frame = frame.f_back
+    return helper or "other"
+
+def db_caller(module="db"):
+    """Name of the innermost function of module on the current call stack"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_globals.get("__name__") == module and frame.f_code.co_name != "<module>":
+            return frame.f_code.co_name
+        frame = frame.f_back
+    return "other"
+
+def record_query(statement, parameters, elapsed):
+    helper = current_helper.get() or db_helper()
+    db_latency.observe(elapsed, (helper,))
+    queries = request_queries.get()
+    if queries is not None:
+        queries[0] += 1
+        queries[1] += elapsed
+    if elapsed >= slow_query_seconds:
+        shown = repr(parameters)
+        slow_query_log.warning(
+            "slow query %.1f ms in db.%s (via db.%s): %s parameters=%s",
+            elapsed * 1e3, db_caller(), helper, " ".join(statement.split()),
+            shown if len(shown) <= 500 else shown[:500] + "..."
+        )
+    for listener in query_listeners:
+        listener(statement, parameters, elapsed)
+
+class TimedCursor(sqlite3.Cursor):
+    """sqlite3 cursor that reports every statement to record_query"""
+
+    def execute(self, statement, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(statement, parameters)
+        finally:
+            record_query(statement, parameters, time.perf_counter() - start)
+
+    def executemany(self, statement, parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(statement, parameters)
+        finally:
+            record_query(statement, parameters, time.perf_counter() - start)
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3.connect(factory=TimedConnection) hands out TimedCursors.
+
+    SQLAlchemy always executes through cursor(); the Connection.execute
+    shortcut builds a plain cursor and is not timed.
+    """
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+def sqlite_connect_args():
+    # SQLAlchemy's cursor events switch every execute onto its event-dispatch path, which
+    # cost ~10% on the deposit path; timing at the driver's cursor costs next to nothing
+    return {'factory': TimedConnection} if enabled else {}
+
+def instrument_engine(engine):
+    """Time every pool checkout on engine, and every statement unless it runs on TimedConnections"""
+    if not enabled:
+        return engine
+
+    if engine.dialect.name != "sqlite":
+        @event.listens_for(engine, "before_cursor_execute")
+        def start_query(conn, cursor, statement, parameters, context, executemany):
+            context.query_start = time.perf_counter()
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def end_query(conn, cursor, statement, parameters, context, executemany):
+            record_query(statement, parameters, time.perf_counter() - context.query_start)
+
+    # raw_connection is what Connection calls to check out from engine.pool (whichever pool that is after a dispose())
+    raw_connection = engine.raw_connection
+
+    def timed_raw_connection():
+        start = time.perf_counter()
+        try:
+            return raw_connection()
+        finally:
+            pool_checkout.observe(time.perf_counter() - start)
+
+    engine.raw_connection = timed_raw_connection
+    return engine
@@ -4,7 +4,9 @@
 from enum import Enum
 # from tabulate import tabulate
 import uuid
-from datetime import datetime
+from array import array
+from collections.abc import Sequence
+from datetime import datetime, timedelta
 
 class TransactionType(Enum):
     DEPOSIT = "DEPOSIT"
@@ -38,15 +40,26 @@ class Policy:
         self.allowNegativeBalance = allowNegativeBalance
         self.overdraftLimit = overdraftLimit
     
-    def validate_withdrawal(self, amount, balance):
-        if (amount > self.maxWithdrawal):
+    def validate_withdrawal(self, amount, balance, withdrawn_today=0):
+        if (amount <= 0 or amount > self.maxWithdrawal):
+            return False
+        if (withdrawn_today + amount > self.dailyWithdrawalLimit):
             return False
         if (not self.allowNegativeBalance and amount > balance):
             return False
         if (self.allowNegativeBalance and balance-amount<-self.overdraftLimit):
             return False
         return True
-    
+
+    # lowest starting balance from which amount may be withdrawn (None if never allowed)
+    # the daily limit is checked separately, against the day's running total
+    def withdrawal_floor(self, amount):
+        if (amount <= 0 or amount > self.maxWithdrawal):
+            return None
+        if (not self.allowNegativeBalance):
+            return amount
+        return amount - self.overdraftLimit
+
     def validate_deposit(self, amount):
         if (amount > self.maxDeposit or amount < 0):
             return False
@@ -93,7 +106,97 @@ class Ledger:
     #         ])
     #     print(tabulate(table, headers = column_names))
 
+EPOCH = datetime(1970, 1, 1)
+TX_TYPES = list(TransactionType)
+STATUSES = list(StatusType)
+TX_TYPE_CODES = {tx_type: code for code, tx_type in enumerate(TX_TYPES)}
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+
+class ColumnarLedger:
+    """Drop-in Ledger that stores each field in a packed column instead of one object per transaction.
+
+    amounts and balances are doubles, tx types and statuses one-byte enum codes,
+    timestamps (naive UTC) epoch microseconds and tx_IDs 16 raw UUID bytes.
+    user_id and counterparty are dictionary-encoded into the parties list.
+    transactions is a read-only sequence that builds a Transaction per row on
+    access, so changing one of those objects does not change the ledger.
+    """
+    def __init__(self, transactions: list = None):
+        self.amounts = array('d')
+        self.balances = array('d')
+        self.type_codes = array('B')
+        self.status_codes = array('B')
+        self.timestamps = array('q')
+        self.ids = bytearray()
+        self.user_codes = array('I')
+        self.counterparty_codes = array('I')
+        # party code -> user_id / counterparty; code 0 is None
+        self.parties = [None]
+        self._party_codes = {None: 0}
+        if transactions:
+            self.add_transaction(transactions)
+
+    def _party_code(self, party):
+        code = self._party_codes.get(party)
+        if code is None:
+            code = self._party_codes[party] = len(self.parties)
+            self.parties.append(party)
+        return code
+
+    def add_transaction(self, tx):
+        for tx in (tx if isinstance(tx, list) else [tx]):
+            tx_ID = tx.tx_ID if isinstance(tx.tx_ID, uuid.UUID) else uuid.UUID(str(tx.tx_ID))
+            delta = tx.timestamp - EPOCH
+            self.amounts.append(tx.amount)
+            self.balances.append(tx.current_balance)
+            self.type_codes.append(TX_TYPE_CODES[tx.tx_type])
+            self.status_codes.append(STATUS_CODES[tx.status])
+            self.timestamps.append((delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds)
+            self.ids += tx_ID.bytes
+            self.user_codes.append(self._party_code(tx.user_id))
+            self.counterparty_codes.append(self._party_code(tx.counterparty))
+
+    def row(self, index):
+        tx = Transaction(
+            self.parties[self.user_codes[index]],
+            self.amounts[index],
+            TX_TYPES[self.type_codes[index]],
+            self.balances[index],
+            EPOCH + timedelta(microseconds=self.timestamps[index]),
+            tx_ID=uuid.UUID(bytes=bytes(self.ids[index * 16:index * 16 + 16])),
+            counterparty=self.parties[self.counterparty_codes[index]]
+        )
+        tx.status = STATUSES[self.status_codes[index]]
+        return tx
+
+    def __len__(self):
+        return len(self.amounts)
+
+    @property
+    def transactions(self):
+        return LedgerRows(self)
+
+class LedgerRows(Sequence):
+    # lazy Transaction views over a ColumnarLedger
+    def __init__(self, ledger):
+        self.ledger = ledger
+
+    def __len__(self):
+        return len(self.ledger)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.ledger.row(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("ledger index out of range")
+        return self.ledger.row(index)
+
 class Transaction:
+    # no per-instance __dict__: simulations keep millions of these alive
+    __slots__ = ("tx_ID", "user_id", "amount", "tx_type", "timestamp", "current_balance", "status", "counterparty")
+
     def __init__(self, user_id, amount, tx_type, current_balance, timestamp, tx_ID=None, counterparty=None):
         self.tx_ID = tx_ID or uuid.uuid4()
         self.user_id = user_id
@@ -102,10 +205,10 @@ class Transaction:
         self.timestamp = timestamp
         self.current_balance = current_balance
         self.status = StatusType.PROCESSING
-        counterparty=counterparty
+        self.counterparty = counterparty
 
 class Account:
-    def __init__(self, name, balance, account_ID=None, override=False):
+    def __init__(self, name, balance, account_ID=None, override=False, ledger=None):
         if (balance <= 0 and not override):
             raise ValueError("balance must be positive")
         self.name = name
@@ -114,13 +217,18 @@ class Account:
 
         # account specific policy and ledger objects
         self.policy = Policy()
-        self.ledger = Ledger()
+        self.ledger = ledger if ledger is not None else Ledger()
+        # total withdrawn per (UTC) day, checked against the daily withdrawal limit
+        self.daily_withdrawals = {}
 
-    # withdrawal money from account
-    def withdraw(self, amount):   
-        if (self.policy.validate_withdrawal(amount, self.balance)):
+    # withdrawal money from account (timestamp defaults to now; simulations pass their own clock)
+    def withdraw(self, amount, timestamp=None):
+        timestamp = timestamp or datetime.utcnow()
+        withdrawn_today = self.daily_withdrawals.get(timestamp.date(), 0)
+        if (self.policy.validate_withdrawal(amount, self.balance, withdrawn_today)):
             new_balance = self.balance - amount
             status = StatusType.SUCCESS  # approve transaction
+            self.daily_withdrawals[timestamp.date()] = withdrawn_today + amount
         else:
             new_balance = self.balance
             status = StatusType.DECLINED # decline transaction
@@ -130,7 +238,7 @@ class Account:
             amount,
             TransactionType.WITHDRAWAL,
             new_balance,
-            datetime.utcnow()
+            timestamp
         )
         self.balance = new_balance
         tx.status = status
@@ -139,7 +247,7 @@ class Account:
         return tx
     
     # deposit money into account
-    def deposit(self, amount):
+    def deposit(self, amount, timestamp=None):
         if (amount < 0):
             raise ValueError("deposit must be positive")
         if (self.policy.validate_deposit(amount)):
@@ -154,7 +262,7 @@ class Account:
             amount,
             TransactionType.DEPOSIT,
             new_balance,
-            datetime.utcnow()
+            timestamp or datetime.utcnow()
         ) 
         self.balance = new_balance
         tx.status = status
@@ -162,21 +270,22 @@ class Account:
         self.ledger.add_transaction(tx)
         return tx
  
-    def payment(self, account_obj, amount):
+    def payment(self, account_obj, amount, timestamp=None):
         # initial balances
         self_balance = self.balance
         target_balance = account_obj.balance
 
+        transaction_time = timestamp or datetime.utcnow()
+        withdrawn_today = self.daily_withdrawals.get(transaction_time.date(), 0)
+
         # check policy to validate transaction
-        if (self.policy.validate_withdrawal(amount, self.balance)):
+        status = StatusType.DECLINED
+        if (self.policy.validate_withdrawal(amount, self.balance, withdrawn_today)):
             if (account_obj.policy.validate_deposit(amount)):
                 self_balance = self.balance - amount
                 target_balance = account_obj.balance + amount
                 status = StatusType.SUCCESS
-        else:
-            status = StatusType.DECLINED
-        
-        transaction_time = datetime.utcnow()
+                self.daily_withdrawals[transaction_time.date()] = withdrawn_today + amount
 
         payer_tx = Transaction(
             user_id=self.account_ID,
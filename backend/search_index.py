@@ -0,0 +1,101 @@
+"""
+In-memory substring index for username autocomplete.
+
+Usernames are matched case-insensitively, like the ILIKE '%term%' query it
+replaces. Prefix matches come from a sorted key list (bisect); other matches
+come from posting lists of every 1-, 2- and 3-character substring. A term of
+up to 3 characters has its own posting list, which holds exactly the names
+containing it; longer terms scan the shortest list among their trigrams and
+check each candidate directly. Posting lists are arrays of integer IDs, so a
+million usernames cost tens of megabytes rather than one set per gram.
+"""
+import threading
+from array import array
+from bisect import bisect_left, insort
+
+GRAM_SIZES = (1, 2, 3)
+
+def grams(key, sizes=GRAM_SIZES):
+    return {key[i:i + n] for n in sizes for i in range(len(key) - n + 1)}
+
+class UsernameIndex:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.usernames = []      # id -> username
+            self.keys = []           # id -> lowercased username
+            self.sorted_keys = []    # (key, id), sorted for prefix search
+            self.postings = {}       # 1-3 character gram -> array of ids containing it
+            self.ready = False
+
+    def add_unlocked(self, username):
+        user_id = len(self.usernames)
+        key = username.lower()
+        self.usernames.append(username)
+        self.keys.append(key)
+        for gram in grams(key):
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = self.postings[gram] = array('I')
+            posting.append(user_id)
+        return user_id, key
+
+    def add(self, username):
+        with self.lock:
+            user_id, key = self.add_unlocked(username)
+            insort(self.sorted_keys, (key, user_id))
+
+    def build(self, usernames):
+        # bulk load: one sort at the end instead of an insort per name
+        with self.lock:
+            entries = [self.add_unlocked(username) for username in usernames]
+            self.sorted_keys.extend((key, user_id) for user_id, key in entries)
+            self.sorted_keys.sort()
+            self.ready = True
+
+    def search(self, term, limit=10):
+        """Usernames containing term: prefix matches first, alphabetically, then other matches.
+
+        The other matches are the first found in insertion order, sorted among
+        themselves; they are not the alphabetically first of all matches.
+        """
+        with self.lock:
+            return self.search_unlocked(term.lower(), limit)
+
+    def search_unlocked(self, term, limit):
+        prefix_ids = []
+        position = bisect_left(self.sorted_keys, (term,))
+        while len(prefix_ids) < limit and position < len(self.sorted_keys):
+            key, user_id = self.sorted_keys[position]
+            if not key.startswith(term):
+                break
+            prefix_ids.append(user_id)
+            position += 1
+
+        matches = [self.usernames[user_id] for user_id in prefix_ids]
+        if len(matches) < limit:
+            seen = set(prefix_ids)
+            others = []
+            for user_id in self.candidates(term):
+                if user_id not in seen and term in self.keys[user_id]:
+                    others.append(self.usernames[user_id])
+                    if len(others) >= limit - len(matches):
+                        break
+            matches.extend(sorted(others, key=str.lower))
+        return matches
+
+    def candidates(self, term):
+        # ids that may contain term: its own posting list if it is short enough to have one,
+        # else the rarest of its trigrams; everyone for the empty term
+        if not term:
+            return range(len(self.keys))
+        if len(term) <= GRAM_SIZES[-1]:
+            return self.postings.get(term, ())
+        postings = [self.postings.get(gram) for gram in grams(term, GRAM_SIZES[-1:])]
+        if any(posting is None for posting in postings):
+            return ()
+        return min(postings, key=len)
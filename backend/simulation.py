@@ -0,0 +1,231 @@
+"""
+Seeded, multi-process transaction simulation over models.Account.
+
+Accounts are partitioned across shards (account i lives on shard
+i % shards) and each shard runs its share of the operations in its own
+process with its own random.Random, so a run is reproducible for a given
+(seed, shards) regardless of scheduling. Payments to an account on another
+shard are decided by the payer's shard and credited to the payee when the
+shards are reconciled at the end. The report checks conservation of money
+and the policy invariants over every account.
+
+    python simulation.py --operations 10000000 --accounts 100000 --shards 8 --seed 1
+"""
+import argparse
+import bisect
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+import models
+
+START = datetime(2024, 1, 1)
+
+# amount distribution name -> sampler(rng, *params); amounts are rounded to whole units
+AMOUNT_DISTRIBUTIONS = {
+    "uniform": lambda rng, low, high: rng.uniform(low, high),
+    "lognormal": lambda rng, mu, sigma: rng.lognormvariate(mu, sigma),
+    "exponential": lambda rng, mean: rng.expovariate(1 / mean),
+}
+
+OPERATIONS = ("deposit", "withdraw", "pay")
+
+class SimulationConfig:
+    def __init__(
+        self,
+        operations=100_000,
+        accounts=1_000,
+        shards=None,
+        seed=0,
+        mix=None,
+        amounts=("lognormal", 4.0, 1.0),
+        opening_balances=("uniform", 0, 2000),
+        cross_shard_rate=0.1,
+        days=30,
+        policy=None
+    ):
+        self.operations = operations
+        self.accounts = accounts
+        self.shards = shards or os.cpu_count() or 1
+        self.seed = seed
+        # relative weights of deposit / withdraw / pay
+        self.mix = mix or {"deposit": 4, "withdraw": 3, "pay": 3}
+        self.amounts = amounts
+        self.opening_balances = opening_balances
+        # share of payments whose payee lives on another shard
+        self.cross_shard_rate = cross_shard_rate
+        # simulated time the operations are spread over (daily limits reset per day)
+        self.days = days
+        self.policy = policy or models.Policy()
+        if self.accounts < self.shards:
+            raise ValueError("need at least one account per shard")
+
+    def sampler(self, distribution):
+        name, *params = distribution
+        sample = AMOUNT_DISTRIBUTIONS[name]
+        return lambda rng: max(1, round(sample(rng, *params)))
+
+def shard_accounts(config, shard):
+    return range(shard, config.accounts, config.shards)
+
+def shard_operations(config, shard):
+    return config.operations // config.shards + (shard < config.operations % config.shards)
+
+def run_shard(config, shard):
+    """Run one shard's operations; returns its totals, final balances and outgoing cross-shard credits"""
+    rng = random.Random(f"{config.seed}/{shard}")
+    amount = config.sampler(config.amounts)
+    opening = config.sampler(config.opening_balances)
+    # accounts are numbered 0..accounts-1 across the bank; account_ID is that number as "sim-<n>"
+    numbers = list(shard_accounts(config, shard))
+    accounts = []
+    for number in numbers:
+        # columnar ledgers keep a 10M-operation run to ~50 bytes per recorded transaction
+        account = models.Account(f"sim_{number}", opening(rng), f"sim-{number}", override=True, ledger=models.ColumnarLedger())
+        account.policy = config.policy
+        accounts.append(account)
+    opening_total = sum(account.balance for account in accounts)
+    # stands in for payees on other shards: only its policy matters to the payer's decision
+    remote = models.Account("remote", 0, "sim-remote", override=True)
+    remote.policy = config.policy
+
+    weights = [config.mix.get(operation, 0) for operation in OPERATIONS]
+    cumulative = [sum(weights[:i + 1]) / sum(weights) for i in range(len(weights))]
+    cumulative[-1] = 1.0
+    totals = {operation: {"count": 0, "accepted": 0, "amount": 0} for operation in OPERATIONS}
+    outbox = {}
+    count = shard_operations(config, shard)
+    step = timedelta(days=config.days) / max(count, 1)
+    floor = -config.policy.overdraftLimit if config.policy.allowNegativeBalance else 0
+    violations = []
+
+    for i in range(count):
+        timestamp = START + step * i
+        account = accounts[int(rng.random() * len(accounts))]
+        operation = OPERATIONS[bisect.bisect(cumulative, rng.random())]
+        value = amount(rng)
+        if operation == "deposit":
+            tx = account.deposit(value, timestamp)
+        elif operation == "withdraw":
+            tx = account.withdraw(value, timestamp)
+        else:
+            if len(accounts) < 2 or (config.shards > 1 and rng.random() < config.cross_shard_rate):
+                if config.shards == 1:
+                    continue
+                # map 0..(accounts not on this shard) onto the numbers of those accounts
+                payee = rng.randrange(config.accounts - len(accounts))
+                payee += payee // (config.shards - 1) + (payee % (config.shards - 1) >= shard)
+                remote.account_ID = f"sim-{payee}"
+                tx = account.payment(remote, value, timestamp)[0]
+                if tx.status == models.StatusType.SUCCESS:
+                    outbox[payee] = outbox.get(payee, 0) + value
+            else:
+                payee = account
+                while payee is account:
+                    payee = accounts[int(rng.random() * len(accounts))]
+                tx = account.payment(payee, value, timestamp)[0]
+        stats = totals[operation]
+        stats["count"] += 1
+        if tx.status == models.StatusType.SUCCESS:
+            stats["accepted"] += 1
+            stats["amount"] += value
+            if account.balance < floor and len(violations) < 10:
+                violations.append({"account_ID": account.account_ID, "balance": account.balance, "at": i})
+
+    daily_limit = max(
+        (total for account in accounts for total in account.daily_withdrawals.values()), default=0
+    )
+    return {
+        "shard": shard,
+        "opening_total": opening_total,
+        "totals": totals,
+        "balances": dict(zip(numbers, (account.balance for account in accounts))),
+        "outbox": outbox,
+        "floor_violations": violations,
+        "max_daily_withdrawn": daily_limit,
+    }
+
+def reconcile(config, shard_results):
+    """Credit cross-shard payments to their payees and check the invariants over the whole bank"""
+    balances = {}
+    for result in shard_results:
+        balances.update(result["balances"])
+    in_flight = 0
+    for result in shard_results:
+        for payee, credit in result["outbox"].items():
+            balances[payee] += credit
+            in_flight += credit
+
+    totals = {operation: {"count": 0, "accepted": 0, "amount": 0} for operation in OPERATIONS}
+    for result in shard_results:
+        for operation, stats in result["totals"].items():
+            for key, value in stats.items():
+                totals[operation][key] += value
+    opening_total = sum(result["opening_total"] for result in shard_results)
+    expected = opening_total + totals["deposit"]["amount"] - totals["withdraw"]["amount"]
+    actual = sum(balances.values())
+    floor = -config.policy.overdraftLimit if config.policy.allowNegativeBalance else 0
+    floor_violations = [violation for result in shard_results for violation in result["floor_violations"]]
+    max_daily = max((result["max_daily_withdrawn"] for result in shard_results), default=0)
+    return {
+        "operations": totals,
+        "cross_shard_credits": in_flight,
+        "invariants": {
+            "conservation": {"ok": expected == actual, "expected_total": expected, "actual_total": actual},
+            "balance_floor": {
+                "ok": not floor_violations and min(balances.values(), default=0) >= floor,
+                "floor": floor,
+                "lowest_final_balance": min(balances.values(), default=None),
+                "violations": floor_violations,
+            },
+            "daily_withdrawal_limit": {
+                "ok": max_daily <= config.policy.dailyWithdrawalLimit,
+                "limit": config.policy.dailyWithdrawalLimit,
+                "max_withdrawn_in_a_day": max_daily,
+            },
+        },
+    }
+
+def simulate(config, workers=None):
+    """Run every shard (in a process pool unless workers=1) and return the reconciled report"""
+    start = time.perf_counter()
+    shards = range(config.shards)
+    if workers == 1:
+        shard_results = [run_shard(config, shard) for shard in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            shard_results = list(pool.map(run_shard, [config] * config.shards, shards))
+    report = reconcile(config, shard_results)
+    report.update({
+        "seed": config.seed,
+        "shards": config.shards,
+        "accounts": config.accounts,
+        "operations_run": sum(stats["count"] for stats in report["operations"].values()),
+        "elapsed_seconds": round(time.perf_counter() - start, 3),
+    })
+    report["ok"] = all(check["ok"] for check in report["invariants"].values())
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Seeded multi-process transaction simulation")
+    parser.add_argument("--operations", type=int, default=1_000_000)
+    parser.add_argument("--accounts", type=int, default=10_000)
+    parser.add_argument("--shards", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cross-shard-rate", type=float, default=0.1)
+    parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+
+    config = SimulationConfig(
+        operations=args.operations, accounts=args.accounts, shards=args.shards, seed=args.seed,
+        cross_shard_rate=args.cross_shard_rate, days=args.days
+    )
+    report = simulate(config, args.workers)
+    print(json.dumps(report, indent=2, default=str))
+    raise SystemExit(0 if report["ok"] else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+"""
+Query budget assertions for the integration tests.
+
+    with query_budget(8):
+        client.post("/accounts/transfer", json=...)
+
+fails if the block runs more than 8 SQL statements, and lists them.
+"""
+from contextlib import contextmanager
+import metrics
+
+@contextmanager
+def query_budget(limit):
+    statements = []
+    listener = lambda statement, parameters, elapsed: statements.append(statement)
+    metrics.query_listeners.append(listener)
+    try:
+        yield statements
+    finally:
+        metrics.query_listeners.remove(listener)
+    assert len(statements) <= limit, (
+        f"{len(statements)} queries over a budget of {limit}:\n" + "\n".join(" ".join(statement.split()) for statement in statements)
+    )
@@ -0,0 +1,439 @@
+import pytest
+import sys
+import os
+
+# set test database via env variables
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+
+# Add backend directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+# Add current directory to path to import query_budget
+sys.path.insert(0, os.path.dirname(__file__))
+
+from fastapi.testclient import TestClient
+import db
+from main import app
+from query_budget import query_budget
+
+client = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def reset_database():
+    db.meta.drop_all(db.engine)
+    db.meta.create_all(db.engine)
+    db.clear_caches()
+
+@pytest.fixture
+def account_id():
+    response = client.post("/accounts", json={"name": "Test User", "initial_deposit": 1000})
+    return response.json()["account_ID"]
+
+class TestTransactionEndpoints:
+
+    def test_deposit(self, account_id):
+        response = client.post("/account/deposit", json={"account_id": account_id, "amount": 100}).json()
+
+        assert response["transaction"]["status"] == "SUCCESS"
+        assert response["account"]["balance"] == 1100
+        assert client.get(f"/accounts/{account_id}").json()["balance"] == 1100
+
+    def test_negative_withdrawal_is_declined(self, account_id):
+        response = client.post("/accounts/withdraw", json={"account_id": account_id, "amount": -5000}).json()
+
+        assert response["transaction"]["status"] == "DECLINED"
+        assert client.get(f"/accounts/{account_id}").json()["balance"] == 1000
+
+    def test_withdraw_unknown_account(self):
+        response = client.post("/accounts/withdraw", json={"account_id": "missing", "amount": 100}).json()
+        assert response["success"] is False
+
+class TestLedgerEndpoint:
+
+    def test_paginated_ledger(self, account_id):
+        for amount in (1, 2, 3):
+            client.post("/account/deposit", json={"account_id": account_id, "amount": amount})
+
+        page = client.get(f"/accounts/ledger/{account_id}", params={"limit": 2}).json()
+        assert [row["amount"] for row in page["items"]] == [3, 2]
+
+        page = client.get(f"/accounts/ledger/{account_id}", params={"limit": 2, "before": page["next_cursor"]}).json()
+        assert [row["amount"] for row in page["items"]] == [1]
+        assert page["next_cursor"] is None
+
+    def test_unpaginated_flag(self, account_id):
+        client.post("/account/deposit", json={"account_id": account_id, "amount": 5})
+
+        rows = client.get(f"/accounts/ledger/{account_id}", params={"all": "true"}).json()
+
+        assert isinstance(rows, list) and len(rows) == 1
+
+    def test_invalid_cursor(self, account_id):
+        response = client.get(f"/accounts/ledger/{account_id}", params={"before": "bogus"}).json()
+        assert response["success"] is False
+
+class TestAccountAnalytics:
+
+    def test_analytics_from_ledger(self, account_id):
+        pytest.importorskip("numpy")
+        client.post("/account/deposit", json={"account_id": account_id, "amount": 200})
+        client.post("/accounts/withdraw", json={"account_id": account_id, "amount": 5000})
+
+        summary = client.get(f"/accounts/{account_id}/analytics").json()
+
+        assert summary["rows"] == 2
+        assert summary["opening_balance"] == 1000 and summary["closing_balance"] == 1200
+        assert summary["declines"]["count"] == 1
+
+    def test_unknown_account(self):
+        assert client.get("/accounts/missing/analytics").json()["success"] is False
+
+class TestLedgerExport:
+
+    def test_account_export_ndjson(self, account_id):
+        import json
+        for amount in (1, 2):
+            client.post("/account/deposit", json={"account_id": account_id, "amount": amount})
+
+        response = client.get(f"/accounts/ledger/{account_id}/export")
+
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [row["amount"] for row in rows] == [1, 2]
+
+    def test_bank_export_csv(self, account_id):
+        import csv
+        client.post("/account/deposit", json={"account_id": account_id, "amount": 7})
+        other = client.post("/accounts", json={"name": "Other", "initial_deposit": 10}).json()["account_ID"]
+        client.post("/accounts/withdraw", json={"account_id": other, "amount": 5})
+
+        response = client.get("/admin/ledger/export", params={"format": "csv"})
+
+        rows = list(csv.DictReader(response.text.splitlines()))
+        assert sorted(row["account_ID"] for row in rows) == sorted([account_id, other])
+        assert response.headers["content-disposition"] == 'attachment; filename="ledger.csv"'
+
+    def test_unknown_format(self, account_id):
+        assert client.get(f"/accounts/ledger/{account_id}/export", params={"format": "xml"}).status_code == 422
+
+class TestAccountUsernames:
+
+    def test_account_created_with_username(self):
+        created = client.post("/accounts", json={"name": "Dana", "initial_deposit": 10, "username": "dana"}).json()
+
+        lookup = client.post("/user/lookup", json={"username": "dana"}).json()
+        assert lookup["account_ID"] == created["account_ID"]
+        taken = client.post("/accounts", json={"name": "Other", "initial_deposit": 10, "username": "dana"})
+        assert taken.status_code == 409
+
+class TestBatchEndpoint:
+
+    def test_batch(self, account_id):
+        response = client.post("/transactions/batch", json={
+            "mode": "best_effort",
+            "operations": [
+                {"op": "deposit", "account_id": account_id, "amount": 100},
+                {"op": "withdraw", "account_id": account_id, "amount": 5000},
+            ]
+        }).json()
+
+        assert response["committed"] is True
+        assert response["succeeded"] == 1
+        assert [result["status"] for result in response["results"]] == ["SUCCESS", "DECLINED"]
+        assert client.get(f"/accounts/{account_id}").json()["balance"] == 1100
+
+class TestPolicyRequestEndpoints:
+
+    def test_admin_list_is_paginated(self, account_id):
+        for reason in ["one", "two", "three"]:
+            client.post("/policy-requests", json={"user_id": account_id, "justification": reason})
+
+        first = client.get("/admin/policy-requests", params={"limit": 2, "status": "pending", "with_total": True}).json()
+        second = client.get("/admin/policy-requests", params={"limit": 2, "cursor": first["next_cursor"]}).json()
+
+        assert first["total"] == 3
+        assert len(first["items"]) == 2 and len(second["items"]) == 1
+        assert second["next_cursor"] is None
+        assert len(client.get("/policy-requests", params={"user_id": account_id, "all": True}).json()) == 3
+
+    def test_approving_request_changes_limits(self, account_id):
+        created = client.post("/policy-requests", json={
+            "user_id": account_id, "max_deposit": 5000, "justification": "payroll"
+        }).json()
+        declined = client.post("/account/deposit", json={"account_id": account_id, "amount": 3000}).json()
+        assert declined["transaction"]["status"] == "DECLINED"
+
+        response = client.put(f"/admin/policy-requests/{created['request_id']}", json={"status": "approved"}).json()
+
+        assert response["status"] == "approved"
+        accepted = client.post("/account/deposit", json={"account_id": account_id, "amount": 3000}).json()
+        assert accepted["transaction"]["status"] == "SUCCESS"
+
+    def test_unknown_request(self):
+        response = client.put("/admin/policy-requests/missing", json={"status": "approved"}).json()
+        assert response["success"] is False
+
+    def test_request_for_unknown_account(self):
+        response = client.post("/policy-requests", json={"user_id": "current-user-id", "justification": "payroll"})
+        assert response.status_code == 404
+        assert response.json()["error"] == "Account not found"
+
+    def test_approving_request_for_deleted_account(self, account_id):
+        created = client.post("/policy-requests", json={"user_id": account_id, "justification": "payroll"}).json()
+        client.delete(f"/accounts/{account_id}")
+
+        response = client.put(f"/admin/policy-requests/{created['request_id']}", json={"status": "approved"})
+
+        assert response.status_code == 409
+        assert response.json()["error"] == "Account not found"
+
+class TestAdminStats:
+
+    def test_stats_follow_transactions(self, account_id):
+        client.post("/account/deposit", json={"account_id": account_id, "amount": 200})
+
+        stats = client.get("/admin/stats").json()
+
+        assert stats["accounts"] == 1
+        assert stats["total_balance"] == 1200
+        assert stats["by_type"]["DEPOSIT"]["volume"] == 200
+
+@pytest.fixture
+def file_database(tmp_path, monkeypatch):
+    # concurrent requests need real connections; the shared in-memory one is not safe across threads
+    engine = db.create_engine_from_env(f"sqlite:///{tmp_path / 'load.sqlite'}")
+    db.meta.create_all(engine)
+    monkeypatch.setattr(db, "engine", engine)
+    yield engine
+    engine.dispose()
+    db.clear_caches()
+
+class TestLoadGenerator:
+
+    def test_concurrent_load_conserves_money(self, file_database):
+        import asyncio
+        import httpx
+        from benchmarks import loadgen
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as load_client:
+                return await loadgen.run_load(load_client, loadgen.LoadConfig(users=8, requests=300, accounts=10, seed=1))
+
+        report = asyncio.run(run())
+
+        assert report["ok"]
+        assert report["requests"] == 300
+        assert report["errors"] == 0
+        assert report["endpoints"]["POST /accounts/transfer"]["latency_ms"]["p99"] > 0
+
+    def test_population_is_seeded_through_the_api(self, file_database):
+        import asyncio
+        import httpx
+        from benchmarks import loadgen
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as load_client:
+                # seed 24 used to draw an opening balance of 0, which POST /accounts rejects
+                return await loadgen.seed_population(load_client, loadgen.LoadConfig(accounts=200, seed=24))
+
+        # a running server has usually built its search index already
+        client.post("/user/search", json={"search_term": "load"})
+        population = asyncio.run(run())
+
+        assert min(account["opening"] for account in population) >= 1
+        username = population[0]["username"]
+        assert client.post("/user/search", json={"search_term": username}).json()["matches"] == [username]
+
+    def test_histogram_percentiles(self):
+        from benchmarks.loadgen import LatencyHistogram
+
+        histogram = LatencyHistogram()
+        for ms in range(1, 1001):
+            histogram.record(ms / 1000)
+
+        # buckets are ~9% wide and report their upper bound
+        assert 0.5 <= histogram.percentile(50) <= 0.5 * 1.1
+        assert 0.99 <= histogram.percentile(99) <= 0.99 * 1.1
+        assert histogram.percentile(100) == 1.0
+
+class TestMetricsEndpoint:
+
+    def test_requests_queries_and_caches_are_exported(self, account_id):
+        import metrics
+        metrics.reset()
+        client.post("/account/deposit", json={"account_id": account_id, "amount": 100})
+
+        text = client.get("/metrics").text
+
+        assert 'http_request_duration_seconds_count{method="POST",route="/account/deposit",status="200"} 1' in text
+        assert 'db_query_duration_seconds_count{helper="apply_transaction"}' in text
+        assert "db_pool_checkout_duration_seconds_count" in text
+        assert 'cache_hit_ratio{cache="accounts"}' in text
+
+    def test_responses_carry_query_count(self, account_id):
+        response = client.post("/account/deposit", json={"account_id": account_id, "amount": 100})
+
+        assert int(response.headers["x-db-queries"]) > 0
+        assert float(response.headers["x-db-time-ms"]) > 0
+
+    def test_slow_queries_are_logged(self, account_id, monkeypatch, caplog):
+        import metrics
+        monkeypatch.setattr(metrics, "slow_query_seconds", 0)
+
+        with caplog.at_level("WARNING", logger="slow_queries"):
+            client.post("/account/deposit", json={"account_id": account_id, "amount": 100})
+
+        assert any("in db.apply_transaction" in message and "UPDATE accounts" in message for message in caplog.messages)
+
+class TestQueryBudgets:
+    # statements per request with cold caches on a fresh database, where the counter rows
+    # (daily withdrawals, ledger stats, bank totals) are inserted too; raise a budget only on purpose
+
+    @pytest.fixture
+    def usernames(self, account_id):
+        other_id = client.post("/accounts", json={"name": "Other User", "initial_deposit": 1000}).json()["account_ID"]
+        db.insert_user_account("alice", account_id)
+        db.insert_user_account("bob", other_id)
+        db.clear_caches()
+        return "alice", "bob"
+
+    def test_deposit(self, account_id):
+        db.clear_caches()
+        with query_budget(9):
+            client.post("/account/deposit", json={"account_id": account_id, "amount": 100})
+
+    def test_withdraw(self, account_id):
+        db.clear_caches()
+        with query_budget(10):
+            client.post("/accounts/withdraw", json={"account_id": account_id, "amount": 100})
+
+    def test_transfer(self, usernames):
+        with query_budget(12):
+            client.post("/accounts/transfer", json={"from_username": "alice", "target_username": "bob", "amount": 100})
+
+    def test_reads(self, account_id):
+        with query_budget(1):
+            client.get(f"/accounts/ledger/{account_id}")
+        with query_budget(2):
+            client.get("/accounts")
+
+class TestGroupCommit:
+
+    @pytest.fixture
+    def group_commit(self, monkeypatch):
+        import account_locks
+        import group_commit
+        import main
+        # as main wires GROUP_COMMIT=1
+        monkeypatch.setattr(main, "writes", group_commit)
+        monkeypatch.setattr(main, "account_lock", account_locks.hold_nothing)
+        return group_commit
+
+    def test_endpoints_answer_as_without_group_commit(self, group_commit, account_id):
+        other_id = client.post("/accounts", json={"name": "Other User", "initial_deposit": 1}).json()["account_ID"]
+        db.insert_user_account("alice", account_id)
+        db.insert_user_account("bob", other_id)
+
+        deposit = client.post("/account/deposit", json={"account_id": account_id, "amount": 100}).json()
+        transfer = client.post("/accounts/transfer", json={"from_username": "alice", "target_username": "bob", "amount": 300}).json()
+        missing = client.post("/accounts/withdraw", json={"account_id": "missing", "amount": 1}).json()
+
+        assert deposit["transaction"]["status"] == "SUCCESS"
+        assert deposit["account"] == {"account_ID": account_id, "name": "Test User", "balance": 1100}
+        assert transfer["from_account"]["balance"] == 800
+        assert transfer["to_account"]["balance"] == 301
+        assert missing["success"] is False
+
+    def test_concurrent_deposits_share_commits(self, group_commit, file_database):
+        import asyncio
+        import httpx
+
+        account_id = client.post("/accounts", json={"name": "Busy", "initial_deposit": 1}).json()["account_ID"]
+        group_commit.writer.groups = group_commit.writer.operations = 0
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as load_client:
+                return await asyncio.gather(*[
+                    load_client.post("/account/deposit", json={"account_id": account_id, "amount": 1}) for _ in range(50)
+                ])
+
+        responses = asyncio.run(run())
+
+        assert all(response.json()["transaction"]["status"] == "SUCCESS" for response in responses)
+        assert client.get(f"/accounts/{account_id}").json()["balance"] == 51
+        assert group_commit.writer.groups < 50
+
+class TestAccountLocks:
+
+    def test_concurrent_writes_lose_no_updates(self, file_database):
+        import asyncio
+        import random
+        import httpx
+
+        usernames = ["hot_a", "hot_b", "hot_c"]
+        account_ids = {}
+        for username in usernames:
+            account_ids[username] = client.post("/accounts", json={"name": username, "initial_deposit": 1000}).json()["account_ID"]
+            db.insert_user_account(username, account_ids[username])
+        rng = random.Random(7)
+
+        def request():
+            username = rng.choice(usernames)
+            kind = rng.choice(["deposit", "withdraw", "transfer"])
+            if kind == "transfer":
+                target = rng.choice([name for name in usernames if name != username])
+                return "/accounts/transfer", {"from_username": username, "target_username": target, "amount": rng.randint(1, 300)}
+            url = "/account/deposit" if kind == "deposit" else "/accounts/withdraw"
+            return url, {"account_id": account_ids[username], "amount": rng.randint(1, 300)}
+
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as load_client:
+                return await asyncio.gather(*[load_client.post(url, json=body) for url, body in (request() for _ in range(300))])
+
+        responses = asyncio.run(run())
+        assert all(response.status_code == 200 and "transaction" in response.json() for response in responses)
+
+        for account_ID in account_ids.values():
+            rows = sorted(client.get(f"/accounts/ledger/{account_ID}", params={"all": "true"}).json(), key=lambda row: row["timestamp"])
+            # every balance change starts from the balance the previous one left
+            balance = 1000
+            for row in rows:
+                if row["status"] == "SUCCESS":
+                    moves = {"DEPOSIT": [row["amount"]], "WITHDRAWAL": [-row["amount"]], "PAY": [row["amount"], -row["amount"]]}[row["tx_type"]]
+                    assert row["current_balance"] - balance in moves
+                else:
+                    assert row["current_balance"] == balance
+                balance = row["current_balance"]
+            assert client.get(f"/accounts/{account_ID}").json()["balance"] == balance
+
+        total = sum(client.get(f"/accounts/{account_ID}").json()["balance"] for account_ID in account_ids.values())
+        net = sum(
+            row["amount"] if row["tx_type"] == "DEPOSIT" else -row["amount"]
+            for account_ID in account_ids.values()
+            for row in client.get(f"/accounts/ledger/{account_ID}", params={"all": "true"}).json()
+            if row["status"] == "SUCCESS" and row["tx_type"] in ("DEPOSIT", "WITHDRAWAL")
+        )
+        assert total == 3000 + net
+
+    def test_batch_holds_every_account_it_touches(self, account_id, monkeypatch):
+        from contextlib import asynccontextmanager
+        import main
+        payee = client.post("/accounts", json={"name": "Payee", "initial_deposit": 10, "username": "batch_payee"}).json()["account_ID"]
+        held = []
+
+        @asynccontextmanager
+        async def recording_lock(*keys):
+            held.append(set(keys))
+            yield
+        monkeypatch.setattr(main, "account_lock", recording_lock)
+
+        response = client.post("/transactions/batch", json={"operations": [
+            {"op": "deposit", "account_id": account_id, "amount": 5},
+            {"op": "transfer", "account_id": account_id, "target_username": "batch_payee", "amount": 5},
+        ]}).json()
+
+        assert response["committed"] is True
+        assert held == [{account_id, payee}]
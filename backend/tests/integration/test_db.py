@@ -1,7 +1,8 @@
 import pytest
 import sys
 import os
-import uuid 
+import uuid
+from datetime import datetime
 
 # set test database via env variables
 os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
@@ -9,7 +10,7 @@ os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
 # Add backend directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 
-from models import Account
+from models import Account, Policy, PolicyRequest, PolicyRequestStatus, TransactionType, StatusType
 import db
 
 # create tables
@@ -24,6 +25,7 @@ def sample_account():
 def reset_database():
     db.meta.drop_all(db.engine)
     db.meta.create_all(db.engine)
+    db.clear_caches()
 
 class TestAccountDatabaseOperations:
 
@@ -80,3 +82,803 @@ class TestAccountDatabaseOperations:
         assert response is None    
 
 
+
+class TestBalanceUpdates:
+
+    def test_deposit_updates_balance_and_ledger(self, sample_account):
+        db.insert_account(sample_account)
+        account_id = str(sample_account.account_ID)
+
+        account, tx = db.apply_transaction(account_id, TransactionType.DEPOSIT, 100, Policy())
+
+        assert tx.status == StatusType.SUCCESS
+        assert account['balance'] == 1100
+        assert db.get_account(account_id)['balance'] == 1100
+        ledger_rows = db.get_ledger(account_id)
+        assert len(ledger_rows) == 1
+        assert ledger_rows[0]['current_balance'] == 1100
+        assert ledger_rows[0]['tx_ID'] == str(tx.tx_ID)
+
+    def test_withdrawal_within_overdraft(self, sample_account):
+        db.insert_account(sample_account)
+        account_id = str(sample_account.account_ID)
+
+        account, tx = db.apply_transaction(account_id, TransactionType.WITHDRAWAL, 1000, Policy(overdraftLimit=50))
+        account, tx = db.apply_transaction(account_id, TransactionType.WITHDRAWAL, 50, Policy(overdraftLimit=50))
+
+        assert tx.status == StatusType.SUCCESS
+        assert account['balance'] == -50
+
+    def test_withdrawal_past_overdraft_is_declined(self, sample_account):
+        db.insert_account(sample_account)
+        account_id = str(sample_account.account_ID)
+
+        account, tx = db.apply_transaction(account_id, TransactionType.WITHDRAWAL, 1000, Policy(maxWithdrawal=2000, overdraftLimit=50))
+        account, tx = db.apply_transaction(account_id, TransactionType.WITHDRAWAL, 51, Policy(maxWithdrawal=2000, overdraftLimit=50))
+
+        assert tx.status == StatusType.DECLINED
+        assert account['balance'] == 0
+        assert [row['status'] for row in db.get_ledger(account_id)] == ["SUCCESS", "DECLINED"]
+
+    def test_declined_deposit_leaves_balance(self, sample_account):
+        db.insert_account(sample_account)
+        account_id = str(sample_account.account_ID)
+
+        account, tx = db.apply_transaction(account_id, TransactionType.DEPOSIT, 5000, Policy(maxDeposit=1000))
+
+        assert tx.status == StatusType.DECLINED
+        assert db.get_account(account_id)['balance'] == 1000
+
+    def test_missing_account(self):
+        assert db.apply_transaction(str(uuid.uuid4()), TransactionType.DEPOSIT, 100, Policy()) is None
+
+    def test_ledger_order_matches_commit_order(self, tmp_path, monkeypatch, sample_account):
+        import threading
+        engine = db.create_engine_from_env(f"sqlite:///{tmp_path / 'order.sqlite'}")
+        db.meta.create_all(engine)
+        monkeypatch.setattr(db, "engine", engine)
+        db.insert_account(sample_account)
+        account_id = str(sample_account.account_ID)
+        begin_write = db.begin_write
+        def commit_another_deposit_first(conn):
+            # a second deposit commits while the first waits for the write lock
+            monkeypatch.setattr(db, "begin_write", begin_write)
+            thread = threading.Thread(
+                target=db.apply_transaction, args=(account_id, TransactionType.DEPOSIT, 100, Policy())
+            )
+            thread.start()
+            thread.join()
+            begin_write(conn)
+        monkeypatch.setattr(db, "begin_write", commit_another_deposit_first)
+
+        db.apply_transaction(account_id, TransactionType.DEPOSIT, 100, Policy())
+
+        rows = db.get_ledger_page(account_id)["items"]
+        assert [row["current_balance"] for row in rows] == [1200, 1100]
+        engine.dispose()
+
+class TestTransfers:
+
+    # payer sorts before and after payee, so both update orders are exercised
+    @pytest.fixture(params=[("account-a", "account-b"), ("account-b", "account-a")])
+    def two_users(self, request):
+        payer = Account("Payer", 1000, request.param[0])
+        payee = Account("Payee", 500, request.param[1])
+        db.insert_account(payer)
+        db.insert_account(payee)
+        db.insert_user_account("payer", str(payer.account_ID))
+        db.insert_user_account("payee", str(payee.account_ID))
+        return str(payer.account_ID), str(payee.account_ID)
+
+    def test_transfer_moves_balance(self, two_users):
+        payer_id, payee_id = two_users
+
+        result = db.transfer("payer", "payee", 300, Policy(), Policy())
+
+        assert result["payer_tx"].status == StatusType.SUCCESS
+        assert result["from_account"]["balance"] == 700
+        assert result["to_account"]["balance"] == 800
+        assert db.get_account(payer_id)["balance"] == 700
+        assert db.get_account(payee_id)["balance"] == 800
+        payer_rows = db.get_ledger(payer_id)
+        assert len(payer_rows) == 1
+        assert payer_rows[0]["counterparty"] == payee_id
+        assert db.get_ledger(payee_id)[0]["current_balance"] == 800
+
+    def test_transfer_without_funds_is_declined(self, two_users):
+        payer_id, payee_id = two_users
+
+        result = db.transfer("payer", "payee", 1000, Policy(maxWithdrawal=5000, overdraftLimit=0), Policy(maxDeposit=5000))
+        assert result["payer_tx"].status == StatusType.SUCCESS
+        result = db.transfer("payer", "payee", 1, Policy(maxWithdrawal=5000, overdraftLimit=0), Policy(maxDeposit=5000))
+
+        assert result["payer_tx"].status == StatusType.DECLINED
+        assert result["payee_tx"].status == StatusType.DECLINED
+        assert db.get_account(payer_id)["balance"] == 0
+        assert db.get_account(payee_id)["balance"] == 1500
+        assert len(db.get_ledger(payee_id)) == 2
+
+    def test_transfer_declined_by_payee_policy(self, two_users):
+        payer_id, payee_id = two_users
+
+        result = db.transfer("payer", "payee", 500, Policy(), Policy(maxDeposit=100))
+
+        assert result["payer_tx"].status == StatusType.DECLINED
+        assert db.get_account(payer_id)["balance"] == 1000
+        assert db.get_account(payee_id)["balance"] == 500
+
+    def test_transfer_unknown_username(self, two_users):
+        result = db.transfer("payer", "nobody", 10, Policy(), Policy())
+        assert result == {"error": "Target username not found", "username": "nobody"}
+
+class TestEngineFactory:
+
+    def pragma(self, engine, name):
+        with engine.connect() as conn:
+            return conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+    def test_sqlite_file_pragmas(self, tmp_path, monkeypatch):
+        monkeypatch.setenv('SQLITE_BUSY_TIMEOUT_MS', '1234')
+        engine = db.create_engine_from_env(f"sqlite:///{tmp_path / 'test.sqlite'}")
+
+        assert self.pragma(engine, "journal_mode") == "wal"
+        assert self.pragma(engine, "synchronous") == 1  # NORMAL
+        assert self.pragma(engine, "busy_timeout") == 1234
+        assert self.pragma(engine, "cache_size") == -20000
+        assert engine.echo is False
+        engine.dispose()
+
+    def test_echo_from_env(self, monkeypatch):
+        monkeypatch.setenv('DB_ECHO', 'debug')
+        assert db.create_engine_from_env("sqlite:///:memory:").echo == "debug"
+
+    def test_memory_database_is_shared_across_threads(self):
+        import threading
+        engine = db.create_engine_from_env("sqlite:///:memory:")
+        db.meta.create_all(engine)
+        with engine.begin() as conn:
+            conn.execute(db.accounts.insert().values(account_ID="a", name="A", balance=1))
+
+        rows = []
+        def read_accounts():
+            with engine.connect() as conn:
+                rows.extend(conn.execute(db.accounts.select()).all())
+        thread = threading.Thread(target=read_accounts)
+        thread.start()
+        thread.join()
+
+        assert len(rows) == 1
+
+class TestSchemaUpgrade:
+
+    def test_upgrade_adds_ledger_key_and_indexes(self, tmp_path):
+        from sqlalchemy import inspect, text
+        engine = db.create_engine_from_env(f"sqlite:///{tmp_path / 'old.sqlite'}")
+        with engine.begin() as conn:
+            # ledger as created before tx_ID became the primary key
+            conn.execute(text(
+                'CREATE TABLE ledger (amount INTEGER, current_balance INTEGER, tx_type INTEGER, "account_ID" VARCHAR, '
+                'timestamp DATETIME, "tx_ID" VARCHAR, status VARCHAR, counterparty VARCHAR)'
+            ))
+            conn.execute(text(
+                "INSERT INTO ledger VALUES (100, 1100, 'DEPOSIT', 'acct', '2024-01-01 00:00:00', 'tx-1', 'SUCCESS', NULL)"
+            ))
+
+        db.upgrade_schema(engine)
+        db.upgrade_schema(engine)
+
+        inspector = inspect(engine)
+        assert inspector.get_pk_constraint('ledger')['constrained_columns'] == ['tx_ID']
+        assert {index['name'] for index in inspector.get_indexes('ledger')} == {
+            'ix_ledger_account_timestamp', 'ix_ledger_counterparty'
+        }
+        with engine.connect() as conn:
+            rows = conn.execute(db.ledger.select()).mappings().all()
+        assert [(row['tx_ID'], row['amount']) for row in rows] == [('tx-1', 100)]
+        engine.dispose()
+
+    def test_upgrade_backfills_summary_tables(self, tmp_path, monkeypatch):
+        engine = db.create_engine_from_env(f"sqlite:///{tmp_path / 'old.sqlite'}")
+        db.meta.create_all(engine)
+        monkeypatch.setattr(db, "engine", engine)
+        account = Account("Old", 1000)
+        db.insert_account(account)
+        db.apply_transaction(str(account.account_ID), TransactionType.DEPOSIT, 100, Policy())
+        # as on a database from before the summary tables existed
+        with engine.begin() as conn:
+            db.ledger_daily_stats.drop(conn)
+            db.bank_totals.drop(conn)
+
+        db.upgrade_schema(engine)
+        db.upgrade_schema(engine)
+
+        stats = db.get_bank_stats()
+        assert (stats["accounts"], stats["total_balance"], stats["transactions"]) == (1, 1100, 1)
+        assert stats["by_type"]["DEPOSIT"]["volume"] == 100
+        engine.dispose()
+
+class TestLedgerPagination:
+
+    @pytest.fixture
+    def account_with_history(self, sample_account):
+        db.insert_account(sample_account)
+        account_id = str(sample_account.account_ID)
+        for amount in range(1, 8):
+            db.apply_transaction(account_id, TransactionType.DEPOSIT, amount, Policy())
+        db.apply_transaction(account_id, TransactionType.WITHDRAWAL, 5000, Policy())
+        return account_id
+
+    def test_pages_cover_history_newest_first(self, account_with_history):
+        seen = []
+        page = db.get_ledger_page(account_with_history, limit=3)
+        while True:
+            seen.extend(row['tx_ID'] for row in page['items'])
+            if not page['next_cursor']:
+                break
+            page = db.get_ledger_page(account_with_history, limit=3, before=page['next_cursor'])
+
+        full = sorted(db.get_ledger(account_with_history), key=lambda row: (row['timestamp'], row['tx_ID']), reverse=True)
+        assert seen == [row['tx_ID'] for row in full]
+
+    def test_after_cursor_returns_newer_page(self, account_with_history):
+        first = db.get_ledger_page(account_with_history, limit=3)
+        second = db.get_ledger_page(account_with_history, limit=3, before=first['next_cursor'])
+
+        back = db.get_ledger_page(account_with_history, limit=3, after=second['prev_cursor'])
+
+        assert [row['tx_ID'] for row in back['items']] == [row['tx_ID'] for row in first['items']]
+        assert back['prev_cursor'] is None
+
+    def test_filters(self, account_with_history):
+        page = db.get_ledger_page(account_with_history, status="DECLINED")
+        assert [row['tx_type'] for row in page['items']] == ["WITHDRAWAL"]
+        assert page['next_cursor'] is None
+
+        page = db.get_ledger_page(account_with_history, tx_type="DEPOSIT", from_date=datetime(2000, 1, 1), to_date=datetime(2000, 1, 2))
+        assert page['items'] == []
+
+    def test_invalid_cursor(self, account_with_history):
+        with pytest.raises(ValueError):
+            db.get_ledger_page(account_with_history, before="not-a-cursor")
+
+class TestListPagination:
+
+    def test_accounts_pages_by_balance(self):
+        for balance in [300, 100, 500, 100, 200]:
+            db.insert_account(Account("User", balance))
+
+        seen = []
+        page = db.get_accounts_page(limit=2, sort="balance", descending=True, with_total=True)
+        assert page['total'] == 5
+        while True:
+            seen.extend(row['balance'] for row in page['items'])
+            if not page['next_cursor']:
+                break
+            page = db.get_accounts_page(limit=2, cursor=page['next_cursor'], sort="balance", descending=True)
+
+        assert seen == [500, 300, 200, 100, 100]
+
+    def test_accounts_balance_range(self):
+        for balance in [50, 150, 250]:
+            db.insert_account(Account("User", balance))
+
+        page = db.get_accounts_page(min_balance=100, max_balance=200, with_total=True)
+
+        assert [row['balance'] for row in page['items']] == [150]
+        assert page['total'] == 1
+        assert page['estimated_total'] == 3
+
+    def test_policy_requests_filtered_newest_first(self):
+        for account_id in ("a", "b"):
+            db.insert_account(Account(account_id.upper(), 100, account_id))
+        for day, (user_id, status) in enumerate([("a", "PENDING"), ("b", "PENDING"), ("a", "approved"), ("a", "PENDING")], start=1):
+            created = datetime(2024, 1, day)
+            db.insert_policy_request(PolicyRequest(user_id, {"justification": str(day)}, status=PolicyRequestStatus.PENDING,
+                                                   created_at=created, updated_at=created))
+            if status != "PENDING":
+                db.update_policy_request_status(db.get_policy_requests_page(limit=1)['items'][0]['request_id'], status)
+
+        first = db.get_policy_requests_page(limit=1, user_id="a", status="pending")
+        second = db.get_policy_requests_page(limit=1, user_id="a", status="pending", cursor=first['next_cursor'])
+
+        assert first['items'][0]['created_at'] == datetime(2024, 1, 4)
+        assert second['items'][0]['created_at'] == datetime(2024, 1, 1)
+        assert second['next_cursor'] is None
+        approved = db.get_policy_requests_page(status="APPROVED", created_from=datetime(2024, 1, 2), created_to=datetime(2024, 1, 4))
+        assert [row['policy_request']['justification'] for row in approved['items']] == ["3"]
+
+    def test_invalid_cursor(self):
+        with pytest.raises(ValueError):
+            db.get_policy_requests_page(cursor="not-a-cursor")
+
+class TestBankStats:
+
+    def test_incremental_totals_match_rebuild(self):
+        first = Account("First", 1000)
+        second = Account("Second", 500)
+        for account in (first, second):
+            db.insert_account(account)
+            db.insert_user_account(account.name.lower(), str(account.account_ID))
+        first_id, second_id = str(first.account_ID), str(second.account_ID)
+        db.apply_transaction(first_id, TransactionType.DEPOSIT, 200, Policy())
+        db.apply_transaction(first_id, TransactionType.WITHDRAWAL, 5000, Policy())
+        db.transfer("first", "second", 300)
+        db.apply_batch([{"op": "withdraw", "account_id": second_id, "amount": 100}])
+        db.update_account(second_id, db.UpdateType.BALANCE.value, 50)
+        db.delete_account(first_id)
+
+        incremental = db.get_bank_stats()
+        db.rebuild_stats()
+
+        assert incremental == db.get_bank_stats()
+        assert incremental["accounts"] == 1
+        assert incremental["total_balance"] == 50
+        assert incremental["transactions"] == 5
+        assert incremental["decline_rate"] == 0.2
+        assert incremental["by_type"]["WITHDRAWAL"] == {"count": 2, "volume": 100, "declined": 1, "decline_rate": 0.5}
+
+    def test_empty_bank(self):
+        stats = db.get_bank_stats()
+        assert stats["transactions"] == 0 and stats["decline_rate"] == 0 and stats["daily"] == []
+
+class TestBatchOperations:
+
+    @pytest.fixture
+    def accounts(self):
+        first = Account("First", 1000)
+        second = Account("Second", 100)
+        db.insert_account(first)
+        db.insert_account(second)
+        return str(first.account_ID), str(second.account_ID)
+
+    def test_operations_apply_in_order(self, accounts):
+        first, second = accounts
+        operations = [
+            {"op": "deposit", "account_id": second, "amount": 200},
+            {"op": "withdraw", "account_id": second, "amount": 300},
+            {"op": "transfer", "account_id": first, "amount": 500, "target_account_id": second},
+        ]
+
+        committed, results = db.apply_batch(operations, Policy())
+
+        assert committed
+        assert [result["status"] for result in results] == ["SUCCESS", "SUCCESS", "SUCCESS"]
+        assert [result["balance"] for result in results] == [300, 0, 500]
+        assert db.get_account(first)["balance"] == 500
+        assert db.get_account(second)["balance"] == 500
+        assert len(db.get_ledger(second)) == 3
+
+    def test_atomic_batch_writes_nothing_on_failure(self, accounts):
+        first, second = accounts
+        operations = [
+            {"op": "deposit", "account_id": first, "amount": 10},
+            {"op": "withdraw", "account_id": second, "amount": 500},
+        ]
+
+        committed, results = db.apply_batch(operations, Policy())
+
+        assert not committed
+        assert results[1]["status"] == "DECLINED"
+        assert db.get_account(first)["balance"] == 1000
+        assert db.get_ledger(first) == []
+
+    def test_best_effort_batch_skips_errors(self, accounts):
+        first, second = accounts
+        operations = [
+            {"op": "deposit", "account_id": "missing", "amount": 10},
+            {"op": "withdraw", "account_id": second, "amount": 500},
+            {"op": "deposit", "account_id": first, "amount": 10},
+        ]
+
+        committed, results = db.apply_batch(operations, Policy(), atomic=False)
+
+        assert committed
+        assert [result["status"] for result in results] == ["ERROR", "DECLINED", "SUCCESS"]
+        assert db.get_account(first)["balance"] == 1010
+        assert db.get_account(second)["balance"] == 100
+        assert len(db.get_ledger(second)) == 1
+
+    @pytest.mark.parametrize("counter_exists", [False, True])
+    def test_concurrent_write_waits_for_batch(self, tmp_path, monkeypatch, counter_exists):
+        import threading
+        import metrics
+        engine = db.create_engine_from_env(f"sqlite:///{tmp_path / 'race.sqlite'}")
+        db.meta.create_all(engine)
+        monkeypatch.setattr(db, "engine", engine)
+        account = Account("Racer", 100 if counter_exists else 99)
+        db.insert_account(account)
+        account_id = str(account.account_ID)
+        policy = Policy(maxWithdrawal=500, overdraftLimit=50)
+        if counter_exists:
+            # otherwise both writers find no counter row for today and insert one
+            db.apply_transaction(account_id, TransactionType.WITHDRAWAL, 1, policy)
+
+        single = []
+        thread = threading.Thread(target=lambda: single.append(
+            db.apply_transaction(account_id, TransactionType.WITHDRAWAL, 99, policy)
+        ))
+        def start_single_withdrawal(statement, parameters, elapsed):
+            # a single withdrawal arrives after the batch has read the balance
+            if "FROM daily_withdrawals" in statement and thread.ident is None:
+                thread.start()
+                thread.join(0.3)
+        metrics.query_listeners.append(start_single_withdrawal)
+        try:
+            committed, results = db.apply_batch(
+                [{"op": "withdraw", "account_id": account_id, "amount": 140}],
+                policy, atomic=False
+            )
+        finally:
+            metrics.query_listeners.remove(start_single_withdrawal)
+        thread.join()
+        db.clear_caches()
+
+        assert results[0]["status"] == "SUCCESS"
+        assert single[0][1].status == StatusType.DECLINED
+        assert db.get_account(account_id)["balance"] >= -50
+        engine.dispose()
+
+class TestApplyGroup:
+
+    @pytest.fixture
+    def users(self):
+        first = Account("First", 1000)
+        second = Account("Second", 100)
+        db.insert_account(first)
+        db.insert_account(second)
+        db.insert_user_account("first", str(first.account_ID))
+        db.insert_user_account("second", str(second.account_ID))
+        return str(first.account_ID), str(second.account_ID)
+
+    def test_results_match_single_operations(self, users):
+        first, second = users
+        results = db.apply_group([
+            ("deposit", second, 200),
+            ("transfer", "first", "second", 500),
+            ("withdraw", second, 800),
+        ])
+
+        account, tx = results[0]
+        assert (account["name"], account["balance"], tx.status) == ("Second", 300, StatusType.SUCCESS)
+        assert results[1]["from_account"]["balance"] == 500
+        assert results[1]["to_account"]["balance"] == 800
+        assert results[1]["payer_tx"].tx_type == TransactionType.PAY
+        assert results[2][0]["balance"] == 0
+        assert db.get_account(second)["balance"] == 0
+        assert len(db.get_ledger(second)) == 3
+
+    def test_errors_match_single_operations(self, users):
+        first, _ = users
+        results = db.apply_group([
+            ("deposit", "missing", 10),
+            ("transfer", "nobody", "second", 10),
+            ("transfer", "first", "nobody", 10),
+            ("transfer", "first", "first", 10),
+            ("deposit", first, -5),
+        ])
+
+        assert results[0] is None
+        assert [result["error"] for result in results[1:4]] == [
+            "Source username not found", "Target username not found", "Cannot transfer to the same account"
+        ]
+        assert results[4][1].status == StatusType.DECLINED
+        assert db.get_account(first)["balance"] == 1000
+
+class TestDailyWithdrawalLimit:
+
+    @pytest.fixture
+    def policy(self):
+        return Policy(maxWithdrawal=500, dailyWithdrawalLimit=800, overdraftLimit=1000)
+
+    def test_withdrawals_stop_at_daily_limit(self, sample_account, policy):
+        db.insert_account(sample_account)
+        account_id = str(sample_account.account_ID)
+
+        statuses = [db.apply_transaction(account_id, TransactionType.WITHDRAWAL, amount, policy)[1].status
+                    for amount in (500, 301, 300)]
+
+        assert statuses == [StatusType.SUCCESS, StatusType.DECLINED, StatusType.SUCCESS]
+        assert db.get_account(account_id)['balance'] == 200
+        assert db.get_daily_withdrawal_total(account_id, datetime.utcnow().date()) == 800
+
+    def test_limit_enforced_without_cache(self, sample_account, policy, monkeypatch):
+        monkeypatch.setattr(db, "withdrawal_cache_enabled", False)
+        db.insert_account(sample_account)
+        account_id = str(sample_account.account_ID)
+
+        db.apply_transaction(account_id, TransactionType.WITHDRAWAL, 500, policy)
+        account, tx = db.apply_transaction(account_id, TransactionType.WITHDRAWAL, 400, policy)
+
+        assert len(db.withdrawal_cache) == 0
+        assert tx.status == StatusType.DECLINED
+        assert account['balance'] == 500
+
+    def test_transfers_and_batches_count_toward_limit(self, policy):
+        payer = Account("Payer", 1000)
+        payee = Account("Payee", 1000)
+        for account in (payer, payee):
+            db.insert_account(account)
+        db.insert_user_account("payer", str(payer.account_ID))
+        db.insert_user_account("payee", str(payee.account_ID))
+        payer_id = str(payer.account_ID)
+
+        assert db.transfer("payer", "payee", 500, policy, policy)["payer_tx"].status == StatusType.SUCCESS
+        committed, results = db.apply_batch([
+            {"op": "withdraw", "account_id": payer_id, "amount": 200},
+            {"op": "withdraw", "account_id": payer_id, "amount": 200},
+        ], policy, atomic=False)
+
+        assert [result["status"] for result in results] == ["SUCCESS", "DECLINED"]
+        assert db.get_daily_withdrawal_total(payer_id, datetime.utcnow().date()) == 700
+        assert db.transfer("payer", "payee", 101, policy, policy)["payer_tx"].status == StatusType.DECLINED
+
+    def test_non_positive_withdrawals_are_declined(self, sample_account, policy):
+        payee = Account("Payee", 10)
+        for account in (sample_account, payee):
+            db.insert_account(account)
+        db.insert_user_account("payer", str(sample_account.account_ID))
+        db.insert_user_account("payee", str(payee.account_ID))
+        account_id = str(sample_account.account_ID)
+
+        statuses = [db.apply_transaction(account_id, TransactionType.WITHDRAWAL, amount, policy)[1].status
+                    for amount in (-5000, 0)]
+        committed, results = db.apply_batch([{"op": "withdraw", "account_id": account_id, "amount": -5000}], policy)
+        transfer = db.transfer("payer", "payee", -5, policy, policy)
+
+        assert statuses == [StatusType.DECLINED, StatusType.DECLINED]
+        assert results[0]["status"] == "DECLINED"
+        assert transfer["payer_tx"].status == StatusType.DECLINED
+        assert db.get_account(str(payee.account_ID))['balance'] == 10
+        assert db.get_account(account_id)['balance'] == 1000
+        assert db.get_daily_withdrawal_total(account_id, datetime.utcnow().date()) == 0
+
+    def test_cache_holds_one_bounded_day(self, monkeypatch):
+        from datetime import date
+        from cache import LRUCache
+        from concurrent.futures import ThreadPoolExecutor
+        monkeypatch.setattr(db, "withdrawal_cache", LRUCache(100))
+        monkeypatch.setattr(db, "withdrawal_cache_day", None)
+        today, yesterday = date(2024, 5, 2), date(2024, 5, 1)
+
+        with ThreadPoolExecutor(4) as pool:
+            list(pool.map(lambda i: db.cache_daily_withdrawal(f"acct-{i % 50}", today, 1), range(3000)))
+        assert db.withdrawal_cache.get(("acct-49", today)) == 60
+
+        for i in range(150):
+            db.cache_daily_withdrawal(f"other-{i}", today, 1)
+        db.cache_daily_withdrawal("late", yesterday, 5)
+        assert len(db.withdrawal_cache) == 100
+        assert ("late", yesterday) not in db.withdrawal_cache
+
+        db.cache_daily_withdrawal("acct-49", date(2024, 5, 3), 7)
+        assert len(db.withdrawal_cache) == 1
+
+class TestPolicyStore:
+
+    def test_identical_policies_share_a_row(self):
+        first = db.insert_policy(Policy(maxDeposit=5000))
+        second = db.insert_policy(Policy(maxDeposit=5000))
+        third = db.insert_policy(Policy(maxDeposit=6000))
+
+        assert first == second != third
+        with db.engine.connect() as conn:
+            assert len(conn.execute(db.policies.select()).all()) == 2
+
+    def test_accounts_start_on_default_policy(self, sample_account):
+        db.insert_account(sample_account)
+        policy = db.get_account_policy(str(sample_account.account_ID))
+        assert policy.maxDeposit == Policy().maxDeposit
+
+    def test_approval_applies_requested_limits(self, sample_account):
+        from models import PolicyRequest, PolicyRequestStatus
+        db.insert_account(sample_account)
+        account_id = str(sample_account.account_ID)
+        # warm the cache with the default policy
+        assert db.get_account_policy(account_id).maxDeposit == 1000
+        request = PolicyRequest(account_id, {"max_deposit": 5000, "overdraft_limit": None, "justification": "payroll"},
+                                created_at=datetime.now(), updated_at=datetime.now())
+        db.insert_policy_request(request)
+
+        db.update_policy_request_status(str(request.request_id), PolicyRequestStatus.APPROVED)
+
+        policy = db.get_account_policy(account_id)
+        assert policy.maxDeposit == 5000
+        assert policy.overdraftLimit == Policy().overdraftLimit
+        assert db.get_account(account_id)['policy_ID'] == db.policy_id(policy)
+        account, tx = db.apply_transaction(account_id, TransactionType.DEPOSIT, 4000)
+        assert tx.status == StatusType.SUCCESS
+
+    def test_slow_reader_cannot_cache_the_old_policy(self, tmp_path, monkeypatch, sample_account):
+        from models import PolicyRequest, PolicyRequestStatus
+        import metrics
+        engine = db.create_engine_from_env(f"sqlite:///{tmp_path / 'policy.sqlite'}")
+        db.meta.create_all(engine)
+        monkeypatch.setattr(db, "engine", engine)
+        db.insert_account(sample_account)
+        account_id = str(sample_account.account_ID)
+        request = PolicyRequest(account_id, {"max_deposit": 5000, "justification": "payroll"},
+                                created_at=datetime.now(), updated_at=datetime.now())
+        db.insert_policy_request(request)
+        approved = []
+        def approve_after_read(statement, parameters, elapsed):
+            # the approval commits after the reader has read the default policy
+            if "JOIN policies" in statement and not approved:
+                approved.append(db.update_policy_request_status(str(request.request_id), PolicyRequestStatus.APPROVED))
+        metrics.query_listeners.append(approve_after_read)
+        try:
+            stale = db.get_account_policy(account_id)
+        finally:
+            metrics.query_listeners.remove(approve_after_read)
+
+        assert approved == [{}]
+        assert stale.maxDeposit == 1000
+        assert db.get_account_policy(account_id).maxDeposit == 5000
+        engine.dispose()
+
+    def test_approval_for_missing_account_changes_nothing(self):
+        from models import PolicyRequest, PolicyRequestStatus
+        request = PolicyRequest("current-user-id", {"max_deposit": 5000, "justification": "payroll"},
+                                created_at=datetime.now(), updated_at=datetime.now())
+        db.insert_policy_request(request)
+
+        result = db.update_policy_request_status(str(request.request_id), PolicyRequestStatus.APPROVED)
+
+        assert result == {"error": "Account not found", "account_ID": "current-user-id"}
+        assert db.get_policy_requests()[0]["status"] == PolicyRequestStatus.PENDING.value
+        assert db.update_policy_request_status("missing", PolicyRequestStatus.APPROVED) is None
+
+    def test_upgrade_rekeys_account_policies(self, tmp_path):
+        from sqlalchemy import text
+        engine = db.create_engine_from_env(f"sqlite:///{tmp_path / 'old.sqlite'}")
+        db.meta.create_all(engine, tables=[db.accounts])
+        with engine.begin() as conn:
+            conn.execute(text(
+                'CREATE TABLE policies ("account_ID" VARCHAR PRIMARY KEY, max_deposit INTEGER, max_withdrawal INTEGER, '
+                'daily_withdrawal_limit INTEGER, allow_negative_balance BOOLEAN, overdraft_limit INTEGER)'
+            ))
+            conn.execute(text("INSERT INTO policies VALUES ('acct', 2000, NULL, NULL, 1, NULL)"))
+            conn.execute(db.accounts.insert().values(account_ID='acct', name='A', balance=1, policy_ID='default_policy'))
+
+        db.upgrade_schema(engine)
+
+        with engine.connect() as conn:
+            policy_ID = conn.execute(db.accounts.select()).first().policy_ID
+            assert policy_ID == db.policy_id(Policy(maxDeposit=2000))
+            assert conn.execute(db.policies.select()).first().max_deposit == 2000
+        engine.dispose()
+
+class TestAccountCache:
+
+    def test_balance_changes_are_written_through(self, sample_account):
+        db.insert_account(sample_account)
+        account_id = str(sample_account.account_ID)
+        db.apply_transaction(account_id, TransactionType.DEPOSIT, 100)
+        hits = db.account_cache.stats()["hits"]
+
+        assert db.get_account(account_id)["balance"] == 1100
+        assert db.account_cache.stats()["hits"] == hits + 1
+
+    def test_update_account_writes_through(self, sample_account):
+        db.insert_account(sample_account)
+        account_id = str(sample_account.account_ID)
+
+        db.update_account(account_id, "NAME", "Renamed")
+
+        assert db.get_account(account_id)["name"] == "Renamed"
+
+    def test_batch_writes_through(self, sample_account):
+        db.insert_account(sample_account)
+        account_id = str(sample_account.account_ID)
+        db.get_account(account_id)
+
+        db.apply_batch([{"op": "deposit", "account_id": account_id, "amount": 50}])
+
+        assert db.account_cache.get(account_id)["balance"] == 1050
+        assert db.get_account(account_id) == {
+            "account_ID": account_id, "name": "Test User", "balance": 1050, "policy_ID": "default_policy"
+        }
+
+    def test_late_write_through_is_ignored(self, sample_account, monkeypatch):
+        db.insert_account(sample_account)
+        account_id = str(sample_account.account_ID)
+        late = []
+        # the deposit commits first, but its write-through lands after the batch's
+        monkeypatch.setattr(db.account_cache, "put", lambda *args: late.append(args))
+        db.apply_transaction(account_id, TransactionType.DEPOSIT, 100)
+        monkeypatch.undo()
+
+        db.apply_batch([{"op": "deposit", "account_id": account_id, "amount": 50}])
+        db.account_cache.put(*late[0])
+        assert db.get_account(account_id)["balance"] == 1150
+        db.delete_account(account_id)
+        db.account_cache.put(*late[0])
+
+        assert late[0][1]["balance"] == 1100
+        assert db.get_account(account_id) is None
+
+    def test_declined_read_is_not_older_than_a_concurrent_commit(self, tmp_path, monkeypatch):
+        import threading
+        import metrics
+        engine = db.create_engine_from_env(f"sqlite:///{tmp_path / 'declined.sqlite'}")
+        db.meta.create_all(engine)
+        monkeypatch.setattr(db, "engine", engine)
+        account = Account("Racer", 100)
+        db.insert_account(account)
+        account_id = str(account.account_ID)
+        policy = Policy(maxWithdrawal=500)
+
+        thread = threading.Thread(
+            target=db.apply_transaction, args=(account_id, TransactionType.DEPOSIT, 100, policy)
+        )
+        def start_deposit(statement, parameters, elapsed):
+            # a deposit arrives after the declined withdrawal has read the balance
+            if "FROM accounts" in statement and thread.ident is None:
+                thread.start()
+                thread.join(0.3)
+        metrics.query_listeners.append(start_deposit)
+        try:
+            _, tx = db.apply_transaction(account_id, TransactionType.WITHDRAWAL, 600, policy)
+        finally:
+            metrics.query_listeners.remove(start_deposit)
+        thread.join()
+        cached = db.account_cache.get(account_id)
+        db.clear_caches()
+
+        assert tx.status == StatusType.DECLINED
+        assert tx.current_balance == 100
+        assert cached["balance"] == db.get_account(account_id)["balance"] == 200
+        engine.dispose()
+
+    def test_delete_evicts(self, sample_account):
+        db.insert_account(sample_account)
+        account_id = str(sample_account.account_ID)
+        db.delete_account(account_id)
+        assert db.get_account(account_id) is None
+
+class TestUsernameResolution:
+
+    @pytest.fixture
+    def users(self):
+        ids = {}
+        for name in ("alice", "bob", "carol"):
+            account = Account(name, 1000)
+            db.insert_account(account)
+            db.insert_user_account(name, str(account.account_ID))
+            ids[name] = str(account.account_ID)
+        return ids
+
+    def test_insert_warms_both_directions(self, users):
+        assert db.username_cache.get("alice") == users["alice"]
+        assert db.get_username_by_account_id(users["bob"]) == "bob"
+
+    def test_bulk_resolution_skips_unknown(self, users):
+        db.clear_caches()
+        assert db.resolve_usernames(["alice", "carol", "nobody"]) == {"alice": users["alice"], "carol": users["carol"]}
+        hits = db.username_cache.stats()["hits"]
+        assert db.get_account_id_by_username("carol") == users["carol"]
+        assert db.username_cache.stats()["hits"] == hits + 1
+
+    def test_preload(self, users):
+        db.clear_caches()
+        assert db.preload_usernames() == 3
+        assert db.account_username_cache.get(users["carol"]) == "carol"
+
+    def test_batch_payments_by_username(self, users):
+        committed, results = db.apply_batch([
+            {"op": "transfer", "from_username": "alice", "target_username": "bob", "amount": 100},
+            {"op": "transfer", "from_username": "carol", "target_username": "nobody", "amount": 100},
+        ], atomic=False)
+
+        assert [result["status"] for result in results] == ["SUCCESS", "ERROR"]
+        assert db.get_account(users["bob"])["balance"] == 1100
+
+class TestUsernameSearch:
+
+    def test_search_sees_new_usernames(self):
+        for name in ("zed", "ozzie", "zelda"):
+            db.insert_user_account(name, str(uuid.uuid4()))
+        assert db.search_usernames("z") == ["zed", "zelda", "ozzie"]
+
+        db.insert_user_account("zeke", str(uuid.uuid4()))
+
+        assert db.search_usernames("ze") == ["zed", "zeke", "zelda"]
@@ -0,0 +1,76 @@
+"""
+Unit tests for the striped per-account locks.
+"""
+
+import asyncio
+import sys
+import os
+
+# Add parent directory to path to import account_locks
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from account_locks import StripedLocks
+
+class TestStripedLocks:
+
+    def test_same_account_is_serialized(self):
+        locks = StripedLocks()
+        balance = {"value": 0}
+
+        async def deposit():
+            async with locks.hold("acct-1"):
+                # read, yield to the other tasks, write: a lost update without the lock
+                value = balance["value"]
+                await asyncio.sleep(0)
+                balance["value"] = value + 1
+
+        async def run():
+            await asyncio.gather(*[deposit() for _ in range(100)])
+
+        asyncio.run(run())
+        assert balance["value"] == 100
+
+    def test_different_accounts_run_in_parallel(self):
+        locks = StripedLocks()
+
+        async def run():
+            first_holding = asyncio.Event()
+            second_done = asyncio.Event()
+
+            async def first():
+                async with locks.hold("acct-1"):
+                    first_holding.set()
+                    # only finishes if second gets its lock while this one is held
+                    await second_done.wait()
+
+            async def second():
+                await first_holding.wait()
+                async with locks.hold("acct-2"):
+                    second_done.set()
+
+            await asyncio.wait_for(asyncio.gather(first(), second()), 1)
+
+        asyncio.run(run())
+
+    def test_opposite_transfers_do_not_deadlock(self):
+        locks = StripedLocks()
+
+        async def transfer(payer, payee):
+            async with locks.hold(payer, payee):
+                await asyncio.sleep(0.001)
+
+        async def run():
+            await asyncio.wait_for(asyncio.gather(*[
+                transfer("a", "b") if i % 2 else transfer("b", "a") for i in range(50)
+            ]), 5)
+
+        asyncio.run(run())
+
+    def test_same_stripe_is_taken_once(self):
+        locks = StripedLocks(stripes=1)
+
+        async def run():
+            async with locks.hold("a", "b"):
+                return True
+
+        assert asyncio.run(run())
@@ -0,0 +1,72 @@
+"""
+Unit tests for the NumPy ledger analytics in analytics.py.
+"""
+
+import pytest
+import sys
+import os
+import uuid
+from datetime import datetime
+
+np = pytest.importorskip("numpy")
+
+# Add parent directory to path to import models
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import analytics
+from models import ColumnarLedger, Transaction, TransactionType, StatusType
+
+# (day, type, amount, status, balance after) for an account that opened with 100
+HISTORY = [
+    (1, TransactionType.DEPOSIT, 50, StatusType.SUCCESS, 150),
+    (1, TransactionType.WITHDRAWAL, 200, StatusType.SUCCESS, -50),
+    (2, TransactionType.WITHDRAWAL, 500, StatusType.DECLINED, -50),
+    (2, TransactionType.PAY, 30, StatusType.SUCCESS, -20),
+    (3, TransactionType.DEPOSIT, 40, StatusType.SUCCESS, 20),
+    (3, TransactionType.PAY, 10, StatusType.SUCCESS, 10),
+]
+
+@pytest.fixture
+def ledger():
+    account_ID = uuid.uuid4()
+    txs = []
+    for hour, (day, tx_type, amount, status, balance) in enumerate(HISTORY):
+        tx = Transaction(account_ID, amount, tx_type, balance, datetime(2024, 1, day, hour))
+        tx.status = status
+        txs.append(tx)
+    return ColumnarLedger(txs)
+
+@pytest.fixture
+def summary(ledger):
+    return analytics.summarize(analytics.LedgerColumns.from_ledger(ledger))
+
+class TestAnalytics:
+
+    def test_flows_rebuild_balances(self, ledger):
+        columns = analytics.LedgerColumns.from_ledger(ledger)
+        flows = analytics.signed_flows(columns)
+        assert flows.tolist() == [50, -200, 0, 30, 40, -10]
+        assert analytics.running_balance(columns, flows).tolist() == [balance for *_, balance in HISTORY]
+
+    def test_summary(self, summary):
+        assert summary["opening_balance"] == 100 and summary["closing_balance"] == 10
+        assert summary["unexplained_change"] == 0
+        assert summary["by_type"]["WITHDRAWAL"] == {"count": 2, "volume": 200, "declined": 1}
+        assert summary["by_type"]["PAY"]["volume"] == 40
+
+    def test_daily_net_flow(self, summary):
+        assert [(day["day"], day["net_flow"], day["closing_balance"], day["count"]) for day in summary["daily"]] == [
+            ("2024-01-01", -150, -50, 2), ("2024-01-02", 30, -20, 2), ("2024-01-03", 30, 10, 2)
+        ]
+
+    def test_overdraft_intervals(self, summary):
+        assert summary["overdrafts"] == [{
+            "start": "2024-01-01T01:00:00.000000", "end": "2024-01-03T04:00:00.000000", "rows": 3, "lowest_balance": -50
+        }]
+
+    def test_decline_stats(self, summary):
+        assert summary["declines"] == {"count": 1, "rate": 1 / 6, "declined_amount": 500, "longest_streak": 1}
+
+    def test_empty_ledger(self):
+        summary = analytics.summarize(analytics.LedgerColumns.from_ledger(ColumnarLedger()))
+        assert summary["rows"] == 0 and summary["daily"] == [] and summary["overdrafts"] == []
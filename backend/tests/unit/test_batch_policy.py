@@ -0,0 +1,87 @@
+"""
+Property tests: batch_policy.validate_batch against the scalar Policy methods.
+"""
+
+import pytest
+import sys
+import os
+
+np = pytest.importorskip("numpy")
+hypothesis = pytest.importorskip("hypothesis")
+from hypothesis import given, strategies as st
+
+# Add parent directory to path to import models
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import batch_policy
+from models import Policy
+
+ACCOUNTS = 4
+
+policies = st.builds(
+    Policy,
+    maxDeposit=st.integers(0, 1500),
+    maxWithdrawal=st.integers(0, 1500),
+    dailyWithdrawalLimit=st.integers(0, 3000),
+    allowNegativeBalance=st.booleans(),
+    overdraftLimit=st.integers(0, 500)
+)
+rows = st.lists(
+    st.tuples(st.integers(0, ACCOUNTS - 1), st.booleans(), st.integers(-100, 2000) | st.floats(0, 2000), policies),
+    max_size=60
+)
+opening = st.lists(st.integers(-200, 3000), min_size=ACCOUNTS, max_size=ACCOUNTS)
+
+def scalar_reference(batch, opening_balances, withdrawn_today):
+    # one validate_* call per row, carrying balances and daily totals forward
+    balances = list(opening_balances)
+    withdrawn = list(withdrawn_today)
+    accepted, balances_after = [], []
+    for account, is_withdrawal, amount, policy in batch:
+        if is_withdrawal:
+            ok = policy.validate_withdrawal(amount, balances[account], withdrawn[account])
+            if ok:
+                balances[account] -= amount
+                withdrawn[account] += amount
+        else:
+            ok = policy.validate_deposit(amount)
+            if ok:
+                balances[account] += amount
+        accepted.append(ok)
+        balances_after.append(balances[account])
+    return accepted, balances_after
+
+def run_batch(batch, opening_balances, withdrawn_today, policy=None):
+    accounts, withdrawals, amounts, row_policies = zip(*batch) if batch else ([], [], [], [])
+    return batch_policy.validate_batch(
+        list(accounts), list(withdrawals), list(amounts), opening_balances,
+        policy or list(row_policies), withdrawn_today
+    )
+
+class TestValidateBatch:
+
+    @given(rows, opening, st.lists(st.integers(0, 2000), min_size=ACCOUNTS, max_size=ACCOUNTS))
+    def test_matches_scalar_methods(self, batch, opening_balances, withdrawn_today):
+        accepted, balances_after = run_batch(batch, opening_balances, withdrawn_today)
+        expected_accepted, expected_balances = scalar_reference(batch, opening_balances, withdrawn_today)
+
+        assert accepted.tolist() == expected_accepted
+        assert balances_after.tolist() == expected_balances
+
+    @given(rows, opening, policies)
+    def test_single_policy_for_every_row(self, batch, opening_balances, policy):
+        batch = [(account, is_withdrawal, amount, policy) for account, is_withdrawal, amount, _ in batch]
+        accepted, balances_after = run_batch(batch, opening_balances, [0] * ACCOUNTS, policy)
+
+        assert (accepted.tolist(), balances_after.tolist()) == scalar_reference(batch, opening_balances, [0] * ACCOUNTS)
+
+    def test_daily_limit_carries_across_rows(self):
+        policy = Policy(maxWithdrawal=500, dailyWithdrawalLimit=800, overdraftLimit=1000)
+        accepted, balances_after = batch_policy.validate_batch([0, 1, 0, 0], [True] * 4, [500, 500, 301, 300], [1000, 1000], policy)
+
+        assert accepted.tolist() == [True, True, False, True]
+        assert balances_after.tolist() == [500, 500, 500, 200]
+
+    def test_policy_count_must_match_rows(self):
+        with pytest.raises(ValueError):
+            batch_policy.validate_batch([0, 0], [True, True], [1, 2], [10], [Policy()])
@@ -0,0 +1,66 @@
+"""
+Unit Tests for the in-process LRU cache in cache.py.
+"""
+
+import pytest
+import sys
+import os
+
+# Add parent directory to path to import cache
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from cache import LRUCache
+
+class TestLRUCache:
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        assert "b" not in cache
+        assert cache.get("a") == 1 and cache.get("c") == 3
+        assert cache.stats()["evictions"] == 1
+
+    def test_counts_hits_and_misses(self):
+        cache = LRUCache()
+        cache.put("a", 1)
+        cache.get("a")
+        cache.get("missing")
+
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+
+    def test_ttl_expires_entries(self, monkeypatch):
+        import cache as cache_module
+        now = [100.0]
+        monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+        cache = LRUCache(ttl=5)
+        cache.put("a", 1)
+
+        now[0] = 104.0
+        assert cache.get("a") == 1
+        now[0] = 105.0
+        assert cache.get("a") is None
+        assert cache.stats()["expirations"] == 1
+
+    def test_add_does_not_overwrite(self):
+        cache = LRUCache()
+        cache.put("a", "newer")
+        assert cache.add("a", "older") is False
+        assert cache.get("a") == "newer"
+
+    def test_older_versions_are_ignored(self):
+        cache = LRUCache()
+        assert cache.put("a", "second", version=2)
+        assert cache.put("a", "first", version=1) is False
+        assert cache.get("a") == "second"
+
+        cache.pop("a", version=3)
+        cache.put("a", "second", version=2)
+        assert "a" not in cache and cache.get("a") is None
+        assert cache.add("a", "read before the delete") is False
+        cache.put("a", "fourth", version=4)
+        assert cache.get("a") == "fourth"
@@ -0,0 +1,47 @@
+"""
+Unit tests for the Prometheus metrics helpers.
+"""
+
+import sqlite3
+import sys
+import os
+
+# Add parent directory to path to import metrics
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+import metrics
+
+class TestHistogram:
+
+    def test_buckets_are_cumulative(self):
+        histogram = metrics.Histogram("test_seconds", "test", ("route",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5):
+            histogram.observe(value, ("/a",))
+
+        lines = metrics.render_metric(histogram.name, histogram.type, histogram.help, histogram.samples())
+
+        assert lines[2:] == [
+            'test_seconds_bucket{route="/a",le="0.1"} 1',
+            'test_seconds_bucket{route="/a",le="1"} 3',
+            'test_seconds_bucket{route="/a",le="+Inf"} 4',
+            'test_seconds_sum{route="/a"} 6.05',
+            'test_seconds_count{route="/a"} 4',
+        ]
+
+    def test_label_values_are_escaped(self):
+        assert metrics.format_sample("m", (("q", 'a"b\\c'),), 1) == 'm{q="a\\"b\\\\c"} 1'
+
+class TestTimedCursor:
+
+    def test_statements_are_recorded_by_helper(self):
+        metrics.reset()
+        connection = sqlite3.connect(":memory:", factory=metrics.TimedConnection)
+        token = metrics.current_helper.set("get_account")
+        try:
+            cursor = connection.cursor()
+            cursor.execute("create table t (x)")
+            cursor.executemany("insert into t values (?)", [(1,), (2,)])
+        finally:
+            metrics.current_helper.reset(token)
+
+        assert metrics.db_latency.series[("get_account",)][2] == 2
@@ -18,6 +18,7 @@ sys.path.insert(0, os.path.dirname(__file__))
 from models import (
     Policy, 
     Ledger, 
+    ColumnarLedger,
     Transaction, 
     Account, 
     PolicyRequest,
@@ -72,10 +73,9 @@ from transaction_factory import tx_factory
 # ledger with random transactions (sampled normally from the set of allowed values per data member)
 @pytest.fixture
 def populated_ledger(fixed_seed):
-    txs = tx_factory(fixed_seed)
     ledger = Ledger()
-    for tx in txs:
-        ledger.add_transaction(self, tx)
+    for txs in tx_factory(200, 10, fixed_seed):
+        ledger.add_transaction(txs)
     return ledger
 
 # test suite for user account class operation
@@ -134,6 +134,12 @@ class TestAccount:
         test_account.withdraw(max_withdrawal)
         assert test_account.balance == starting_balance - max_withdrawal
 
+    def test_withdraw_negative(self, test_account):
+        starting_balance = test_account.balance
+        tx = test_account.withdraw(-5000)
+        assert tx.status == StatusType.DECLINED
+        assert test_account.balance == starting_balance
+
     def test_withdraw_more_than_limit(self, test_account):
         starting_balance = test_account.balance
         max_withdrawal = test_account.policy.maxWithdrawal
@@ -157,6 +163,21 @@ class TestAccount:
         test_account.withdraw(test_account.policy.overdraftLimit)
         assert test_account.balance == - test_account.policy.overdraftLimit
  
+    def test_daily_withdrawal_limit(self, test_account):
+        test_account.policy = Policy(maxWithdrawal=500, dailyWithdrawalLimit=800, overdraftLimit=1000)
+        first = test_account.withdraw(500)
+        second = test_account.withdraw(301)
+        third = test_account.withdraw(300)
+        assert [first.status, second.status, third.status] == [StatusType.SUCCESS, StatusType.DECLINED, StatusType.SUCCESS]
+        assert test_account.balance == 200
+
+    def test_payment_counts_toward_daily_limit(self, test_account):
+        test_account.policy = Policy(dailyWithdrawalLimit=100)
+        payee = Account("payee", 10)
+        test_account.withdraw(60)
+        payer_tx, payee_tx = test_account.payment(payee, 50)
+        assert payer_tx.status == StatusType.DECLINED and payee.balance == 10
+
     def test_deposit_adds_to_ledger(self, test_account):
         starting_balance = test_account.balance
         test_account.deposit(50)
@@ -193,6 +214,38 @@ class TestLedger:
     def test_ledger():
         pass
 
+class TestColumnarLedger:
+    """
+    Test suite for the ColumnarLedger class
+    """
+    def test_rows_match_list_ledger(self):
+        columnar = Account("columnar", 1000, ledger=ColumnarLedger())
+        plain = Ledger()
+        for action in [lambda: columnar.deposit(250), lambda: columnar.withdraw(2000), lambda: columnar.withdraw(75)]:
+            tx = action()
+            plain.add_transaction(tx)
+
+        fields = Transaction.__slots__
+        assert len(columnar.ledger.transactions) == 3
+        for stored, original in zip(columnar.ledger.transactions, plain.transactions):
+            assert all(getattr(stored, field) == getattr(original, field) for field in fields)
+        assert columnar.ledger.transactions[-1].current_balance == 1175
+        assert [tx.status for tx in columnar.ledger.transactions[:2]] == [StatusType.SUCCESS, StatusType.DECLINED]
+
+    def test_parties_are_dictionary_encoded(self):
+        payer, payee = Account("payer", 100), Account("payee", 100)
+        ledger = ColumnarLedger(payer.payment(payee, 10) + payer.payment(payee, 20))
+
+        assert ledger.parties == [None, payer.account_ID, payee.account_ID]
+        assert ledger.transactions[1].counterparty == payer.account_ID
+        with pytest.raises(IndexError):
+            ledger.transactions[4]
+
+    def test_transaction_has_no_instance_dict(self, test_account):
+        tx = test_account.deposit(10)
+        with pytest.raises(AttributeError):
+            tx.unknown_field = 1
+
 class TestTransaction:
     """
     Test suite for the Transaction class
@@ -0,0 +1,48 @@
+"""
+Unit Tests for the username search index in search_index.py.
+"""
+
+import pytest
+import sys
+import os
+
+# Add parent directory to path to import search_index
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from search_index import UsernameIndex
+
+@pytest.fixture
+def index():
+    index = UsernameIndex()
+    index.build(["alice", "Malice", "bob", "alicia", "carol", "xalx"])
+    return index
+
+class TestUsernameIndex:
+
+    def test_prefix_matches_rank_first(self, index):
+        assert index.search("ali") == ["alice", "alicia", "Malice"]
+
+    def test_case_insensitive(self, index):
+        assert index.search("MAL") == ["Malice"]
+
+    def test_short_terms(self, index):
+        assert index.search("al") == ["alice", "alicia", "Malice", "xalx"]
+        assert index.search("") == ["alice", "alicia", "bob", "carol", "Malice", "xalx"]
+
+    def test_substring_matches(self, index):
+        assert index.search("alx") == ["xalx"]
+        assert index.search("zzz") == []
+
+    def test_short_terms_use_postings(self, index):
+        assert index.search("lx") == ["xalx"]
+        assert index.search("q") == index.search("zz") == []
+        assert list(index.candidates("lx")) == [5]
+        assert list(index.candidates("9z")) == []
+
+    def test_limit(self, index):
+        assert index.search("a", limit=2) == ["alice", "alicia"]
+
+    def test_incremental_add(self, index):
+        index.add("alfred")
+        assert index.search("al")[:2] == ["alfred", "alice"]
+        assert index.search("fre") == ["alfred"]
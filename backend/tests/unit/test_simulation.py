@@ -0,0 +1,62 @@
+"""
+Unit tests for the transaction simulation engine and the seeded tx_factory.
+"""
+
+import pytest
+import sys
+import os
+
+# Add parent directory to path to import models
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+# Add current directory to path to import transaction_factory
+sys.path.insert(0, os.path.dirname(__file__))
+
+import simulation
+from models import Policy
+from transaction_factory import tx_factory
+
+def outcome(report):
+    # everything but wall-clock time
+    return {key: value for key, value in report.items() if key != "elapsed_seconds"}
+
+class TestTxFactory:
+
+    def test_seed_reproduces_history(self):
+        def history(seed):
+            return [[(tx.amount, tx.tx_type, tx.status, tx.current_balance) for tx in txs] for txs in tx_factory(200, 5, seed)]
+
+        assert history(314) == history(314)
+        assert history(314) != history(315)
+
+class TestSimulation:
+
+    def test_invariants_hold(self):
+        config = simulation.SimulationConfig(operations=5000, accounts=50, shards=3, seed=7)
+        report = simulation.simulate(config, workers=1)
+
+        assert report["ok"]
+        assert report["operations_run"] == 5000
+        assert report["cross_shard_credits"] > 0
+
+    def test_same_seed_same_report(self):
+        config = simulation.SimulationConfig(operations=2000, accounts=20, shards=2, seed=3)
+        assert outcome(simulation.simulate(config, workers=1)) == outcome(simulation.simulate(config, workers=1))
+
+    def test_process_pool_matches_in_process_run(self):
+        config = simulation.SimulationConfig(operations=2000, accounts=20, shards=2, seed=3)
+        assert outcome(simulation.simulate(config, workers=2)) == outcome(simulation.simulate(config, workers=1))
+
+    def test_strict_policy_and_custom_mix(self):
+        config = simulation.SimulationConfig(
+            operations=3000, accounts=10, shards=2, seed=1, mix={"withdraw": 1, "pay": 1},
+            amounts=("exponential", 300), policy=Policy(allowNegativeBalance=False, dailyWithdrawalLimit=500)
+        )
+        report = simulation.simulate(config, workers=1)
+
+        assert report["ok"]
+        assert report["invariants"]["balance_floor"]["floor"] == 0
+        assert report["operations"]["deposit"]["count"] == 0
+
+    def test_needs_an_account_per_shard(self):
+        with pytest.raises(ValueError):
+            simulation.SimulationConfig(accounts=2, shards=4)
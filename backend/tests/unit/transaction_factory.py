@@ -12,22 +12,25 @@ from models import Account, Transaction, TransactionType, StatusType, Policy, Le
 
 
 def tx_factory(tx_count, user_count, seed):
+    # every draw comes from one seeded generator, so a seed always rebuilds the same history
+    # (timestamps and tx_IDs aside)
+    rng = r.Random(seed)
     accts = []
     for i in range(user_count):
-        accts.append(Account(f"test_user_{i + 1}", r.random()*1000, i))
+        accts.append(Account(f"test_user_{i + 1}", rng.random()*1000, i))
 
     for i in range(tx_count):
         # select random account
-        random_account_indexes = r.sample(range(user_count), 2)
+        random_account_indexes = rng.sample(range(user_count), 2)
         random_account = accts[random_account_indexes[0]]
-        random_amount = r.random()*100
+        random_amount = rng.random()*100
         # generate random transaction
         available_methods = [
             (random_account.withdraw, [random_amount]), 
             (random_account.deposit, [random_amount]), 
             (random_account.payment, [accts[random_account_indexes[1]], random_amount])
             ]
-        method = r.choice(available_methods)
+        method = rng.choice(available_methods)
         method[0](*method[1])
     
     # collect and merge ledgers from accounts
@@ -1,36 +1,71 @@
 import { useState, useEffect } from "react"
 import { useNavigate } from "react-router-dom"
 import { Box, VStack, HStack, Text, Button, Heading, Container, Badge, Spinner } from "@chakra-ui/react"
+import { api } from '../services/api.js'
+
+// status filters; '' is every request
+const STATUSES = ['', 'pending', 'approved', 'rejected']
 
 function AdminPage({ onLogout }) {
   const [policyRequests, setPolicyRequests] = useState([])
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState(null)
+  const [statusFilter, setStatusFilter] = useState('')
+  const [nextCursor, setNextCursor] = useState(null)
+  const [loadingMore, setLoadingMore] = useState(false)
+  const [counts, setCounts] = useState({})
   const navigate = useNavigate()
 
-  // Fetch policy requests for admin view
+  // Fetch the first page of policy requests matching the status filter
   const fetchPolicyRequests = async () => {
     try {
       setLoading(true)
-      const response = await fetch('http://localhost:8000/admin/policy-requests')
-      if (!response.ok) {
-        throw new Error('Failed to fetch policy requests')
-      }
-      const data = await response.json()
-      setPolicyRequests(data)
+      const data = await api.getPolicyRequestsPage({ status: statusFilter })
+      setPolicyRequests(data.items)
+      setNextCursor(data.next_cursor)
       setError(null)
     } catch (err) {
       console.error('Error fetching policy requests:', err)
       setError(err.message)
       setPolicyRequests([])
+      setNextCursor(null)
     } finally {
       setLoading(false)
     }
   }
 
-  // Fetch policy requests on component mount
+  // Append the next page
+  const fetchMore = async () => {
+    try {
+      setLoadingMore(true)
+      const data = await api.getPolicyRequestsPage({ status: statusFilter, cursor: nextCursor })
+      setPolicyRequests(loaded => [...loaded, ...data.items])
+      setNextCursor(data.next_cursor)
+    } catch (err) {
+      console.error('Error fetching policy requests:', err)
+      setError(err.message)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
+  // Per-status totals are counted by the server, so they cover every request
+  const fetchCounts = async () => {
+    try {
+      const totals = await Promise.all(STATUSES.map(status => api.countPolicyRequests(status)))
+      setCounts(Object.fromEntries(STATUSES.map((status, i) => [status, totals[i]])))
+    } catch (err) {
+      console.error('Error counting policy requests:', err)
+    }
+  }
+
+  // Refetch whenever the status filter changes
   useEffect(() => {
     fetchPolicyRequests()
+  }, [statusFilter])
+
+  useEffect(() => {
+    fetchCounts()
   }, [])
 
   // Get status color for badge
@@ -65,6 +100,7 @@ function AdminPage({ onLogout }) {
       alert(`Request ${requestId.slice(0, 8)}... approved!`)
       // Refresh the list
       fetchPolicyRequests()
+      fetchCounts()
     } catch (error) {
       console.error('Error approving request:', error)
       alert('Failed to approve request')
@@ -78,6 +114,7 @@ function AdminPage({ onLogout }) {
       alert(`Request ${requestId.slice(0, 8)}... rejected!`)
       // Refresh the list
       fetchPolicyRequests()
+      fetchCounts()
     } catch (error) {
       console.error('Error rejecting request:', error)
       alert('Failed to reject request')
@@ -122,6 +159,22 @@ function AdminPage({ onLogout }) {
           </Text>
         </Box>
 
+        {/* Status Filter */}
+        <HStack spacing={2} mb={6} wrap="wrap">
+          {STATUSES.map(status => (
+            <Button
+              key={status || 'all'}
+              size="sm"
+              variant={statusFilter === status ? 'solid' : 'outline'}
+              colorScheme={status ? getStatusColor(status) : 'blue'}
+              onClick={() => setStatusFilter(status)}
+            >
+              {status ? status[0].toUpperCase() + status.slice(1) : 'All'}
+              {counts[status] !== undefined && ` (${counts[status]})`}
+            </Button>
+          ))}
+        </HStack>
+
         {/* Loading State */}
         {loading && (
           <Box display="flex" justifyContent="center" alignItems="center" py={12}>
@@ -248,14 +301,29 @@ function AdminPage({ onLogout }) {
           </VStack>
         )}
 
-        {/* Summary Stats */}
+        {/* More pages */}
         {!loading && !error && policyRequests.length > 0 && (
+          <HStack justify="space-between" mt={4}>
+            <Text fontSize="sm" color="gray.600">
+              Showing {policyRequests.length}
+              {counts[statusFilter] !== undefined && ` of ${counts[statusFilter]}`} requests
+            </Text>
+            {nextCursor && (
+              <Button size="sm" variant="outline" onClick={fetchMore} isLoading={loadingMore}>
+                Load more
+              </Button>
+            )}
+          </HStack>
+        )}
+
+        {/* Summary Stats */}
+        {!loading && !error && counts[''] > 0 && (
           <HStack spacing={6} mt={6} wrap="wrap">
             <Box bg="white" p={4} borderRadius="md" shadow="sm" flex="1" minW="200px">
               <VStack align="start">
                 <Text color="gray.600" fontSize="sm">Total Requests</Text>
                 <Text fontSize="2xl" fontWeight="bold" color="gray.800">
-                  {policyRequests.length}
+                  {counts['']}
                 </Text>
               </VStack>
             </Box>
@@ -263,7 +331,7 @@ function AdminPage({ onLogout }) {
               <VStack align="start">
                 <Text color="gray.600" fontSize="sm">Pending</Text>
                 <Text fontSize="2xl" fontWeight="bold" color="yellow.600">
-                  {policyRequests.filter(r => r.status === 'pending').length}
+                  {counts['pending']}
                 </Text>
               </VStack>
             </Box>
@@ -271,7 +339,7 @@ function AdminPage({ onLogout }) {
               <VStack align="start">
                 <Text color="gray.600" fontSize="sm">Approved</Text>
                 <Text fontSize="2xl" fontWeight="bold" color="green.600">
-                  {policyRequests.filter(r => r.status === 'approved').length}
+                  {counts['approved']}
                 </Text>
               </VStack>
             </Box>
@@ -279,7 +347,7 @@ function AdminPage({ onLogout }) {
               <VStack align="start">
                 <Text color="gray.600" fontSize="sm">Rejected</Text>
                 <Text fontSize="2xl" fontWeight="bold" color="red.600">
-                  {policyRequests.filter(r => r.status === 'rejected').length}
+                  {counts['rejected']}
                 </Text>
               </VStack>
             </Box>
@@ -48,7 +48,7 @@ function HundredDollarInput({ value, onChange, placeholder, name, min = 0, max =
   )
 }
 
-function ManageAccount() {
+function ManageAccount({ account }) {
   const [formData, setFormData] = useState({
     maxDeposit: '',
     maxWithdrawal: '',
@@ -85,7 +85,7 @@ function ManageAccount() {
     
     // Create policy request object
     const policyRequestData = {
-      user_id: 'current-user-id', // In a real app, this would come from auth context
+      user_id: account.account_ID, // approval applies the limits to this account
       policy_request: {
         max_deposit: formData.maxDeposit ? parseInt(formData.maxDeposit) : null,
         max_withdrawal: formData.maxWithdrawal ? parseInt(formData.maxWithdrawal) : null,
@@ -97,6 +97,10 @@ function ManageAccount() {
     
     try {
       const response = await api.createPolicyRequest(policyRequestData)
+      if (response.success === false) {
+        alert(`Failed to submit request: ${response.error}`)
+        return
+      }
       console.log('Policy request submitted successfully:', response)
       alert('Request submitted successfully!')
       setFormData({
@@ -1,34 +1,69 @@
 import { useState, useEffect } from "react"
 import { Box, VStack, HStack, Text, Button, Heading, Container, Badge, Spinner } from "@chakra-ui/react"
+import { api } from '../services/api.js'
+
+// status filters; '' is every request
+const STATUSES = ['', 'pending', 'approved', 'rejected']
 
 function Admin() {
   const [policyRequests, setPolicyRequests] = useState([])
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState(null)
+  const [statusFilter, setStatusFilter] = useState('')
+  const [nextCursor, setNextCursor] = useState(null)
+  const [loadingMore, setLoadingMore] = useState(false)
+  const [counts, setCounts] = useState({})
 
-  // Fetch policy requests for admin view
+  // Fetch the first page of policy requests matching the status filter
   const fetchPolicyRequests = async () => {
     try {
       setLoading(true)
-      const response = await fetch('http://localhost:8000/admin/policy-requests')
-      if (!response.ok) {
-        throw new Error('Failed to fetch policy requests')
-      }
-      const data = await response.json()
-      setPolicyRequests(data)
+      const data = await api.getPolicyRequestsPage({ status: statusFilter })
+      setPolicyRequests(data.items)
+      setNextCursor(data.next_cursor)
       setError(null)
     } catch (err) {
       console.error('Error fetching policy requests:', err)
       setError(err.message)
       setPolicyRequests([])
+      setNextCursor(null)
     } finally {
       setLoading(false)
     }
   }
 
-  // Fetch policy requests on component mount
+  // Append the next page
+  const fetchMore = async () => {
+    try {
+      setLoadingMore(true)
+      const data = await api.getPolicyRequestsPage({ status: statusFilter, cursor: nextCursor })
+      setPolicyRequests(loaded => [...loaded, ...data.items])
+      setNextCursor(data.next_cursor)
+    } catch (err) {
+      console.error('Error fetching policy requests:', err)
+      setError(err.message)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
+  // Per-status totals are counted by the server, so they cover every request
+  const fetchCounts = async () => {
+    try {
+      const totals = await Promise.all(STATUSES.map(status => api.countPolicyRequests(status)))
+      setCounts(Object.fromEntries(STATUSES.map((status, i) => [status, totals[i]])))
+    } catch (err) {
+      console.error('Error counting policy requests:', err)
+    }
+  }
+
+  // Refetch whenever the status filter changes
   useEffect(() => {
     fetchPolicyRequests()
+  }, [statusFilter])
+
+  useEffect(() => {
+    fetchCounts()
   }, [])
 
   // Get status color for badge
@@ -63,6 +98,7 @@ function Admin() {
       alert(`Request ${requestId.slice(0, 8)}... approved!`)
       // Refresh the list
       fetchPolicyRequests()
+      fetchCounts()
     } catch (error) {
       console.error('Error approving request:', error)
       alert('Failed to approve request')
@@ -76,6 +112,7 @@ function Admin() {
       alert(`Request ${requestId.slice(0, 8)}... rejected!`)
       // Refresh the list
       fetchPolicyRequests()
+      fetchCounts()
     } catch (error) {
       console.error('Error rejecting request:', error)
       alert('Failed to reject request')
@@ -145,6 +182,22 @@ function Admin() {
           </Text>
         </Box>
 
+        {/* Status Filter */}
+        <HStack spacing={2} mb={6} wrap="wrap">
+          {STATUSES.map(status => (
+            <Button
+              key={status || 'all'}
+              size="sm"
+              variant={statusFilter === status ? 'solid' : 'outline'}
+              colorScheme={status ? getStatusColor(status) : 'blue'}
+              onClick={() => setStatusFilter(status)}
+            >
+              {status ? status[0].toUpperCase() + status.slice(1) : 'All'}
+              {counts[status] !== undefined && ` (${counts[status]})`}
+            </Button>
+          ))}
+        </HStack>
+
         {/* Loading State */}
         {loading && (
           <Box display="flex" justifyContent="center" alignItems="center" py={12}>
@@ -281,14 +334,29 @@ function Admin() {
           </VStack>
         )}
 
-        {/* Summary Stats */}
+        {/* More pages */}
         {!loading && !error && policyRequests.length > 0 && (
+          <HStack justify="space-between" mt={4}>
+            <Text fontSize="sm" color="gray.600">
+              Showing {policyRequests.length}
+              {counts[statusFilter] !== undefined && ` of ${counts[statusFilter]}`} requests
+            </Text>
+            {nextCursor && (
+              <Button size="sm" variant="outline" onClick={fetchMore} isLoading={loadingMore}>
+                Load more
+              </Button>
+            )}
+          </HStack>
+        )}
+
+        {/* Summary Stats */}
+        {!loading && !error && counts[''] > 0 && (
           <HStack spacing={6} mt={6} wrap="wrap">
             <Box bg="white" p={4} borderRadius="md" shadow="sm" flex="1" minW="200px">
               <VStack align="start">
                 <Text color="gray.600" fontSize="sm">Total Requests</Text>
                 <Text fontSize="2xl" fontWeight="bold" color="gray.800">
-                  {policyRequests.length}
+                  {counts['']}
                 </Text>
               </VStack>
             </Box>
@@ -296,7 +364,7 @@ function Admin() {
               <VStack align="start">
                 <Text color="gray.600" fontSize="sm">Pending</Text>
                 <Text fontSize="2xl" fontWeight="bold" color="yellow.600">
-                  {policyRequests.filter(r => r.status === 'pending').length}
+                  {counts['pending']}
                 </Text>
               </VStack>
             </Box>
@@ -304,7 +372,7 @@ function Admin() {
               <VStack align="start">
                 <Text color="gray.600" fontSize="sm">Approved</Text>
                 <Text fontSize="2xl" fontWeight="bold" color="green.600">
-                  {policyRequests.filter(r => r.status === 'approved').length}
+                  {counts['approved']}
                 </Text>
               </VStack>
             </Box>
@@ -312,7 +380,7 @@ function Admin() {
               <VStack align="start">
                 <Text color="gray.600" fontSize="sm">Rejected</Text>
                 <Text fontSize="2xl" fontWeight="bold" color="red.600">
-                  {policyRequests.filter(r => r.status === 'rejected').length}
+                  {counts['rejected']}
                 </Text>
               </VStack>
             </Box>
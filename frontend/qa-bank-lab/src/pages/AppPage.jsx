@@ -63,9 +63,8 @@ function AppPage() {
   const updateAccountBalance = async (accountId) => {
     try {
       // Get updated account info from API
-      const accounts = await api.getAllAccounts()
-      const updatedAccount = accounts.find(acc => acc.account_ID === accountId)
-      if (updatedAccount) {
+      const updatedAccount = await api.getAccount(accountId)
+      if (updatedAccount && updatedAccount.account_ID) {
         setSelectedAccount(updatedAccount)
       }
     } catch (error) {
@@ -227,7 +226,7 @@ function AppPage() {
             )}
             {activeTab === "manage" && (
               <Box>
-                <ManageAccount />
+                <ManageAccount account={selectedAccount} />
               </Box>
             )}
           </Box>
@@ -60,16 +60,38 @@ const api = {
     return data;
   },
 
-  async getLedger(accountId) {
-    const res = await fetch(`${API_BASE_URL}/accounts/ledger/${accountId}`);
+  async getLedger(accountId, limit = 100) {
+    // ledger is paginated server-side (newest first); return the first page of rows
+    const res = await fetch(`${API_BASE_URL}/accounts/ledger/${accountId}?limit=${limit}`);
     const data = await res.json();
-    return data;
+    return data.items;
   },
 
-  async getAllAccounts() {
-    const res = await fetch(`${API_BASE_URL}/accounts`);
+  async getAllAccounts(limit = 500) {
+    const res = await fetch(`${API_BASE_URL}/accounts?limit=${limit}`);
     const data = await res.json();
-    return data;
+    return data.items;
+  },
+
+  async getPolicyRequestsPage({ status = '', cursor = null, limit = 100 } = {}) {
+    // one keyset page of the admin list, filtered server-side; pass next_cursor back as cursor
+    const params = new URLSearchParams({ limit });
+    if (status) params.set('status', status);
+    if (cursor) params.set('cursor', cursor);
+    const res = await fetch(`${API_BASE_URL}/admin/policy-requests?${params}`);
+    if (!res.ok) {
+      throw new Error('Failed to fetch policy requests');
+    }
+    return res.json();
+  },
+
+  async countPolicyRequests(status = '') {
+    // exact count of every matching request, not just the ones loaded so far
+    const params = new URLSearchParams({ limit: 1, with_total: true });
+    if (status) params.set('status', status);
+    const res = await fetch(`${API_BASE_URL}/admin/policy-requests?${params}`);
+    const data = await res.json();
+    return data.total;
   },
 
   async createPolicyRequest(policyData) {